@@ -3,6 +3,11 @@ ASGI config for backend project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve it with `gunicorn -c backend/gunicorn_asgi.py backend.asgi:application`
+(uvicorn workers); the async read endpoints are under /api/async/, and the live
+sales stream (/api/sales/stream/) needs it: each open stream is a coroutine, not a
+worker thread.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
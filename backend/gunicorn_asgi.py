@@ -0,0 +1,13 @@
+# backend/gunicorn_asgi.py
+# ASGI serving: gunicorn -c backend/gunicorn_asgi.py backend.asgi:application
+# Each worker runs one event loop, so slow clients and long streams no longer pin a worker
+# (the async read endpoints live under /api/async/, see sales/async_views.py).
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "uvicorn_worker.UvicornWorker"
+keepalive = 5
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+graceful_timeout = 30
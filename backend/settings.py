@@ -2,6 +2,7 @@
 # webillz_backend/settings.py
 
 import os
+import tempfile
 from pathlib import Path
 from datetime import timedelta
 from dotenv import load_dotenv
@@ -28,6 +29,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",   # OpClass in index expressions (sales.models.PatternIndex)
 
     # third-party
     "rest_framework",
@@ -39,15 +41,18 @@ INSTALLED_APPS = [
 
 # Middleware
 MIDDLEWARE = [
+    "sales.metrics.MetricsMiddleware",               # outermost, so it times the whole stack
+    "sales.middleware.CompressionMiddleware",        # br/gzip by Accept-Encoding, streams included
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.security.SecurityMiddleware",
-    "whitenoise.middleware.WhiteNoiseMiddleware",   # ✅ for static files on Render
+    "sales.middleware.WhiteNoiseMiddleware",        # ✅ for static files on Render (async-capable WhiteNoise)
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "sales.replicas.ReplicaPinMiddleware",          # read-your-writes when a replica is configured
 ]
 
 ROOT_URLCONF = "backend.urls"
@@ -77,6 +82,26 @@ DATABASES = {
     )
 }
 
+# SQLite (local dev/tests): queue on the write lock instead of failing fast, and keep the
+# test database in a file so threaded tests see real lock behaviour
+if DATABASES["default"].get("ENGINE") == "django.db.backends.sqlite3":
+    DATABASES["default"].setdefault("OPTIONS", {}).update({"timeout": 20, "transaction_mode": "IMMEDIATE"})
+    DATABASES["default"].setdefault("TEST", {}).setdefault("NAME", os.path.join(BASE_DIR, "test_db.sqlite3"))
+
+# Optional read replica: report, list and export reads go there (sales/replicas.py), writes
+# and everything else stay on "default". A user's reads stay on the primary for
+# REPLICA_STICKY_SECONDS after they write (a ReplicaPin row, so every worker sees it); a
+# replica that fails to connect is skipped for REPLICA_RETRY_SECONDS. Locally, two SQLite
+# files work: copy db.sqlite3 to replica.sqlite3.
+if os.getenv("REPLICA_DATABASE_URL"):
+    DATABASES["replica"] = dj_database_url.parse(os.environ["REPLICA_DATABASE_URL"])
+    DATABASES["replica"]["TEST"] = {"MIRROR": "default"}
+    if DATABASES["replica"].get("ENGINE") == "django.db.backends.sqlite3":
+        DATABASES["replica"].setdefault("OPTIONS", {}).update({"timeout": 20})
+    DATABASE_ROUTERS = ["sales.replicas.ReplicaRouter"]
+REPLICA_STICKY_SECONDS = float(os.getenv("REPLICA_STICKY_SECONDS", "5"))
+REPLICA_RETRY_SECONDS = float(os.getenv("REPLICA_RETRY_SECONDS", "30"))
+
 # Custom user model
 AUTH_USER_MODEL = "sales.User"
 
@@ -105,13 +130,13 @@ CORS_ALLOWED_ORIGINS = os.getenv(
     "http://localhost:5173,https://manikandan-developer24.github.io"
 ).split(",")
 
-CORS_ALLOW_HEADERS = list(default_headers) + ["authorization"]
+CORS_ALLOW_HEADERS = list(default_headers) + ["authorization", "idempotency-key"]
 
 
 # Django REST Framework + JWT
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "sales.authentication.ClaimsJWTAuthentication",
     ),
     "DEFAULT_PERMISSION_CLASSES": (
         "rest_framework.permissions.IsAuthenticated",
@@ -123,4 +148,71 @@ SIMPLE_JWT = {
     "REFRESH_TOKEN_LIFETIME": timedelta(days=7),
 }
 
+# request.user is rebuilt from token claims; account state (active/role/counter) is
+# re-read from the database at most once per TTL per user per worker
+AUTH_PRINCIPAL_CACHE_TTL = int(os.getenv("AUTH_PRINCIPAL_CACHE_TTL", "60"))
+AUTH_PRINCIPAL_CACHE_SIZE = int(os.getenv("AUTH_PRINCIPAL_CACHE_SIZE", "1024"))
+
+# how long a stored Idempotency-Key response is kept before purge_idempotency_keys drops it
+IDEMPOTENCY_KEY_TTL_HOURS = int(os.getenv("IDEMPOTENCY_KEY_TTL_HOURS", "48"))
+
+# Catalog change ids are assigned at INSERT, not commit; a change written this long ago
+# has committed (or rolled back), so versions up to it are settled (sales/catalog.py).
+# Longer than any billing, import or sync transaction
+CATALOG_SETTLE_SECONDS = float(os.getenv("CATALOG_SETTLE_SECONDS", "30"))
+
+# Product search: in-process index (sales/search.py), re-synced with the catalog at most
+# every PRODUCT_SEARCH_REFRESH_SECONDS; False falls back to indexed database queries
+PRODUCT_SEARCH_INDEX = os.getenv("PRODUCT_SEARCH_INDEX", "True") == "True"
+PRODUCT_SEARCH_REFRESH_SECONDS = float(os.getenv("PRODUCT_SEARCH_REFRESH_SECONDS", "2"))
+
+# Request metrics (see sales/metrics.py): each worker flushes its counters to a file in
+# METRICS_DIR and /api/metrics/ sums them. SLOW_REQUEST_MS > 0 logs slower requests with their SQL.
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "True") == "True"
+METRICS_DIR = os.getenv("METRICS_DIR", os.path.join(tempfile.gettempdir(), "webillz-metrics"))
+METRICS_FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", "5"))
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "0"))
+
+# Offline sales (/api/sales/sync/) are dated by the counter's clock when it is no more than
+# this many days behind the upload; otherwise, or when it is ahead, by the upload time
+SYNC_MAX_AGE_DAYS = int(os.getenv("SYNC_MAX_AGE_DAYS", "30"))
+
+# Invoice numbers run per counter per financial year (sales/invoices.py); India's starts in April
+FINANCIAL_YEAR_START_MONTH = int(os.getenv("FINANCIAL_YEAR_START_MONTH", "4"))
+
+# Stock keeping (sales/inventory.py). "single": every sale decrements Product.stock.
+# "sharded": each counter sells from its own StockShard row and borrows from the pool or
+# other counters only when it runs out, so counters don't queue on a hot product's row;
+# Product.stock is then refreshed by `manage.py consolidate_stock` (cron). Switching to
+# sharded: consolidate_stock --reset; switching back: run consolidate_stock first.
+INVENTORY_MODE = os.getenv("INVENTORY_MODE", "single")
+
+# Daily reports of closed days, written once and served from disk (sales/report_cache.py);
+# least recently used files go once the cache outgrows REPORT_CACHE_MAX_BYTES
+REPORT_CACHE_DIR = os.getenv("REPORT_CACHE_DIR", os.path.join(tempfile.gettempdir(), "webillz-reports"))
+REPORT_CACHE_MAX_BYTES = int(os.getenv("REPORT_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+
+# Background jobs (sales/jobs.py): queued in the database through /api/jobs/ and run by
+# `manage.py run_jobs`. Failed jobs are retried JOB_MAX_ATTEMPTS times, backing off from
+# JOB_RETRY_SECONDS; a running job silent for JOB_STALE_SECONDS is taken back. Results
+# (and failed jobs) are deleted JOB_RESULT_TTL_HOURS after they finish.
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_RESULTS_DIR = os.getenv("JOB_RESULTS_DIR", os.path.join(BASE_DIR, "job-results"))
+JOB_RESULT_TTL_HOURS = int(os.getenv("JOB_RESULT_TTL_HOURS", "24"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_RETRY_SECONDS = float(os.getenv("JOB_RETRY_SECONDS", "30"))
+JOB_STALE_SECONDS = float(os.getenv("JOB_STALE_SECONDS", "300"))
+
+# Live sales for the admin dashboard (/api/sales/stream/, sales/live.py, ASGI only). Each
+# worker keeps the last SALE_STREAM_BUFFER events for clients resuming with Last-Event-ID
+# and, besides its own commits (and Postgres NOTIFY), looks for sales billed by other
+# workers every SALE_STREAM_POLL_SECONDS while anyone is watching
+SALE_STREAM_BUFFER = int(os.getenv("SALE_STREAM_BUFFER", "1000"))
+SALE_STREAM_POLL_SECONDS = float(os.getenv("SALE_STREAM_POLL_SECONDS", "2"))
+SALE_STREAM_KEEPALIVE_SECONDS = float(os.getenv("SALE_STREAM_KEEPALIVE_SECONDS", "15"))
+SALE_STREAM_RETRY_MS = int(os.getenv("SALE_STREAM_RETRY_MS", "3000"))   # EventSource reconnect delay
+
+# Closed months moved out of the Sale table by `manage.py archive_sales` (sales/archive.py)
+SALES_ARCHIVE_DIR = os.getenv("SALES_ARCHIVE_DIR", os.path.join(BASE_DIR, "archive"))
+
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
@@ -2,16 +2,23 @@
 from django.contrib import admin
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from sales.views import ProductViewSet, SaleViewSet, CreateUserByAdminView, profile_view
+from sales.views import ProductViewSet, SaleViewSet, JobViewSet, CreateUserByAdminView, profile_view, metrics_view
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from sales.serializers import UserSerializer
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from rest_framework_simplejwt.views import TokenObtainPairView as BaseTokenObtainPairView
 from sales.views import me
 from sales.views import StaffListView
+from sales.authentication import add_principal_claims
+from sales import async_views
 
 # custom token serializer to include user info in login response
 class MyTokenObtainPairSerializer(TokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        # role/counter/name claims let ClaimsJWTAuthentication skip the per-request User query
+        return add_principal_claims(super().get_token(user), user)
+
     def validate(self, attrs):
         data = super().validate(attrs)
         user = self.user
@@ -31,6 +38,7 @@ class MyTokenObtainPairView(BaseTokenObtainPairView):
 router = DefaultRouter()
 router.register(r"products", ProductViewSet, basename="product")
 router.register(r"sales", SaleViewSet, basename="sale")
+router.register(r"jobs", JobViewSet, basename="job")
 
 urlpatterns = [
     path("admin/", admin.site.urls),
@@ -40,5 +48,16 @@ urlpatterns = [
     path("api/auth/token/refresh/", TokenRefreshView.as_view(), name="token_refresh"),
     path("api/auth/profile/", profile_view, name="profile"),
     path("api/users/", StaffListView.as_view(), name="staff-list"),
+    path("api/metrics/", metrics_view, name="metrics"),
+    # async twins of the hot read endpoints, for ASGI deployments (sales/async_views.py)
+    path("api/async/products/", async_views.product_list, name="async-product-list"),
+    path("api/async/products/<str:pk>/", async_views.product_detail, name="async-product-detail"),
+    path("api/async/users/me/", async_views.me, name="async-user-me"),
+    path("api/async/users/", async_views.staff_list, name="async-staff-list"),
+    path("api/async/auth/profile/", async_views.profile, name="async-profile"),
+    path("api/async/sales/", async_views.sale_list, name="async-sale-list"),
+    path("api/async/sales/summary/", async_views.sale_summary, name="async-sale-summary"),
+    # server-sent events of live sales; ahead of the router, whose sales/<pk>/ would match it
+    path("api/sales/stream/", async_views.sale_stream, name="sale-stream"),
     path("api/", include(router.urls)),
 ]
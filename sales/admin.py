@@ -1,7 +1,8 @@
 # sales/admin.py
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from .models import User, Product, Sale
+from .models import User, Product, ProductVersion, Sale, DailySalesSummary, CatalogChange, IdempotencyKey, InvoiceBlock, InvoiceSequence, Job, StockShard
+from .inventory import set_stock
 
 @admin.register(User)
 class UserAdmin(BaseUserAdmin):
@@ -11,7 +12,53 @@ class UserAdmin(BaseUserAdmin):
 class ProductAdmin(admin.ModelAdmin):
     list_display = ("id", "name", "price", "gstPct", "stock")
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if "stock" in form.changed_data:
+            set_stock({obj.pk: obj.stock})
+
+@admin.register(ProductVersion)
+class ProductVersionAdmin(admin.ModelAdmin):
+    list_display = ("id", "product_id", "name", "price", "gstPct", "created_at")   # the product may be gone
+    search_fields = ("product__id", "name")
+
+@admin.register(StockShard)
+class StockShardAdmin(admin.ModelAdmin):
+    list_display = ("product", "counter", "quantity")
+    list_filter = ("counter",)
+    search_fields = ("product__id",)
+
 @admin.register(Sale)
 class SaleAdmin(admin.ModelAdmin):
-    list_display = ("id", "product", "staff", "qty", "total", "date")
-    readonly_fields = ("date",)
+    list_display = ("id", "invoice_no", "product", "staff", "qty", "total", "date")
+    readonly_fields = ("date", "invoice_no")
+    search_fields = ("invoice_no",)
+
+@admin.register(InvoiceSequence)
+class InvoiceSequenceAdmin(admin.ModelAdmin):
+    list_display = ("counter", "financial_year", "last_number")
+    readonly_fields = ("last_number",)
+
+@admin.register(InvoiceBlock)
+class InvoiceBlockAdmin(admin.ModelAdmin):
+    list_display = ("counter", "financial_year", "first", "last", "staff", "issued_at")
+
+@admin.register(DailySalesSummary)
+class DailySalesSummaryAdmin(admin.ModelAdmin):
+    list_display = ("business_date", "counter", "staff", "product", "mode", "sales", "qty", "total")
+    list_filter = ("mode", "counter")
+
+@admin.register(CatalogChange)
+class CatalogChangeAdmin(admin.ModelAdmin):
+    list_display = ("id", "product_id", "deleted", "changed_at")
+    search_fields = ("product_id",)
+
+@admin.register(IdempotencyKey)
+class IdempotencyKeyAdmin(admin.ModelAdmin):
+    list_display = ("key", "staff", "endpoint", "status_code", "created_at")
+    search_fields = ("key",)
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ("id", "kind", "status", "owner", "attempts", "progress", "total", "created_at", "finished_at")
+    list_filter = ("status", "kind")
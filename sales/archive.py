@@ -0,0 +1,198 @@
+# sales/archive.py
+import gzip
+import io
+import json
+import os
+import re
+from datetime import date, datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db.models import Q
+
+from .exports import sale_csv_row
+from .filters import day_bounds, dimension_values
+
+MONTH = re.compile(r"^(\d{4})-(\d{2})$")
+
+# columns read per archived sale, in file order; the product_version__ ones are written
+# as one "product_snapshot" object, so the file stands alone once the sale is deleted
+ARCHIVE_FIELDS = (
+    "id", "date", "counter", "staff_id", "product_id", "qty", "discount", "taxable", "gst", "total",
+    "mode", "product_version__name", "product_version__hsn", "product_version__price", "product_version__gstPct",
+    "client_id", "client_ts", "invoice_no",
+)
+VERSION_PREFIX = "product_version__"
+# written as str(): the Decimals and the UUID
+TEXT_FIELDS = ("discount", "taxable", "gst", "total", "client_id", "product_version__price", "product_version__gstPct")
+
+
+def parse_month(value):
+    match = MONTH.match(value or "")
+    if not match or not 1 <= int(match.group(2)) <= 12:
+        raise ValueError(f"invalid month {value!r}, use YYYY-MM")
+    return date(int(match.group(1)), int(match.group(2)), 1)
+
+
+def next_month(first):
+    return date(first.year + first.month // 12, first.month % 12 + 1, 1)
+
+
+def month_bounds(first):
+    """[first of month 00:00, first of next month 00:00) in UTC, the report day boundaries."""
+    return day_bounds(first, first)[0], day_bounds(next_month(first), next_month(first))[0]
+
+
+def _record(row):
+    out = {}
+    snapshot = {}
+    for field, value in zip(ARCHIVE_FIELDS, row):
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        elif value is not None and field in TEXT_FIELDS:
+            value = str(value)
+        if field.startswith(VERSION_PREFIX):
+            snapshot[field[len(VERSION_PREFIX):]] = value
+        else:
+            out[field] = value
+    out["product_snapshot"] = None if snapshot["name"] is None else {"id": out["product_id"], **snapshot}
+    return out
+
+
+class _Prefix(io.RawIOBase):
+    """The first `size` bytes of a file: the part the manifest vouches for."""
+
+    def __init__(self, fh, size):
+        self.fh = fh
+        self.left = size
+
+    def readable(self):
+        return True
+
+    def readinto(self, buf):
+        n = min(len(buf), self.left)
+        if n <= 0:
+            return 0
+        data = self.fh.read(n)
+        buf[:len(data)] = data
+        self.left -= len(data)
+        return len(data)
+
+
+class MonthArchive:
+    """
+    One month of archived sales: sales-YYYY-MM.jsonl.gz plus a sales-YYYY-MM.json manifest.
+
+    The data file is append-only, one gzip member per batch, ordered by (date, id). The
+    manifest records how many bytes are good and the (date, id) of the last archived sale;
+    it is written after the batch is on disk and before the batch is deleted from the
+    database. After a crash anything past `offset` is cut off and rows up to the last key
+    are known to be safe to delete, so a rerun neither loses nor duplicates sales.
+    """
+
+    def __init__(self, first, directory=None):
+        self.first = first
+        self.directory = directory or settings.SALES_ARCHIVE_DIR
+        self.label = first.strftime("%Y-%m")
+        self.data_path = os.path.join(self.directory, f"sales-{self.label}.jsonl.gz")
+        self.manifest_path = os.path.join(self.directory, f"sales-{self.label}.json")
+        self.manifest = self._load()
+
+    def _load(self):
+        try:
+            with open(self.manifest_path) as fh:
+                return json.load(fh)
+        except FileNotFoundError:
+            return {"month": self.label, "offset": 0, "rows": 0, "last_date": None, "last_id": None, "complete": False}
+
+    @property
+    def exists(self):
+        return os.path.exists(self.manifest_path)
+
+    def save(self):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp = f"{self.manifest_path}.tmp"
+        with open(tmp, "w") as fh:
+            json.dump(self.manifest, fh)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp, self.manifest_path)
+
+    def archived(self):
+        """Q for the sales of this month already safely in the file."""
+        lo, hi = month_bounds(self.first)
+        if self.manifest["last_id"] is None:
+            return Q(pk__in=[])
+        last_date = datetime.fromisoformat(self.manifest["last_date"])
+        return Q(date__gte=lo, date__lt=hi) & (
+            Q(date__lt=last_date) | Q(date=last_date, id__lte=self.manifest["last_id"])
+        )
+
+    def append(self, rows):
+        """Write `rows` (values_list tuples in ARCHIVE_FIELDS order) as one gzip member, then the manifest."""
+        os.makedirs(self.directory, exist_ok=True)
+        records = [_record(row) for row in rows]
+        member = gzip.compress(b"".join(json.dumps(r, separators=(",", ":")).encode() + b"\n" for r in records))
+        with open(self.data_path, "ab") as fh:
+            fh.truncate(self.manifest["offset"])   # drop a batch a crash left unconfirmed
+            fh.seek(self.manifest["offset"])
+            fh.write(member)
+            fh.flush()
+            os.fsync(fh.fileno())
+            offset = fh.tell()
+        last = records[-1]
+        self.manifest.update(
+            offset=offset, rows=self.manifest["rows"] + len(records), last_date=last["date"], last_id=last["id"],
+        )
+        self.save()
+
+    def records(self):
+        """Archived sales as dicts, in (date, id) order; only bytes the manifest confirms are read."""
+        if not self.manifest["offset"]:
+            return
+        with open(self.data_path, "rb") as fh:
+            with gzip.GzipFile(fileobj=io.BufferedReader(_Prefix(fh, self.manifest["offset"]))) as gz:
+                for line in gz:
+                    yield json.loads(line)
+
+
+def archived_months(directory=None):
+    directory = directory or settings.SALES_ARCHIVE_DIR
+    try:
+        names = sorted(os.listdir(directory))
+    except FileNotFoundError:
+        return []
+    months = []
+    for name in names:
+        match = re.match(r"^sales-(\d{4}-\d{2})\.json$", name)
+        if match:
+            months.append(MonthArchive(parse_month(match.group(1)), directory))
+    return months
+
+
+def archived_csv_rows(start, end, params, staff_names):
+    """
+    Report CSV rows for archived sales between the business dates start..end,
+    with the same counter / staff / mode filters as the live report.
+    """
+    lo, hi = day_bounds(start, end)
+    months = [m for m in archived_months() if m.first < hi.date() and next_month(m.first) > lo.date()]
+    if not months:
+        return
+    values = dimension_values(params)
+    if values is None:
+        return
+    for month in months:
+        for r in month.records():
+            when = datetime.fromisoformat(r["date"])
+            if not lo <= when < hi or any(r[k] != v for k, v in values.items()):
+                continue
+            snapshot = r["product_snapshot"] or {}
+            yield sale_csv_row(
+                staff_names, r["date"], r["counter"], r["staff_id"], r["product_id"], snapshot.get("name"),
+                snapshot.get("price"), r["qty"], r["discount"], r["taxable"], r["gst"], r["total"],
+            )
+
+
+def current_month():
+    today = datetime.now(dt_timezone.utc).date()
+    return today.replace(day=1)
@@ -0,0 +1,255 @@
+# sales/async_views.py
+"""
+Async versions of the hot read endpoints, mounted under /api/async/ with the same
+responses as their DRF twins. They are plain Django async views (DRF views can't be
+async): JWT auth, permissions and errors are handled by `async_endpoint`, queries go
+through the async ORM, and under an ASGI server (see backend/gunicorn_asgi.py) a slow
+client or a long response no longer holds a worker. The live sales stream
+(/api/sales/stream/) is only served here.
+"""
+import asyncio
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Max
+from django.http import HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils import timezone
+from rest_framework import exceptions
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from .authentication import ClaimsJWTAuthentication
+from .catalog import acurrent_version, achanges_since, cached_catalog_body, catalog_body, etag_matches
+from .filters import aresolve_staff, filter_dimensions, filter_sales
+from .listing import SALE_LIST_FIELDS, asale_refs, sale_list_data
+from .live import counter_totals, encode, hub, sale_events
+from .models import DailySalesSummary, Product, Sale, User
+from .pagination import SaleCursorPagination
+from .permissions import IsAdmin
+from .replicas import replica_reads
+from .serializers import ProductSerializer, UserSerializer
+from .summary import SUMMARY_GROUPS, SUMMARY_SUMS, business_date, summary_params, summary_row
+
+authenticator = ClaimsJWTAuthentication()
+
+
+def render(data, status=200):
+    """JSON exactly as DRF's JSONRenderer writes it for the sync endpoints."""
+    return HttpResponse(JSONRenderer().render(data), status=status, content_type="application/json")
+
+
+def error_response(exc):
+    data = exc.detail if isinstance(exc.detail, (list, dict)) else {"detail": exc.detail}
+    response = render(data, exc.status_code)
+    if exc.status_code == 401:
+        response["WWW-Authenticate"] = authenticator.authenticate_header(None)
+    return response
+
+
+def async_endpoint(*permissions, token_param=None):
+    """
+    GET-only async view with ClaimsJWTAuthentication and DRF permission classes;
+    `token_param` also accepts the access token as a query parameter.
+    """
+
+    def decorate(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method != "GET":
+                return error_response(exceptions.MethodNotAllowed(request.method))
+            try:
+                auth = await authenticator.authenticate_async(request, token_param)
+                if auth is None:
+                    raise exceptions.NotAuthenticated()
+                request.user, request.auth = auth
+                if not all(permission().has_permission(request, None) for permission in permissions):
+                    raise exceptions.PermissionDenied()
+                return await view(request, *args, **kwargs)
+            except exceptions.APIException as exc:
+                return error_response(exc)
+
+        return wrapper
+
+    return decorate
+
+
+# ---- Products ----
+@async_endpoint(IsAuthenticated)
+async def product_list(request):
+    """GET /api/async/products/ and ?since=<v> -- same ETag / delta contract as /api/products/"""
+    version = await acurrent_version()
+    since = request.GET.get("since")
+    if since is not None:
+        if not since.isdigit():
+            return render({"detail": "since must be a catalog version number"}, 400)
+        etag = f'"catalog-{since}-{version.tag}"'
+    else:
+        etag = f'"catalog-{version.tag}"'
+
+    if etag_matches(etag, request.headers.get("If-None-Match")):
+        response = HttpResponseNotModified()
+    elif since is not None:
+        products, deleted = await achanges_since(int(since))
+        response = render({
+            "version": version.settled,
+            "since": int(since),
+            "products": ProductSerializer(products, many=True).data,
+            "deleted": deleted,
+        })
+    else:
+        body = cached_catalog_body(version)
+        if body is None:
+            body = await sync_to_async(catalog_body)(version)
+        response = HttpResponse(body, content_type="application/json")
+        response["X-Catalog-Version"] = str(version.settled)
+    response["ETag"] = etag
+    response["Cache-Control"] = "no-cache"
+    return response
+
+
+@async_endpoint(IsAuthenticated)
+async def product_detail(request, pk):
+    """GET /api/async/products/<id>/"""
+    product = await Product.objects.filter(pk=pk).afirst()
+    if product is None:
+        raise exceptions.NotFound("No Product matches the given query.")
+    return render(ProductSerializer(product).data)
+
+
+# ---- Users ----
+@async_endpoint(IsAuthenticated)
+async def me(request):
+    """GET /api/async/users/me/"""
+    user = request.user
+    return render({
+        "id": str(user.id),
+        "username": user.username,
+        "name": getattr(user, "name", ""),
+        "role": getattr(user, "role", ""),
+        "counter": getattr(user, "counter", None),
+    })
+
+
+@async_endpoint(IsAuthenticated)
+async def profile(request):
+    """GET /api/async/auth/profile/"""
+    return render(UserSerializer(request.user).data)
+
+
+@async_endpoint(IsAuthenticated)
+@replica_reads
+async def staff_list(request):
+    """GET /api/async/users/"""
+    staff = [user async for user in User.objects.filter(role="staff")]
+    return render(UserSerializer(staff, many=True).data)
+
+
+# ---- Sales ----
+@async_endpoint(IsAuthenticated, IsAdmin)
+@replica_reads
+async def sale_list(request):
+    """GET /api/async/sales/?from=&to=&date=&counter=&staff=&mode=&cursor=  (Admin only)"""
+    drf_request = Request(request)
+    params = await aresolve_staff(drf_request.query_params)
+    qs, _, _ = filter_sales(Sale.objects.values(*SALE_LIST_FIELDS), params)
+    paginator = SaleCursorPagination()
+    page = await paginator.apaginate_queryset(qs, drf_request)
+    data = sale_list_data(page, *await asale_refs(page))
+    return render(paginator.get_paginated_response(data).data)
+
+
+@async_endpoint(IsAuthenticated, IsAdmin)
+@replica_reads
+async def sale_summary(request):
+    """GET /api/async/sales/summary/?period=&date=&counter=&staff=&mode=&group=  (Admin only)"""
+    params = await aresolve_staff(request.GET)
+    period, group, start, end = summary_params(params)
+    qs = filter_dimensions(DailySalesSummary.objects.filter(business_date__range=(start, end)), params)
+
+    data = {
+        "period": period,
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        "totals": summary_row(await qs.aaggregate(**SUMMARY_SUMS)),
+        "days": [
+            dict(date=row.pop("business_date").isoformat(), **summary_row(row))
+            async for row in qs.values("business_date").annotate(**SUMMARY_SUMS).order_by("business_date")
+        ],
+    }
+    if group:
+        field = SUMMARY_GROUPS[group]
+        data["groups"] = [
+            dict(key=row.pop(field), **summary_row(row))
+            async for row in qs.values(field).annotate(**SUMMARY_SUMS).order_by(field)
+        ]
+    return render(data)
+
+
+@async_endpoint(IsAuthenticated, IsAdmin, token_param="token")
+async def sale_stream(request):
+    """
+    GET /api/sales/stream/  (Admin only; EventSource passes ?token=<access token>)
+    Server-sent events: "totals" (today's per-counter totals) on connect, then a "sale"
+    event per committed sale with its counter's new totals. A reconnect's Last-Event-ID
+    header (or ?last_event_id=) replays the sales missed since; when that is more than
+    SALE_STREAM_BUFFER sales it gets one "reset" event instead, and should reload its list.
+    ASGI only: under WSGI Django reads an async stream to the end before sending it, and
+    this one never ends, so there it answers 501.
+    """
+    if not isinstance(request, ASGIRequest):
+        return render({"detail": "the live sales stream needs the ASGI server (backend/gunicorn_asgi.py)"}, 501)
+    last_id = request.headers.get("Last-Event-ID") or request.GET.get("last_event_id") or ""
+    response = StreamingHttpResponse(
+        _sale_stream(int(last_id) if last_id.isdigit() else None), content_type="text/event-stream"
+    )
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"   # nginx: pass events through as they come
+    return response
+
+
+async def _sale_stream(last_id):
+    subscriber = hub.subscribe()   # before the catch-up reads, so nothing committed meanwhile is missed
+    try:
+        yield f"retry: {settings.SALE_STREAM_RETRY_MS}\n\n".encode()
+        totals = await counter_totals()
+        yield encode("totals", {"date": business_date(timezone.now()).isoformat(), "counters": list(totals.values())})
+        sent = set()
+        floor = 0   # after a reset, sales up to here are in the list the client reloads
+        if last_id is not None:
+            backlog = hub.replay(last_id)
+            if backlog is None:
+                backlog, floor = await _missed_sales(last_id)
+            for event_id, event in backlog:
+                sent.add(event_id)
+                yield event
+        while True:
+            try:
+                item = await asyncio.wait_for(subscriber.queue.get(), settings.SALE_STREAM_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:   # not the builtin TimeoutError before Python 3.11
+                yield b": keepalive\n\n"   # keeps proxies from timing the connection out
+                continue
+            if item is None:
+                return   # fell behind; the client reconnects and catches up
+            event_id, event = item
+            if event_id not in sent and event_id > floor:
+                yield event
+    finally:
+        hub.unsubscribe(subscriber)
+
+
+async def _missed_sales(last_id):
+    """
+    (events, floor) for a client resuming after `last_id` that the hub's buffer no longer
+    covers: every sale since, read from the database, or past SALE_STREAM_BUFFER of them
+    a single "reset" event carrying the newest id, which is then the floor below which
+    live events are dropped. Sending only the first page would leave a gap before them.
+    """
+    qs = Sale.objects.filter(pk__gt=last_id).order_by("pk").values(*SALE_LIST_FIELDS)
+    rows = [row async for row in qs[:settings.SALE_STREAM_BUFFER + 1]]
+    if len(rows) <= settings.SALE_STREAM_BUFFER:
+        return await sale_events(rows), 0
+    newest = (await Sale.objects.aaggregate(last=Max("pk")))["last"]
+    return [(newest, encode("reset", {"last_id": newest}, newest))], newest
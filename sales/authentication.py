@@ -0,0 +1,151 @@
+# sales/authentication.py
+import threading
+import time
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import User
+
+# columns that can change under a live token and must win over its claims
+STATE_FIELDS = ("username", "role", "counter", "is_active")
+
+
+def add_principal_claims(token, user):
+    """Claims ClaimsJWTAuthentication needs to rebuild request.user without a query."""
+    token["username"] = user.username
+    token["name"] = user.get_full_name() or user.username
+    token["first_name"] = user.first_name
+    token["last_name"] = user.last_name
+    token["role"] = user.role
+    token["counter"] = user.counter
+    return token
+
+
+class UserStateCache:
+    """
+    Tiny thread-safe LRU of user pk -> current account state, each entry trusted for `ttl`
+    seconds. Local saves/deletes evict immediately (see sales.signals); other workers
+    pick up a deactivation or role change within the TTL.
+    """
+
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, pk):
+        now = time.monotonic()
+        with self._lock:
+            hit = self._entries.get(pk)
+            if hit and hit[0] > now:
+                self._entries.move_to_end(pk)
+                return hit[1]
+        return self._store(pk, now, User.objects.filter(pk=pk).values(*STATE_FIELDS).first())
+
+    async def aget(self, pk):
+        """get() for async views: a hit never leaves the event loop, a miss uses the async ORM."""
+        now = time.monotonic()
+        with self._lock:
+            hit = self._entries.get(pk)
+            if hit and hit[0] > now:
+                self._entries.move_to_end(pk)
+                return hit[1]
+        return self._store(pk, now, await User.objects.filter(pk=pk).values(*STATE_FIELDS).afirst())
+
+    def _store(self, pk, now, state):
+        with self._lock:
+            self._entries[pk] = (now + self.ttl, state)
+            self._entries.move_to_end(pk)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return state
+
+    def invalidate(self, pk):
+        with self._lock:
+            self._entries.pop(pk, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+user_states = UserStateCache(
+    maxsize=getattr(settings, "AUTH_PRINCIPAL_CACHE_SIZE", 1024),
+    ttl=getattr(settings, "AUTH_PRINCIPAL_CACHE_TTL", 60),
+)
+
+
+def principal_from_claims(pk, claims, state):
+    """
+    A User instance assembled from token claims, never loaded from the database.
+    It is good for FK assignment, permission checks and serializers; it is not for saving.
+    """
+    user = User(
+        pk=pk,
+        first_name=claims.get("first_name", ""),
+        last_name=claims.get("last_name", ""),
+        **state,
+    )
+    user._state.adding = False
+    user._state.db = "default"
+    return user
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that builds request.user from the token's claims. Account state
+    (active, role, counter) is checked against a short-lived in-process cache, so a warm
+    worker authenticates requests without touching the database.
+    """
+
+    def get_user(self, validated_token):
+        if "role" not in validated_token:
+            # issued before these claims existed: fall back to the database lookup
+            return super().get_user(validated_token)
+        pk = self._claimed_pk(validated_token)
+        return self._principal(pk, validated_token, user_states.get(pk))
+
+    async def aget_user(self, validated_token):
+        if "role" not in validated_token:
+            return await sync_to_async(super().get_user)(validated_token)
+        pk = self._claimed_pk(validated_token)
+        return self._principal(pk, validated_token, await user_states.aget(pk))
+
+    async def authenticate_async(self, request, query_param=None):
+        """
+        authenticate() for plain async Django views (DRF views are sync-only): (user, token),
+        or None when there is no bearer token. Raises the same exceptions as the sync path.
+        With `query_param`, a request without the header may pass the token as ?<query_param>=
+        (EventSource can't set headers).
+        """
+        header = self.get_header(request)
+        if header is not None:
+            raw_token = self.get_raw_token(header)
+        elif query_param:
+            raw_token = request.GET.get(query_param, "").encode() or None
+        else:
+            return None
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        return await self.aget_user(validated_token), validated_token
+
+    def _claimed_pk(self, validated_token):
+        try:
+            return int(validated_token[api_settings.USER_ID_CLAIM])
+        except (KeyError, TypeError, ValueError):
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+    def _principal(self, pk, validated_token, state):
+        if state is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+        if not state["is_active"]:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        return principal_from_claims(pk, validated_token, state)
@@ -0,0 +1,60 @@
+# sales/billing.py
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F
+
+from .catalog import record_changes
+from .models import Product, ProductVersion
+
+_versions = {}   # version_key(product) -> ProductVersion id, committed rows only
+
+
+def price_line(product, qty, discount):
+    """Return (taxable, gst, total) for `qty` units of `product` less `discount`."""
+    subtotal = (product.price * qty) - discount
+    taxable = max(Decimal("0.00"), subtotal)
+    gst = (taxable * product.gstPct) / Decimal("100.00")
+    total = (taxable + gst).quantize(Decimal("0.01"))
+    return taxable, gst, total
+
+
+def version_key(product):
+    return (product.pk, product.name, product.hsn, product.price, product.gstPct)
+
+
+def product_version_id(product):
+    """
+    Id of the ProductVersion matching the product as it is being billed, stored on each
+    Sale. Resolved from a per-process cache; a miss is one get_or_create. The id is
+    cached once the surrounding transaction commits (the row may have been made in it),
+    so a rolled-back bill never leaves an id behind that doesn't exist. Versions are
+    never deleted, not even with their product, so a committed id stays good in every
+    worker and a hit needs no query.
+    """
+    key = version_key(product)
+    vid = _versions.get(key)
+    if vid is None:
+        vid = ProductVersion.objects.get_or_create(
+            product_id=product.pk, name=product.name, hsn=product.hsn, price=product.price, gstPct=product.gstPct,
+        )[0].pk
+        transaction.on_commit(lambda: _versions.__setitem__(key, vid))
+    return vid
+
+
+def forget_product_versions(product_id=None):
+    """Drop a product's cached version ids, or with no id all of them (tests, after a rollback)."""
+    for key in [k for k in _versions if product_id is None or k[0] == product_id]:
+        _versions.pop(key, None)
+
+
+def reserve_stock(product_id, qty):
+    """
+    Take `qty` units off a product with a single conditional UPDATE
+    (stock = stock - qty WHERE id = ? AND stock >= qty).
+    Returns False, leaving stock untouched, when there isn't enough.
+    """
+    if Product.objects.filter(pk=product_id, stock__gte=qty).update(stock=F("stock") - qty) != 1:
+        return False
+    record_changes([product_id])
+    return True
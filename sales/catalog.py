@@ -0,0 +1,108 @@
+# sales/catalog.py
+import threading
+from collections import namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Count, Max
+from django.utils import timezone
+from django.utils.http import parse_etags
+from rest_framework.renderers import JSONRenderer
+
+from .models import CatalogChange, Product
+from .serializers import ProductSerializer
+
+_lock = threading.Lock()
+_cached = {"version": None, "body": None}   # full catalog, pre-rendered, for one version
+
+
+class Version(namedtuple("Version", "settled latest recent")):
+    """
+    The catalog version. Change ids are handed out at INSERT, not at commit, so a change
+    can become visible after a higher id already has. `settled` is the newest id written
+    over CATALOG_SETTLE_SECONDS ago: every change up to it has committed (or rolled
+    back), so it is the version clients sync from, and deltas re-send the few changes
+    above it. `latest` and `recent` (the newest id, and how many changes lie above
+    `settled`) move the tag when a late change turns up.
+    """
+    __slots__ = ()
+
+    @property
+    def tag(self):
+        return f"{self.settled}.{self.latest}.{self.recent}"
+
+
+def _settled():
+    # newest first down the primary key: only the last few seconds' changes are passed over
+    cutoff = timezone.now() - timedelta(seconds=settings.CATALOG_SETTLE_SECONDS)
+    return CatalogChange.objects.filter(changed_at__lt=cutoff).order_by("-id").values_list("id", flat=True)[:1]
+
+
+def current_version():
+    """The catalog Version (all zeros for a catalog that has never changed)."""
+    settled = _settled().first() or 0
+    above = CatalogChange.objects.filter(id__gt=settled).aggregate(latest=Max("id"), recent=Count("id"))
+    return Version(settled, above["latest"] or settled, above["recent"])
+
+
+async def acurrent_version():
+    settled = await _settled().afirst() or 0
+    above = await CatalogChange.objects.filter(id__gt=settled).aaggregate(latest=Max("id"), recent=Count("id"))
+    return Version(settled, above["latest"] or settled, above["recent"])
+
+
+def etag_matches(etag, if_none_match):
+    """
+    Weak If-None-Match comparison: CompressionMiddleware hands out W/"..." for encoded
+    bodies, and clients send that form back.
+    """
+    return any(tag.removeprefix("W/") == etag for tag in parse_etags(if_none_match or ""))
+
+
+def record_changes(product_ids, deleted=False):
+    """Bump the catalog version for these products; call in the transaction that changes them."""
+    CatalogChange.objects.bulk_create([CatalogChange(product_id=pid, deleted=deleted) for pid in product_ids])
+
+
+def catalog_body(version):
+    """
+    The full product list as rendered JSON bytes. Rendered once per Version per process;
+    the products are read after `version`, so the cached copy is never older than its label.
+    """
+    body = cached_catalog_body(version)
+    if body is not None:
+        return body
+    products = Product.objects.all().order_by("name")
+    body = JSONRenderer().render(ProductSerializer(products, many=True).data)
+    with _lock:
+        if _cached["version"] is None or _cached["version"] <= version:
+            _cached.update(version=version, body=body)
+    return body
+
+
+def cached_catalog_body(version):
+    """The rendered catalog if this process already has `version`, else None; never queries."""
+    with _lock:
+        if _cached["version"] == version:
+            return _cached["body"]
+    return None
+
+
+def invalidate_cache():
+    with _lock:
+        _cached.update(version=None, body=None)
+
+
+def changes_since(since):
+    """(changed products, deleted ids) for everything touched after version `since`."""
+    touched = set(CatalogChange.objects.filter(id__gt=since).values_list("product_id", flat=True).distinct())
+    products = list(Product.objects.filter(pk__in=touched).order_by("name"))
+    deleted = sorted(touched - {p.pk for p in products})
+    return products, deleted
+
+
+async def achanges_since(since):
+    touched = {pid async for pid in CatalogChange.objects.filter(id__gt=since).values_list("product_id", flat=True).distinct()}
+    products = [p async for p in Product.objects.filter(pk__in=touched).order_by("name")]
+    deleted = sorted(touched - {p.pk for p in products})
+    return products, deleted
@@ -0,0 +1,84 @@
+# sales/exports.py
+import csv
+import io
+import zlib
+from decimal import Decimal
+
+from .models import User
+
+EXPORT_CHUNK_SIZE = 2000   # rows fetched per round trip / server-side cursor batch
+FLUSH_BYTES = 64 * 1024    # how much CSV to buffer before handing a chunk to the server
+
+SALES_CSV_HEADER = ["date", "counter", "staff", "product", "qty", "price", "discount", "taxable", "gst", "total"]
+
+
+class StaffNames(dict):
+    """staff pk -> display name, looked up once per staff member and then reused."""
+
+    def __missing__(self, pk):
+        row = User.objects.filter(pk=pk).values_list("first_name", "last_name", "username").first()
+        if row is None:
+            name = ""
+        else:
+            first, last, username = row
+            name = f"{first} {last}".strip() or username
+        self[pk] = name
+        return name
+
+
+def iter_csv(header, rows):
+    """Encode rows as CSV, yielding ~64KB chunks instead of one string per row."""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(header)
+    for row in rows:
+        writer.writerow(row)
+        if buf.tell() >= FLUSH_BYTES:
+            yield buf.getvalue().encode()
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue().encode()
+
+
+def iter_gzip(chunks):
+    """Gzip a byte stream on the fly."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31 = gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def sale_csv_rows(qs, staff_names=None):
+    """
+    CSV rows for a Sale queryset, read as a flat values_list projection in chunks.
+    Product name and price come from the ProductVersion billed, joined in the same
+    query, so the figures match what was actually charged.
+    """
+    staff_names = StaffNames() if staff_names is None else staff_names
+    rows = qs.order_by("date", "id").values_list(
+        "date", "counter", "staff_id", "product_id", "product_version__name", "product_version__price",
+        "qty", "discount", "taxable", "gst", "total",
+    ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    for date, counter, staff_id, product_id, name, price, qty, discount, taxable, gst, total in rows:
+        yield sale_csv_row(staff_names, date.isoformat(), counter, staff_id, product_id, name, price, qty, discount, taxable, gst, total)
+
+
+def sale_csv_row(staff_names, date, counter, staff_id, product_id, name, price, qty, discount, taxable, gst, total):
+    """
+    One report line; `date` is already an ISO string, amounts are Decimals or their str().
+    Sales without a billed version show the product id and no price.
+    """
+    return [
+        date,
+        counter,
+        staff_names[staff_id],
+        product_id if name is None else name,
+        qty,
+        "" if price is None else f"{Decimal(str(price)):.2f}",
+        str(discount),
+        str(taxable),
+        str(gst),
+        str(total),
+    ]
@@ -0,0 +1,109 @@
+# sales/filters.py
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from .models import User
+
+
+def parse_date(value, name="date"):
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ValidationError({"detail": f"invalid {name} format, use YYYY-MM-DD"})
+
+
+def day_bounds(start, end):
+    """[start 00:00, day after end 00:00) in UTC, the same day boundaries the reports have always used."""
+    lo = datetime.combine(start, time.min, tzinfo=dt_timezone.utc)
+    hi = datetime.combine(end + timedelta(days=1), time.min, tzinfo=dt_timezone.utc)
+    return lo, hi
+
+
+def date_range(params, default_today=False):
+    """
+    Read ?date=YYYY-MM-DD or ?from=...&to=... (either end optional).
+    Returns (start, end) dates, (None, None) when no range was asked for.
+    """
+    if params.get("date"):
+        day = parse_date(params["date"])
+        return day, day
+
+    start = parse_date(params["from"], "from") if params.get("from") else None
+    end = parse_date(params["to"], "to") if params.get("to") else None
+    if start is None and end is None:
+        if default_today:
+            today = timezone.localdate()
+            return today, today
+        return None, None
+    if start and end and start > end:
+        raise ValidationError({"detail": "from must be on or before to"})
+    return start, end
+
+
+def filter_sales(qs, params, default_today=False):
+    """
+    Apply the shared sales filters: date range, counter, staff and mode.
+    `staff` accepts a user pk or the frontend "u-<username>" id.
+    Returns (queryset, start, end).
+    """
+    start, end = date_range(params, default_today=default_today)
+    if start is not None:
+        qs = qs.filter(date__gte=day_bounds(start, start)[0])
+    if end is not None:
+        qs = qs.filter(date__lt=day_bounds(end, end)[1])
+    return filter_dimensions(qs, params), start, end
+
+
+def filter_dimensions(qs, params):
+    """counter / staff / mode filters, for any model carrying those three columns."""
+    values = dimension_values(params)
+    if values is None:
+        return qs.none()
+    return qs.filter(**values)
+
+
+def dimension_values(params):
+    """
+    The counter / staff / mode filters as {column: value}, validated.
+    Returns None when nothing can match (a staff username that doesn't exist).
+    """
+    values = {}
+    counter = params.get("counter")
+    if counter:
+        if not counter.isdigit():
+            raise ValidationError({"detail": "counter must be a number"})
+        values["counter"] = int(counter)
+
+    staff = params.get("staff")
+    if staff:
+        if staff.startswith("u-"):
+            # resolve to a pk up front so the filter stays on the indexed staff_id column
+            staff_id = User.objects.filter(username=staff[2:]).values_list("pk", flat=True).first()
+            if not staff_id:
+                return None
+            values["staff_id"] = staff_id
+        elif staff.isdigit():
+            values["staff_id"] = int(staff)
+        else:
+            raise ValidationError({"detail": "staff must be a user id or u-<username>"})
+
+    mode = params.get("mode")
+    if mode:
+        values["mode"] = mode
+    return values
+
+
+async def aresolve_staff(params):
+    """
+    For async views: swap a "u-<username>" staff filter for the user's pk with the async ORM,
+    so filter_sales / filter_dimensions can then run without touching the database.
+    """
+    staff = params.get("staff")
+    if not staff or not staff.startswith("u-"):
+        return params
+    params = params.copy()
+    staff_id = await User.objects.filter(username=staff[2:]).values_list("pk", flat=True).afirst()
+    params["staff"] = str(staff_id or 0)   # no user 0, so an unknown username matches nothing
+    return params
@@ -0,0 +1,73 @@
+# sales/idempotency.py
+import hashlib
+import json
+from functools import wraps
+
+from django.db import IntegrityError, transaction
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+HEADER = "Idempotency-Key"
+
+
+def _fingerprint(endpoint, request):
+    data = request.data
+    if hasattr(data, "lists"):  # QueryDict from a form post
+        data = dict(data.lists())
+    raw = json.dumps([endpoint, data], sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def _replay(record, fingerprint):
+    if record.request_hash != fingerprint:
+        return Response(
+            {"detail": f"{HEADER} was already used for a different request"},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
+    return Response(record.response, status=record.status_code, headers={"Idempotent-Replayed": "true"})
+
+
+def idempotent(endpoint):
+    """
+    Make a billing view safe to retry with an Idempotency-Key header.
+    The key row is inserted before the view runs, inside the same transaction, so a
+    concurrent duplicate waits on the unique index and then replays instead of billing
+    again. Only successful responses are remembered; a failed attempt can be retried.
+    """
+    def decorator(view_method):
+        @wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            key = request.headers.get(HEADER)
+            if not key:
+                return view_method(self, request, *args, **kwargs)
+            if len(key) > 255:
+                return Response({"detail": f"{HEADER} is too long"}, status=status.HTTP_400_BAD_REQUEST)
+
+            fingerprint = _fingerprint(endpoint, request)
+            stored = IdempotencyKey.objects.filter(staff_id=request.user.pk, key=key).first()
+            if stored is not None:
+                return _replay(stored, fingerprint)
+
+            try:
+                with transaction.atomic():
+                    record = IdempotencyKey.objects.create(
+                        staff_id=request.user.pk, key=key, endpoint=endpoint, request_hash=fingerprint,
+                    )
+                    response = view_method(self, request, *args, **kwargs)
+                    if status.is_success(response.status_code):
+                        record.status_code = response.status_code
+                        record.response = json.loads(JSONRenderer().render(response.data))
+                        record.save(update_fields=["status_code", "response"])
+                    else:
+                        transaction.set_rollback(True)
+            except IntegrityError:
+                stored = IdempotencyKey.objects.filter(staff_id=request.user.pk, key=key).first()
+                if stored is None:
+                    raise
+                return _replay(stored, fingerprint)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,168 @@
+# sales/inventory.py
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef, Subquery, Sum
+from django.utils import timezone
+
+from .billing import reserve_stock
+from .catalog import record_changes
+from .models import DailySalesSummary, Product, StockShard, User
+
+POOL = 0             # counter of the central pool; staff without a counter bill straight from it
+POOL_SHARE = 0.2     # of a product's stock kept back in the pool by rebalance()
+VELOCITY_DAYS = 7    # sales history rebalance() splits the rest by
+
+
+def sharded():
+    return settings.INVENTORY_MODE == "sharded"
+
+
+def take_stock(product_id, qty, counter):
+    """
+    Take `qty` units of a product for a sale on `counter`, inside the sale's transaction.
+    Returns False, with nothing taken, when there isn't enough.
+
+    Single mode: one conditional UPDATE on Product.stock (billing.reserve_stock).
+    Sharded mode: one conditional UPDATE on this counter's shard; when that runs short,
+    the whole qty from one other row, the pool first and then the fullest counter, and
+    only when no single row has enough are the product's shards locked in counter order
+    and drained together. A sale holds at most one shard row per product or all of them
+    in a fixed order, so billing in product pk order still can't deadlock.
+    """
+    if not sharded():
+        return reserve_stock(product_id, qty)
+    shards = StockShard.objects.filter(product_id=product_id)
+    if shards.filter(counter=counter, quantity__gte=qty).update(quantity=F("quantity") - qty):
+        return True
+    return _borrow(product_id, qty, counter)
+
+
+def _borrow(product_id, qty, counter):
+    shards = StockShard.objects.filter(product_id=product_id)
+    held = dict(shards.values_list("counter", "quantity"))
+    if not held:
+        _open_pool([product_id])
+        held = dict(shards.values_list("counter", "quantity"))
+    donors = sorted((c for c, q in held.items() if c != counter and q >= qty), key=lambda c: (c != POOL, -held[c]))
+    for donor in donors:
+        if shards.filter(counter=donor, quantity__gte=qty).update(quantity=F("quantity") - qty):
+            return True
+    if sum(held.values()) < qty:
+        return False
+
+    locked = list(shards.select_for_update().order_by("counter"))
+    if sum(s.quantity for s in locked) < qty:
+        return False
+    need = qty
+    for shard in sorted(locked, key=lambda s: (s.counter != counter, s.counter != POOL, -s.quantity)):
+        used = min(need, max(shard.quantity, 0))
+        shard.quantity -= used
+        need -= used
+    StockShard.objects.bulk_update(locked, ["quantity"])
+    return True
+
+
+def _open_pool(product_ids):
+    """A product's first sharded sale or rebalance: its consolidated stock becomes the pool."""
+    StockShard.objects.bulk_create(
+        [StockShard(product_id=pid, counter=POOL, quantity=stock)
+         for pid, stock in Product.objects.filter(pk__in=product_ids).values_list("pk", "stock")],
+        ignore_conflicts=True,   # a concurrent sale opened it first
+    )
+
+
+def available_stock(product):
+    """Units a sale could take now: the shards' total, or Product.stock in single mode or before the first shard."""
+    if sharded():
+        total = StockShard.objects.filter(product_id=product.pk).aggregate(total=Sum("quantity"))["total"]
+        if total is not None:
+            return total
+    return product.stock
+
+
+def set_stock(stock):
+    """
+    Absolute stock levels {product id: units} from an admin edit or an import, in the
+    transaction that saves them. Sharded: the counters' shards are emptied and the pool
+    holds everything until the next rebalance.
+    """
+    if not sharded() or not stock:
+        return
+    ids = sorted(stock)
+    shards = StockShard.objects.filter(product_id__in=ids)
+    list(shards.select_for_update().order_by("product_id", "counter").values_list("pk"))
+    shards.exclude(counter=POOL).update(quantity=0)
+    StockShard.objects.bulk_create(
+        [StockShard(product_id=pid, counter=POOL, quantity=stock[pid]) for pid in ids],
+        update_conflicts=True,
+        unique_fields=["product", "counter"],
+        update_fields=["quantity"],
+    )
+
+
+def consolidate():
+    """
+    Set Product.stock, which the catalog and ProductSerializer report, to the total of each
+    product's shards. One UPDATE computes the totals itself, so sales landing meanwhile
+    are never overwritten with an older figure. Returns the ids whose stock changed.
+    """
+    total = StockShard.objects.filter(product=OuterRef("pk")).values("product").annotate(total=Sum("quantity")).values("total")
+    stale = Product.objects.filter(Exists(StockShard.objects.filter(product=OuterRef("pk")))).exclude(stock=Subquery(total))
+    with transaction.atomic():
+        ids = sorted(stale.values_list("pk", flat=True))
+        if ids:
+            Product.objects.filter(pk__in=ids).update(stock=Subquery(total))
+            record_changes(ids)
+    return ids
+
+
+def rebalance(days=VELOCITY_DAYS):
+    """
+    Redistribute every product's stock over the counters: POOL_SHARE stays in the pool and
+    the rest is split by what each active counter sold of it in the last `days` days (plus
+    one, so a quiet counter still gets some). One short transaction per product, with its
+    shards locked in counter order. Returns how many products' shards changed.
+    """
+    counters = sorted(set(User.objects.filter(is_active=True, counter__gt=POOL).values_list("counter", flat=True)))
+    since = timezone.now().date() - timedelta(days=days)
+    sold = defaultdict(dict)
+    rows = (
+        DailySalesSummary.objects.filter(business_date__gte=since, counter__in=counters)
+        .values("product_id", "counter").annotate(qty=Sum("qty")).values_list("product_id", "counter", "qty")
+    )
+    for product_id, counter, qty in rows:
+        sold[product_id][counter] = qty
+
+    opened = set(StockShard.objects.values_list("product_id", flat=True).distinct())
+    changed = 0
+    for product_id in list(Product.objects.order_by("pk").values_list("pk", flat=True)):
+        with transaction.atomic():
+            if product_id not in opened:
+                _open_pool([product_id])
+            StockShard.objects.bulk_create([StockShard(product_id=product_id, counter=c) for c in counters], ignore_conflicts=True)
+            shards = list(StockShard.objects.select_for_update().filter(product_id=product_id).order_by("counter"))
+            total = sum(s.quantity for s in shards)
+            targets = _targets(total, counters, sold[product_id])
+            moved = [s for s in shards if s.quantity != targets.get(s.counter, 0)]
+            for shard in moved:
+                shard.quantity = targets.get(shard.counter, 0)
+            StockShard.objects.bulk_update(moved, ["quantity"])
+            if Product.objects.filter(pk=product_id).exclude(stock=total).update(stock=total):
+                record_changes([product_id])
+            changed += bool(moved)
+    return changed
+
+
+def _targets(total, counters, sold):
+    """counter -> units; the pool gets POOL_SHARE plus whatever rounding leaves over."""
+    if total <= 0 or not counters:
+        return {POOL: total}
+    weights = {c: sold.get(c, 0) + 1 for c in counters}
+    spread = int(total * (1 - POOL_SHARE))
+    weight = sum(weights.values())
+    targets = {c: spread * w // weight for c, w in weights.items()}
+    targets[POOL] = total - sum(targets.values())
+    return targets
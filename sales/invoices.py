@@ -0,0 +1,99 @@
+# sales/invoices.py
+import re
+from datetime import timezone as dt_timezone
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .models import InvoiceBlock, InvoiceSequence
+
+INVOICE_NO = re.compile(r"^C(\d+)/(\d{4}-\d{2})/(\d+)$")
+MAX_BLOCK_SIZE = 1000
+
+
+def financial_year(when):
+    """Financial year label of a UTC date, e.g. 2026-27 for April 2026 to March 2027."""
+    day = when.astimezone(dt_timezone.utc).date()
+    start = day.year if day.month >= settings.FINANCIAL_YEAR_START_MONTH else day.year - 1
+    return f"{start}-{(start + 1) % 100:02d}"
+
+
+def format_invoice_no(counter, year, number):
+    return f"C{counter}/{year}/{number:06d}"
+
+
+def parse_invoice_no(value):
+    """(counter, financial year, number), or None if `value` isn't an invoice number."""
+    match = INVOICE_NO.match(value or "")
+    if not match:
+        return None
+    return int(match.group(1)), match.group(2), int(match.group(3))
+
+
+def _start_sequence(counter, year):
+    try:
+        # savepoint: another request may start the same sequence first
+        with transaction.atomic():
+            InvoiceSequence.objects.create(counter=counter, financial_year=year)
+    except IntegrityError:
+        pass
+
+
+def lock_sequence(counter, year):
+    """
+    Lock a counter's sequence row for the rest of the transaction. Billing takes it before
+    any product row, so a path that only learns how many numbers it needs later (offline
+    sync) still locks in the same order as the others.
+    """
+    def locked():
+        # a fresh queryset each time: a reused one would answer from its cached result
+        return InvoiceSequence.objects.select_for_update().filter(counter=counter, financial_year=year).exists()
+
+    if not locked():
+        _start_sequence(counter, year)
+        locked()
+
+
+def allocate_invoice_numbers(counter, when, count=1):
+    """
+    The next `count` invoice numbers of `counter` for the financial year of `when`.
+    Call inside the transaction that saves the sales: the UPDATE keeps the row locked
+    until commit and a rollback hands the numbers back, so the sequence has no gaps.
+    Only this counter's row is locked.
+    """
+    year = financial_year(when)
+    rows = InvoiceSequence.objects.filter(counter=counter, financial_year=year)
+    if not rows.update(last_number=F("last_number") + count):
+        _start_sequence(counter, year)
+        rows.update(last_number=F("last_number") + count)
+    last = rows.values_list("last_number", flat=True).get()
+    return [format_invoice_no(counter, year, n) for n in range(last - count + 1, last + 1)]
+
+
+def issue_block(staff, counter, when, size):
+    """Reserve `size` numbers for offline billing on `counter`; unused ones stay as gaps."""
+    with transaction.atomic():
+        numbers = allocate_invoice_numbers(counter, when, size)
+        _, year, first = parse_invoice_no(numbers[0])
+        return InvoiceBlock.objects.create(
+            counter=counter, financial_year=year, first=first, last=first + size - 1, staff=staff,
+        )
+
+
+def issued_numbers(counter, invoice_nos):
+    """Which of `invoice_nos` fall in a block issued to `counter`."""
+    parsed = {no: parse_invoice_no(no) for no in invoice_nos}
+    wanted = {p for p in parsed.values() if p is not None and p[0] == counter}
+    if not wanted:
+        return set()
+    blocks = InvoiceBlock.objects.filter(
+        counter=counter, financial_year__in={p[1] for p in wanted},
+    ).values_list("financial_year", "first", "last")
+    ranges = {}
+    for year, first, last in blocks:
+        ranges.setdefault(year, []).append((first, last))
+    return {
+        no for no, p in parsed.items()
+        if p in wanted and any(first <= p[2] <= last for first, last in ranges.get(p[1], ()))
+    }
@@ -0,0 +1,279 @@
+# sales/jobs.py
+import logging
+import os
+import threading
+import time
+import uuid
+from datetime import timedelta
+from itertools import chain
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from .archive import archived_csv_rows
+from .exports import StaffNames, sale_csv_rows
+from .filters import date_range, filter_sales
+from .models import Job, Product, Sale
+from .product_io import export_rows, iter_products_csv, iter_products_jsonl
+from .renderers import iter_report
+
+logger = logging.getLogger("sales.jobs")
+
+PROGRESS_EVERY = 2000       # rows between progress writes, and...
+HEARTBEAT_SECONDS = 5       # ...at least this often while rows flow; the heartbeat is this often regardless
+REPORT_FORMATS = ("csv", "columnar", "msgpack")
+
+
+class JobError(Exception):
+    """A job that can't succeed however often it is retried (bad params, nothing to export)."""
+
+
+class Kind:
+    def __init__(self, run, check, concurrency):
+        self.run, self.check, self.concurrency = run, check, concurrency
+
+
+KINDS = {}   # kind name -> Kind
+
+
+def kind(name, concurrency=1, check=None):
+    """Register a job runner: run(params, progress) -> (chunks, content type, download filename)."""
+    def register(run):
+        KINDS[name] = Kind(run, check or (lambda params: None), concurrency)
+        return run
+    return register
+
+
+# ---- Job kinds ----
+
+def _check_report(params):
+    date_range(params)   # raises ValidationError on a bad date or range
+    if params.get("format", "csv") not in REPORT_FORMATS:
+        raise ValidationError({"params": f"format must be one of {', '.join(REPORT_FORMATS)}"})
+
+
+@kind("daily_report", concurrency=2, check=_check_report)
+def daily_report(params, progress):
+    """The /api/sales/daily_report/ export: same params (date or from/to, counter, staff, mode, gzip, format)."""
+    qs, start, end = filter_sales(Sale.objects.all(), params, default_today=True)
+    if start is None:
+        raise JobError("from is required when to is given")
+    end = end or timezone.localdate()
+    progress.expect(qs.count())
+    staff_names = StaffNames()
+    rows = chain(archived_csv_rows(start, end, params, staff_names), sale_csv_rows(qs, staff_names))
+    body, content_type, ext = iter_report(progress.track(rows), params.get("format", "csv"), params.get("gzip") in ("1", "true", True))
+    name = f"sales-{start.isoformat()}" if start == end else f"sales-{start.isoformat()}_{end.isoformat()}"
+    return body, content_type, f"{name}.{ext}"
+
+
+@kind("products_export")
+def products_export(params, progress):
+    """The product catalog as CSV, or JSON Lines with {"type": "jsonl"}."""
+    progress.expect(Product.objects.count())
+    rows = progress.track(export_rows())
+    if params.get("type") == "jsonl":
+        return iter_products_jsonl(rows), "application/x-ndjson", "products.jsonl"
+    return iter_products_csv(rows), "text/csv", "products.csv"
+
+
+# ---- Queue ----
+
+def submit(owner, kind_name, params):
+    """Queue a job after checking its params; raises ValidationError for an unknown kind or bad params."""
+    if kind_name not in KINDS:
+        raise ValidationError({"kind": f"unknown job kind, pick from {', '.join(sorted(KINDS))}"})
+    if not isinstance(params, dict):
+        raise ValidationError({"params": "must be an object"})
+    KINDS[kind_name].check(params)
+    return Job.objects.create(owner=owner, kind=kind_name, params=params)
+
+
+def claim(worker):
+    """
+    Take the oldest ready job whose kind has a free concurrency slot, or None. The slot
+    is a numbered place unique among a kind's running jobs (Job.Meta), so the limit holds
+    across worker processes and machines without a lock table.
+    """
+    now = timezone.now()
+    ready = Job.objects.filter(status=Job.QUEUED, run_after__lte=now).order_by("run_after", "pk")
+    for pk, kind_name in ready.values_list("pk", "kind")[:50]:
+        spec = KINDS.get(kind_name)
+        if spec is None:
+            Job.objects.filter(pk=pk, status=Job.QUEUED).update(status=Job.FAILED, error=f"unknown job kind {kind_name!r}", finished_at=now)
+            continue
+        for slot in range(spec.concurrency):
+            try:
+                with transaction.atomic():
+                    taken = Job.objects.filter(pk=pk, status=Job.QUEUED).update(
+                        status=Job.RUNNING, slot=slot, worker=worker, attempts=F("attempts") + 1,
+                        started_at=now, heartbeat_at=now, progress=0, error="",
+                    )
+            except IntegrityError:
+                continue   # slot in use, try the next one
+            if taken:
+                return Job.objects.get(pk=pk)
+            break          # another worker got this job
+    return None
+
+
+class Progress:
+    """Counts rows as a job streams them and writes the count (and a heartbeat) back now and then."""
+
+    def __init__(self, job):
+        self.job = job
+        self.done = 0
+        self.saved_at = time.monotonic()
+
+    def expect(self, total):
+        self.job.total = total
+        self._save(total=total)
+
+    def track(self, rows):
+        for row in rows:
+            self.done += 1
+            if not self.done % PROGRESS_EVERY or time.monotonic() - self.saved_at > HEARTBEAT_SECONDS:
+                self._save(progress=self.done)
+            yield row
+
+    def _save(self, **fields):
+        self.saved_at = time.monotonic()
+        Job.objects.filter(pk=self.job.pk, worker=self.job.worker).update(heartbeat_at=timezone.now(), **fields)
+
+
+class Heartbeat(threading.Thread):
+    """
+    Touches a running job's heartbeat_at every HEARTBEAT_SECONDS from its own thread, so a
+    long count or first query, with no rows flowing yet, doesn't get the job requeued as
+    stale (and run twice, past its kind's concurrency) while this worker is still on it.
+    """
+
+    def __init__(self, job):
+        super().__init__(name=f"job-{job.pk}-heartbeat", daemon=True)
+        self.job = job
+        self.stopped = threading.Event()
+
+    def run(self):
+        try:
+            while not self.stopped.wait(HEARTBEAT_SECONDS):
+                try:
+                    self.beat()
+                except Exception:
+                    logger.exception("job %s: heartbeat failed", self.job.pk)
+        finally:
+            connection.close()   # this thread's own connection
+
+    def beat(self):
+        Job.objects.filter(pk=self.job.pk, worker=self.job.worker, status=Job.RUNNING).update(heartbeat_at=timezone.now())
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def run(job):
+    """Run a claimed job to completion: its result file written, or a retry or failure recorded."""
+    progress = Progress(job)
+    heartbeat = Heartbeat(job)
+    heartbeat.start()
+    try:
+        chunks, content_type, filename = KINDS[job.kind].run(job.params, progress)
+        path, size = _write_result(job, chunks)
+    except JobError as exc:
+        _fail(job, str(exc), retry=False)
+        return
+    except Exception as exc:
+        logger.exception("job %s (%s) failed on attempt %s", job.pk, job.kind, job.attempts)
+        _fail(job, f"{type(exc).__name__}: {exc}", retry=True)
+        return
+    finally:
+        heartbeat.stop()
+    now = timezone.now()
+    finished = Job.objects.filter(pk=job.pk, worker=job.worker, status=Job.RUNNING).update(
+        status=Job.DONE, slot=None, result=os.path.basename(path), filename=filename, content_type=content_type,
+        size=size, progress=progress.done, finished_at=now, heartbeat_at=now,
+        expires_at=now + timedelta(hours=settings.JOB_RESULT_TTL_HOURS),
+    )
+    if not finished:
+        _remove(path)   # cancelled, or taken back as stale, while it ran
+
+
+def _write_result(job, chunks):
+    os.makedirs(settings.JOB_RESULTS_DIR, exist_ok=True)
+    path = os.path.join(settings.JOB_RESULTS_DIR, f"{job.pk}-{uuid.uuid4().hex}")
+    size = 0
+    try:
+        with open(path, "wb") as fh:
+            for chunk in chunks:
+                fh.write(chunk)
+                size += len(chunk)
+    except BaseException:
+        _remove(path)
+        raise
+    return path, size
+
+
+def _fail(job, error, retry):
+    """Queue the job again after a backoff while it has attempts left, else mark it failed."""
+    now = timezone.now()
+    running = Job.objects.filter(pk=job.pk, worker=job.worker, status=Job.RUNNING)
+    if retry and job.attempts < settings.JOB_MAX_ATTEMPTS:
+        delay = settings.JOB_RETRY_SECONDS * 2 ** (job.attempts - 1)
+        running.update(status=Job.QUEUED, slot=None, worker="", error=error, run_after=now + timedelta(seconds=delay))
+    else:
+        running.update(
+            status=Job.FAILED, slot=None, error=error, finished_at=now,
+            expires_at=now + timedelta(hours=settings.JOB_RESULT_TTL_HOURS),
+        )
+
+
+def requeue_stale():
+    """
+    Jobs whose worker stopped sending heartbeats (killed, machine lost) go back in the
+    queue, or fail once out of attempts. Returns how many were taken back.
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.JOB_STALE_SECONDS)
+    stale = list(Job.objects.filter(status=Job.RUNNING, heartbeat_at__lt=cutoff))
+    for job in stale:
+        _fail(job, "worker stopped responding", retry=True)
+    return len(stale)
+
+
+def purge_expired():
+    """Delete jobs past expires_at along with their result files. Returns how many went."""
+    expired = list(Job.objects.filter(expires_at__lt=timezone.now()))
+    for job in expired:
+        delete_job(job)
+    return len(expired)
+
+
+def delete_job(job):
+    if job.result:
+        _remove(result_path(job.result))
+    job.delete()
+
+
+def result_path(result):
+    return os.path.join(settings.JOB_RESULTS_DIR, result)
+
+
+def work(worker, stop, poll):
+    """One worker's loop: claim, run, repeat; sleep `poll` seconds while the queue is empty."""
+    while not stop.is_set():
+        job = claim(worker)
+        if job is None:
+            stop.wait(poll)
+        else:
+            run(job)
+
+
+def _remove(path):
+    if not path:
+        return
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,65 @@
+# sales/listing.py
+from django.utils import timezone
+
+from .models import Product, User
+from .search import product_row
+
+# the Sale columns SaleSerializer's output is built from
+SALE_LIST_FIELDS = ("id", "invoice_no", "date", "counter", "staff_id", "product_id", "qty", "discount", "taxable", "gst", "total", "mode")
+
+PRODUCT_FIELDS = ("id", "name", "hsn", "price", "gstPct", "stock")
+STAFF_FIELDS = ("pk", "first_name", "last_name", "username")
+
+
+def _date_repr(value, tz):
+    """DRF DateTimeField output: ISO 8601 in the current time zone, "Z" for UTC."""
+    text = value.astimezone(tz).isoformat()
+    return text[:-6] + "Z" if text.endswith("+00:00") else text
+
+
+def _staff_entry(pk, first, last, username):
+    # get_full_name() or username, and the frontend "u-<username>" id
+    return pk, ((f"{first} {last}".strip() or username), f"u-{username}")
+
+
+def sale_refs(rows):
+    """Products and staff for a page of sales: one IN query each instead of a join per row."""
+    product_ids = {r["product_id"] for r in rows}
+    staff_ids = {r["staff_id"] for r in rows}
+    products = {p[0]: product_row(*p) for p in Product.objects.filter(pk__in=product_ids).values_list(*PRODUCT_FIELDS)}
+    staff = dict(_staff_entry(*u) for u in User.objects.filter(pk__in=staff_ids).values_list(*STAFF_FIELDS))
+    return products, staff
+
+
+async def asale_refs(rows):
+    product_ids = {r["product_id"] for r in rows}
+    staff_ids = {r["staff_id"] for r in rows}
+    products = {p[0]: product_row(*p) async for p in Product.objects.filter(pk__in=product_ids).values_list(*PRODUCT_FIELDS)}
+    staff = dict([_staff_entry(*u) async for u in User.objects.filter(pk__in=staff_ids).values_list(*STAFF_FIELDS)])
+    return products, staff
+
+
+def sale_list_data(rows, products, staff):
+    """
+    SaleSerializer's output, key for key, built from SALE_LIST_FIELDS rows. No model
+    instances, nested serializers or method fields; each product and staff member is
+    formatted once per page and shared by every sale that refers to it.
+    """
+    tz = timezone.get_current_timezone()
+    out = []
+    for r in rows:
+        name, staff_id = staff[r["staff_id"]]
+        out.append({
+            "id": r["id"],
+            "invoice_no": r["invoice_no"],
+            "date": _date_repr(r["date"], tz),
+            "counter": r["counter"],
+            "staff": name,
+            "staffId": staff_id,
+            "product": products[r["product_id"]],
+            "qty": r["qty"],
+            "discount": f"{r['discount']:.2f}",
+            "totals": {"taxable": float(r["taxable"]), "gst": float(r["gst"]), "total": float(r["total"])},
+            "mode": r["mode"],
+        })
+    return out
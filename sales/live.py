@@ -0,0 +1,226 @@
+# sales/live.py
+"""
+Live sales for the admin dashboard (/api/sales/stream/, async_views.sale_stream).
+
+Each worker process has one SaleHub. Billing paths call `announce(sales)` in the
+transaction that writes the sales; once it commits, the hub wakes its pump, which reads
+the new rows and today's totals of their counters once and hands the same encoded event
+to every connected dashboard. Sales billed by other workers arrive through Postgres
+LISTEN/NOTIFY, or on other databases by the pump looking for newer ids every
+SALE_STREAM_POLL_SECONDS. The last SALE_STREAM_BUFFER events are kept for clients that
+reconnect with Last-Event-ID.
+"""
+import asyncio
+import contextvars
+import logging
+import select
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+from django.db.models import Max, Q
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from .listing import SALE_LIST_FIELDS, asale_refs, sale_list_data
+from .models import DailySalesSummary, Sale
+from .summary import SUMMARY_SUMS, business_date, summary_row
+
+logger = logging.getLogger("sales.live")
+
+CHANNEL = "sales_stream"   # Postgres NOTIFY channel; the payload is comma-separated sale ids
+NOTIFY_IDS = 500           # ids per NOTIFY, well inside its 8000 byte payload limit
+FETCH_ROWS = 500           # sales read per pump pass
+
+
+def announce(sales):
+    """
+    Call inside the transaction that writes `sales`: the stream hears of them once it
+    commits, and never if it rolls back. The NOTIFY is sent after commit rather than in
+    the billing transaction, where Postgres would serialise commits on its notify lock.
+    """
+    ids = [s.pk for s in sales]
+    if ids:
+        transaction.on_commit(lambda: publish(ids), robust=True)
+
+
+def publish(ids):
+    if connection.vendor == "postgresql":
+        # every worker's listener, this one's included, wakes its own hub
+        with connection.cursor() as cursor:
+            for i in range(0, len(ids), NOTIFY_IDS):
+                cursor.execute("SELECT pg_notify(%s, %s)", [CHANNEL, ",".join(map(str, ids[i:i + NOTIFY_IDS]))])
+    else:
+        hub.notify(ids)
+
+
+def encode(name, data, event_id=None):
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {name}\ndata: ".encode() + JSONRenderer().render(data) + b"\n\n"
+
+
+async def counter_totals(counters=None):
+    """Today's totals per counter (all counters, or just these) from DailySalesSummary."""
+    qs = DailySalesSummary.objects.filter(business_date=business_date(timezone.now()))
+    if counters is not None:
+        qs = qs.filter(counter__in=counters)
+    return {
+        row["counter"]: dict(counter=row["counter"], **summary_row(row))
+        async for row in qs.values("counter").annotate(**SUMMARY_SUMS).order_by("counter")
+    }
+
+
+async def sale_events(rows):
+    """Encoded "sale" events for SALE_LIST_FIELDS rows, each with its counter's totals for today."""
+    if not rows:
+        return []
+    data = sale_list_data(rows, *await asale_refs(rows))
+    totals = await counter_totals({r["counter"] for r in rows})
+    events = []
+    for sale in data:
+        counter = totals.get(sale["counter"]) or dict(counter=sale["counter"], **summary_row(dict.fromkeys(SUMMARY_SUMS)))
+        events.append((sale["id"], encode("sale", {"sale": sale, "counter": counter}, sale["id"])))
+    return events
+
+
+class Subscriber:
+    def __init__(self):
+        self.queue = asyncio.Queue(maxsize=settings.SALE_STREAM_BUFFER)
+
+
+class SaleHub:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._loop = None
+        self._wake = None
+        self._pump_task = None
+        self._pending = set()          # ids announced since the pump's last pass
+        self._last_id = 0              # highest sale id the pump has read
+        self._recent = OrderedDict()   # sale id -> encoded event, in the order they went out
+        self._listening = False
+
+    def subscribe(self):
+        """Register a client on the running loop, starting the pump for the first one."""
+        loop = asyncio.get_running_loop()
+        if self._loop is not None and self._loop is not loop:
+            self._subscribers.clear()   # left behind on a loop that is gone
+            self._stop()
+        subscriber = Subscriber()
+        self._subscribers.add(subscriber)
+        if self._pump_task is None:
+            self._recent.clear()   # it would hide the sales missed while nobody watched
+            self._loop, self._wake = loop, asyncio.Event()
+            # a clean context: the pump outlives the request that happened to start it
+            self._pump_task = loop.create_task(self._pump(self._wake), context=contextvars.Context())
+            if connection.vendor == "postgresql":
+                self._listen_once()
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        self._subscribers.discard(subscriber)
+        if not self._subscribers:
+            self._stop()
+
+    def notify(self, ids=()):
+        """Thread-safe: new sale ids have committed. A no-op while nobody is watching."""
+        loop = self._loop
+        if loop is None:
+            return
+        with self._lock:
+            self._pending.update(ids)
+        try:
+            loop.call_soon_threadsafe(self._wake.set)
+        except RuntimeError:
+            pass   # loop closed under us; the next subscriber starts a new pump
+
+    def replay(self, last_id):
+        """Buffered events after `last_id`, or None when it isn't in the buffer."""
+        if last_id not in self._recent:
+            return None
+        ids = list(self._recent)
+        return [(i, self._recent[i]) for i in ids[ids.index(last_id) + 1:]]
+
+    def _stop(self):
+        if self._pump_task is not None:
+            self._pump_task.cancel()
+        self._pump_task = self._loop = self._wake = None
+
+    async def _pump(self, wake):
+        with self._lock:
+            self._pending.clear()
+        self._last_id = (await Sale.objects.aaggregate(last=Max("pk")))["last"] or 0
+        while self._pump_task is asyncio.current_task():
+            try:
+                await asyncio.wait_for(wake.wait(), settings.SALE_STREAM_POLL_SECONDS)
+            except asyncio.TimeoutError:   # not the builtin TimeoutError before Python 3.11
+                pass
+            wake.clear()
+            with self._lock:
+                ids, self._pending = self._pending, set()
+            try:
+                await self._read(ids, wake)
+            except Exception:
+                logger.exception("sale stream: reading new sales failed")
+
+    async def _read(self, ids, wake):
+        # newer ids, plus announced ones below the high-water mark that committed late
+        late = {i for i in ids if i <= self._last_id and i not in self._recent}
+        qs = Sale.objects.filter(Q(pk__gt=self._last_id) | Q(pk__in=late)).order_by("pk").values(*SALE_LIST_FIELDS)
+        rows = [row async for row in qs[:FETCH_ROWS]]
+        if len(rows) == FETCH_ROWS:
+            wake.set()   # more waiting: go round again without the poll delay
+        if not rows:
+            return
+        self._last_id = max(self._last_id, rows[-1]["id"])
+        for event_id, event in await sale_events(rows):
+            self._recent[event_id] = event
+            for subscriber in list(self._subscribers):
+                self._deliver(subscriber, event_id, event)
+        while len(self._recent) > settings.SALE_STREAM_BUFFER:
+            self._recent.popitem(last=False)
+
+    def _deliver(self, subscriber, event_id, event):
+        try:
+            subscriber.queue.put_nowait((event_id, event))
+        except asyncio.QueueFull:
+            # too slow to keep up: end its stream; EventSource reconnects with Last-Event-ID
+            self._subscribers.discard(subscriber)
+            while not subscriber.queue.empty():
+                subscriber.queue.get_nowait()
+            subscriber.queue.put_nowait(None)
+
+    def _listen_once(self):
+        if not self._listening:
+            self._listening = True
+            threading.Thread(target=self._listen, name="sale-stream-listen", daemon=True).start()
+
+    def _listen(self):
+        """Postgres: one LISTEN connection per worker, kept for the life of the process."""
+        db = connections[DEFAULT_DB_ALIAS]
+        while True:
+            conn = None
+            try:
+                conn = db.get_new_connection(db.get_connection_params())
+                conn.autocommit = True
+                with conn.cursor() as cursor:
+                    cursor.execute(f"LISTEN {CHANNEL}")
+                while True:
+                    if select.select([conn], [], [], 60)[0]:
+                        conn.poll()
+                        ids = []
+                        while conn.notifies:
+                            ids.extend(int(i) for i in conn.notifies.pop(0).payload.split(","))
+                        self.notify(ids)
+            except Exception:
+                logger.exception("sale stream: LISTEN connection lost, reconnecting")
+                self.notify()   # the poll picks up whatever was missed meanwhile
+                time.sleep(5)
+            finally:
+                if conn is not None:
+                    conn.close()
+
+
+hub = SaleHub()
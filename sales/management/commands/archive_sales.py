@@ -0,0 +1,84 @@
+# sales/management/commands/archive_sales.py
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Min
+
+from sales.archive import ARCHIVE_FIELDS, MonthArchive, archived_months, current_month, month_bounds, next_month, parse_month
+from sales.models import Sale
+
+
+class Command(BaseCommand):
+    help = (
+        "Move sales from closed months into append-only gzip JSONL files under SALES_ARCHIVE_DIR, "
+        "deleting them in small batches. Daily summaries are kept; archived months stay readable "
+        "through /api/sales/archive/ and the daily report."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--before", required=True, help="archive every month before this one (YYYY-MM)")
+        parser.add_argument("--batch-size", type=int, default=5000, help="sales written and deleted per batch")
+        parser.add_argument("--sleep", type=float, default=0.0, help="seconds to pause between batches")
+        parser.add_argument("--dry-run", action="store_true", help="only report how many sales each month holds")
+
+    def handle(self, *args, **options):
+        try:
+            before = parse_month(options["before"])
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        if before > current_month():
+            raise CommandError("only closed months can be archived; --before can be this month at the latest")
+
+        oldest = Sale.objects.filter(date__lt=month_bounds(before)[0]).aggregate(first=Min("date"))["first"]
+        months = {m.first for m in archived_months() if not m.manifest["complete"] and m.first < before}
+        if oldest is not None:
+            month = oldest.date().replace(day=1)
+            while month < before:
+                months.add(month)
+                month = next_month(month)
+
+        total = 0
+        for month in sorted(months):
+            lo, hi = month_bounds(month)
+            if options["dry_run"]:
+                n = Sale.objects.filter(date__gte=lo, date__lt=hi).count()
+                self.stdout.write(f"{month:%Y-%m}: {n} sales")
+                continue
+            moved = self.archive_month(MonthArchive(month), options["batch_size"], options["sleep"])
+            total += moved
+            self.stdout.write(f"{month:%Y-%m}: {moved} sales archived")
+        if not options["dry_run"]:
+            self.stdout.write(self.style.SUCCESS(f"Archived {total} sales."))
+
+    def archive_month(self, archive, batch_size, sleep):
+        lo, hi = month_bounds(archive.first)
+        # a previous run may have written a batch and stopped before deleting it
+        self.delete_archived(archive, batch_size)
+
+        moved = 0
+        while True:
+            # archived rows are deleted as we go, so the next batch is always the month's oldest sales
+            qs = Sale.objects.filter(date__gte=lo, date__lt=hi).order_by("date", "id")
+            rows = list(qs.values_list(*ARCHIVE_FIELDS)[:batch_size])
+            if not rows:
+                break
+            archive.append(rows)
+            # one short transaction per batch: row locks are held for a single DELETE
+            with transaction.atomic():
+                Sale.objects.filter(pk__in=[row[0] for row in rows]).delete()
+            moved += len(rows)
+            if sleep:
+                time.sleep(sleep)
+
+        archive.manifest["complete"] = True
+        archive.save()
+        return moved
+
+    def delete_archived(self, archive, batch_size):
+        while True:
+            ids = list(Sale.objects.filter(archive.archived()).values_list("pk", flat=True)[:batch_size])
+            if not ids:
+                return
+            with transaction.atomic():
+                Sale.objects.filter(pk__in=ids).delete()
@@ -0,0 +1,300 @@
+# sales/management/commands/bench_billing.py
+import json
+import platform
+import random
+import statistics
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.utils import OperationalError
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings, setup_test_environment, teardown_test_environment
+
+from sales.inventory import rebalance, set_stock, sharded
+from sales.models import Product, User
+
+PASSWORD = "bench-pass-123"
+LOCK_ERRORS = ("locked", "deadlock", "lock timeout", "could not obtain lock", "could not serialize")
+
+
+# ---- Workload ----
+# each endpoint: fn(bench, worker) -> response; worker holds the counter's client and tokens
+
+def sale(bench, worker):
+    product = worker.rng.choice(bench.product_ids)
+    return worker.client.post(
+        "/api/sales/", {"product_id": product, "qty": 1, "mode": worker.rng.choice(["Cash", "UPI", "Card"])},
+        content_type="application/json", HTTP_AUTHORIZATION=worker.staff_auth,
+    )
+
+
+def checkout(bench, worker):
+    lines = [{"product_id": p, "qty": 1} for p in worker.rng.sample(bench.product_ids, min(5, len(bench.product_ids)))]
+    return worker.client.post(
+        "/api/sales/checkout/", {"mode": "UPI", "lines": lines},
+        content_type="application/json", HTTP_AUTHORIZATION=worker.staff_auth,
+    )
+
+
+def products(bench, worker):
+    return worker.client.get("/api/products/", HTTP_AUTHORIZATION=worker.staff_auth)
+
+
+def report(bench, worker):
+    res = worker.client.get("/api/sales/daily_report/", HTTP_AUTHORIZATION=bench.admin_auth)
+    if res.streaming:
+        b"".join(res.streaming_content)  # time the whole export, not just the first chunk
+    return res
+
+
+ENDPOINTS = {"sale": sale, "checkout": checkout, "products": products, "report": report}
+DEFAULT_MIX = "sale=8,checkout=1,products=3,report=1"
+
+
+class Worker:
+    def __init__(self, index, seed):
+        self.index = index
+        self.rng = random.Random(seed + index)
+        self.client = Client()
+        self.staff_auth = None
+
+
+def login(client, username):
+    res = client.post("/api/auth/login/", {"username": username, "password": PASSWORD}, content_type="application/json")
+    if res.status_code != 200:
+        raise CommandError(f"login for {username} failed: {res.status_code}")
+    return f"Bearer {res.json()['access']}"
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    k = (len(sorted_values) - 1) * pct / 100
+    lo, hi = int(k), min(int(k) + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test the billing API in-process: N counters log in, then bill, list products and pull "
+        "the daily report concurrently. Runs against a throwaway test database by default."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--counters", type=int, default=4, help="concurrent counters (threads)")
+        parser.add_argument("--requests", type=int, default=100, help="requests per counter")
+        parser.add_argument("--products", type=int, default=50, help="products in the catalog")
+        parser.add_argument("--mix", default=DEFAULT_MIX, help=f"endpoint weights, default {DEFAULT_MIX}")
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--output", help="write results as JSON to this file")
+        parser.add_argument("--compare", help="earlier JSON result to diff against")
+        parser.add_argument("--inventory", choices=["single", "sharded"], help="INVENTORY_MODE for the run (default: settings)")
+        parser.add_argument(
+            "--sweep",
+            help="counter counts to run one after another, e.g. 1,2,4,8, and show how throughput scales; "
+                 "--products 1 --mix sale=1 bills a single hot product",
+        )
+        parser.add_argument(
+            "--use-existing-db", action="store_true",
+            help="run against the configured database instead of a fresh test database (creates bench-* rows)",
+        )
+
+    def handle(self, *args, **options):
+        mix = self.parse_mix(options["mix"])
+        counts = self.parse_sweep(options["sweep"]) if options["sweep"] else [options["counters"]]
+        override = override_settings(INVENTORY_MODE=options["inventory"]) if options["inventory"] else None
+        if override is not None:
+            override.enable()
+        setup_test_environment()
+        old_name = None
+        if not options["use_existing_db"]:
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            self.setup_data({**options, "counters": max(counts)})
+            results = [self.run(mix, {**options, "counters": n}) for n in counts]
+        finally:
+            if old_name is not None:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+            if override is not None:
+                override.disable()
+
+        for result in results:
+            self.print_result(result)
+        if len(results) > 1:
+            self.print_sweep(results)
+        result = results[0] if len(results) == 1 else {"sweep": results}
+        if options["compare"] and len(results) == 1:
+            with open(options["compare"]) as fh:
+                self.print_compare(json.load(fh), result)
+        if options["output"]:
+            with open(options["output"], "w") as fh:
+                json.dump(result, fh, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+
+    def parse_mix(self, raw):
+        mix = {}
+        for part in raw.split(","):
+            name, _, weight = part.partition("=")
+            if name not in ENDPOINTS:
+                raise CommandError(f"unknown endpoint {name!r}, pick from {', '.join(ENDPOINTS)}")
+            mix[name] = int(weight or 1)
+        return mix
+
+    def parse_sweep(self, raw):
+        try:
+            counts = [int(n) for n in raw.split(",")]
+        except ValueError:
+            raise CommandError("--sweep takes comma-separated counter counts, e.g. 1,2,4,8")
+        if not counts or min(counts) < 1:
+            raise CommandError("--sweep counts must be >= 1")
+        return counts
+
+    # ---- Setup ----
+    def setup_data(self, options):
+        admin, _ = User.objects.get_or_create(username="bench-admin", defaults={"role": "admin"})
+        admin.set_password(PASSWORD)
+        admin.save()
+        for n in range(1, options["counters"] + 1):
+            user, _ = User.objects.get_or_create(
+                username=f"bench-c{n}", defaults={"role": "staff", "counter": n, "first_name": f"Counter {n}"},
+            )
+            user.set_password(PASSWORD)
+            user.save()
+        rng = random.Random(options["seed"])
+        for n in range(options["products"]):
+            Product.objects.update_or_create(id=f"bench-p{n}", defaults={
+                "name": f"Bench product {n:05d}",
+                "hsn": "2202",
+                "price": Decimal(rng.randrange(1000, 50000)) / 100,
+                "gstPct": rng.choice([Decimal("5.00"), Decimal("12.00"), Decimal("18.00")]),
+                "stock": 10_000_000,
+            })
+        self.product_ids = [f"bench-p{n}" for n in range(options["products"])]
+        if sharded():
+            # start every run from the same even split of each product over the counters
+            with transaction.atomic():
+                set_stock({pid: 10_000_000 for pid in self.product_ids})
+            rebalance()
+        self.admin_auth = login(Client(), "bench-admin")
+
+    # ---- Run ----
+    def run(self, mix, options):
+        names = list(mix)
+        weights = [mix[n] for n in names]
+        samples = {n: [] for n in names}   # (seconds, queries, status, lock_failure)
+        lock = threading.Lock()
+        barrier = threading.Barrier(options["counters"])
+
+        def counter(index):
+            worker = Worker(index, options["seed"])
+            worker.staff_auth = login(worker.client, f"bench-c{index + 1}")
+            local = {n: [] for n in names}
+            barrier.wait()
+            try:
+                for _ in range(options["requests"]):
+                    name = worker.rng.choices(names, weights)[0]
+                    with CaptureQueriesContext(connection) as queries:
+                        started = time.perf_counter()
+                        try:
+                            res = ENDPOINTS[name](self, worker)
+                            code, lock_failure = res.status_code, False
+                        except OperationalError as exc:
+                            code, lock_failure = 500, any(s in str(exc).lower() for s in LOCK_ERRORS)
+                        elapsed = time.perf_counter() - started
+                    local[name].append((elapsed, len(queries), code, lock_failure))
+            finally:
+                connection.close()
+                with lock:
+                    for n in names:
+                        samples[n].extend(local[n])
+
+        threads = [threading.Thread(target=counter, args=(i,)) for i in range(options["counters"])]
+        started = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        wall = time.perf_counter() - started
+
+        return {
+            "meta": {
+                "started": datetime.now(dt_timezone.utc).isoformat(),
+                "database": connection.vendor,
+                "inventory": settings.INVENTORY_MODE,
+                "django": django.get_version(),
+                "python": platform.python_version(),
+                "counters": options["counters"],
+                "requests_per_counter": options["requests"],
+                "products": options["products"],
+                "mix": mix,
+                "seed": options["seed"],
+                "wall_seconds": round(wall, 3),
+            },
+            "endpoints": {n: self.stats(samples[n], wall) for n in names},
+        }
+
+    def stats(self, samples, wall):
+        times = sorted(s[0] * 1000 for s in samples)
+        return {
+            "requests": len(samples),
+            "throughput_rps": round(len(samples) / wall, 2) if wall else None,
+            "p50_ms": _round(percentile(times, 50)),
+            "p95_ms": _round(percentile(times, 95)),
+            "p99_ms": _round(percentile(times, 99)),
+            "mean_queries": _round(statistics.fmean(s[1] for s in samples)) if samples else None,
+            "errors": sum(1 for s in samples if s[2] >= 400),
+            "lock_failures": sum(1 for s in samples if s[3]),
+        }
+
+    # ---- Output ----
+    def print_result(self, result):
+        meta = result["meta"]
+        self.stdout.write(
+            f"{meta['database']}: {meta['counters']} counters x {meta['requests_per_counter']} requests "
+            f"in {meta['wall_seconds']}s"
+        )
+        self.stdout.write(f"{'endpoint':<10} {'reqs':>6} {'rps':>8} {'p50ms':>8} {'p95ms':>8} {'p99ms':>8} {'queries':>8} {'errors':>6} {'locks':>6}")
+        for name, s in result["endpoints"].items():
+            self.stdout.write(
+                f"{name:<10} {s['requests']:>6} {_fmt(s['throughput_rps'])} {_fmt(s['p50_ms'])} {_fmt(s['p95_ms'])} "
+                f"{_fmt(s['p99_ms'])} {_fmt(s['mean_queries'])} {s['errors']:>6} {s['lock_failures']:>6}"
+            )
+
+    def print_sweep(self, results):
+        # perfect scaling doubles rps with the counters; one writer at a time keeps it flat
+        self.stdout.write(f"Scaling ({results[0]['meta']['inventory']} inventory):")
+        self.stdout.write(f"{'counters':>8} {'rps':>8} {'x1':>6} {'p95ms':>8} {'locks':>6}")
+        base = None
+        for result in results:
+            total = sum(s["requests"] for s in result["endpoints"].values()) / result["meta"]["wall_seconds"]
+            p95 = max((s["p95_ms"] or 0) for s in result["endpoints"].values())
+            locks = sum(s["lock_failures"] for s in result["endpoints"].values())
+            base = base or total
+            self.stdout.write(f"{result['meta']['counters']:>8} {total:>8.1f} {total / base:>6.2f} {p95:>8.1f} {locks:>6}")
+
+    def print_compare(self, before, after):
+        self.stdout.write("Change vs baseline (negative latency / positive rps is better):")
+        for name, s in after["endpoints"].items():
+            old = before.get("endpoints", {}).get(name)
+            if not old:
+                continue
+            parts = []
+            for key in ("throughput_rps", "p50_ms", "p95_ms", "p99_ms", "mean_queries"):
+                if old.get(key) and s.get(key) is not None:
+                    parts.append(f"{key} {100 * (s[key] - old[key]) / old[key]:+.1f}%")
+            self.stdout.write(f"  {name:<10} " + ", ".join(parts))
+
+
+def _round(value):
+    return None if value is None else round(value, 2)
+
+
+def _fmt(value):
+    return f"{'-' if value is None else value:>8}"
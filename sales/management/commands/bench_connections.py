@@ -0,0 +1,168 @@
+# sales/management/commands/bench_connections.py
+import asyncio
+import json
+import time
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+from sales.management.commands.bench_billing import PASSWORD, _round, percentile
+from sales.models import User
+
+DEFAULT_PATHS = "/api/async/products/,/api/async/users/me/,/api/async/sales/summary/"
+
+
+class Command(BaseCommand):
+    help = (
+        "Hold many concurrent keep-alive connections against a running server and measure what one "
+        "deployment serves, e.g. `gunicorn -w 1 backend.wsgi` vs `gunicorn -c backend/gunicorn_asgi.py "
+        "-w 1 backend.asgi:application`. --slow-clients adds connections that trickle their headers."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", default="http://127.0.0.1:8000", help="server base URL")
+        parser.add_argument("--paths", default=DEFAULT_PATHS, help=f"comma separated GET paths, default {DEFAULT_PATHS}")
+        parser.add_argument("--connections", type=int, default=50, help="concurrent connections")
+        parser.add_argument("--duration", type=float, default=10.0, help="seconds to run")
+        parser.add_argument("--slow-clients", type=int, default=0, help="extra connections that send one header byte a second")
+        parser.add_argument("--timeout", type=float, default=10.0, help="per-request timeout, seconds")
+        parser.add_argument("--output", help="write results as JSON to this file")
+
+    def handle(self, *args, **options):
+        url = urlsplit(options["url"])
+        if url.scheme != "http":
+            raise CommandError("only plain http:// servers are supported")
+        # the server reads the same database, so the bench user can be made here
+        admin, _ = User.objects.get_or_create(username="bench-admin", defaults={"role": "admin"})
+        admin.set_password(PASSWORD)
+        admin.save()
+
+        result = asyncio.run(self.run(url.hostname, url.port or 80, options))
+        s = result
+        self.stdout.write(
+            f"{options['connections']} connections (+{options['slow_clients']} slow) for {options['duration']}s: "
+            f"{s['requests']} requests, {s['throughput_rps']} rps, p50 {s['p50_ms']}ms, p95 {s['p95_ms']}ms, "
+            f"p99 {s['p99_ms']}ms, {s['errors']} errors, {s['timeouts']} timeouts"
+        )
+        if options["output"]:
+            with open(options["output"], "w") as fh:
+                json.dump(result, fh, indent=2)
+
+    async def run(self, host, port, options):
+        token = await self.login(host, port, options["timeout"])
+        paths = [p.strip() for p in options["paths"].split(",") if p.strip()]
+        deadline = time.monotonic() + options["duration"]
+        samples, errors, timeouts = [], [0], [0]
+
+        async def client(index):
+            conn = None
+            n = index
+            while time.monotonic() < deadline:
+                path = paths[n % len(paths)]
+                n += 1
+                started = time.perf_counter()
+                try:
+                    if conn is None:
+                        conn = await asyncio.wait_for(asyncio.open_connection(host, port), options["timeout"])
+                    status, keep_alive = await asyncio.wait_for(
+                        request(conn, host, path, token), options["timeout"],
+                    )
+                except (asyncio.TimeoutError, OSError, asyncio.IncompleteReadError, ValueError) as exc:
+                    if isinstance(exc, asyncio.TimeoutError):
+                        timeouts[0] += 1
+                    else:
+                        errors[0] += 1
+                    conn = close(conn)
+                    continue
+                samples.append(time.perf_counter() - started)
+                if status >= 400:
+                    errors[0] += 1
+                if not keep_alive:
+                    conn = close(conn)
+            close(conn)
+
+        async def slow_client():
+            try:
+                _, writer = await asyncio.open_connection(host, port)
+                writer.write(f"GET {paths[0]} HTTP/1.1\r\nHost: {host}\r\nX-Slow: ".encode())
+                while time.monotonic() < deadline:
+                    await writer.drain()
+                    await asyncio.sleep(1)
+                    writer.write(b"a")
+                writer.close()
+            except OSError:
+                pass
+
+        started = time.monotonic()
+        await asyncio.gather(
+            *(slow_client() for _ in range(options["slow_clients"])),
+            *(client(i) for i in range(options["connections"])),
+        )
+        wall = time.monotonic() - started
+        times = sorted(t * 1000 for t in samples)
+        return {
+            "connections": options["connections"],
+            "slow_clients": options["slow_clients"],
+            "paths": paths,
+            "requests": len(samples),
+            "throughput_rps": round(len(samples) / wall, 2),
+            "p50_ms": _round(percentile(times, 50)),
+            "p95_ms": _round(percentile(times, 95)),
+            "p99_ms": _round(percentile(times, 99)),
+            "errors": errors[0],
+            "timeouts": timeouts[0],
+        }
+
+    async def login(self, host, port, timeout):
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+        body = json.dumps({"username": "bench-admin", "password": PASSWORD}).encode()
+        writer.write(
+            f"POST /api/auth/login/ HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+        )
+        status, _, payload = await asyncio.wait_for(read_response(reader), timeout)
+        writer.close()
+        if status != 200:
+            raise CommandError(f"login failed: {status} {payload[:200]!r}")
+        return json.loads(payload)["access"]
+
+
+async def request(conn, host, path, token):
+    reader, writer = conn
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\nAuthorization: Bearer {token}\r\n\r\n".encode())
+    await writer.drain()
+    status, headers, _ = await read_response(reader)
+    return status, headers.get("connection", "").lower() != "close"
+
+
+async def read_response(reader):
+    """Minimal HTTP/1.1 response reader: status, lower-cased headers, body (Content-Length or chunked)."""
+    status_line = await reader.readuntil(b"\r\n")
+    status = int(status_line.split()[1])
+    headers = {}
+    while True:
+        line = await reader.readuntil(b"\r\n")
+        if line == b"\r\n":
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    if headers.get("transfer-encoding", "").lower() == "chunked":
+        body = bytearray()
+        while True:
+            size = int((await reader.readuntil(b"\r\n")).split(b";")[0], 16)
+            chunk = await reader.readexactly(size + 2)
+            if not size:
+                break
+            body += chunk[:-2]
+        return status, headers, bytes(body)
+    if status in (204, 304):
+        return status, headers, b""
+    if "content-length" in headers:
+        return status, headers, await reader.readexactly(int(headers["content-length"]))
+    return status, headers, await reader.read()
+
+
+def close(conn):
+    if conn is not None:
+        conn[1].close()
+    return None
@@ -0,0 +1,107 @@
+# sales/management/commands/bench_sale_list.py
+import gzip
+import io
+import json
+import statistics
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+from rest_framework.renderers import JSONRenderer
+
+from sales.listing import SALE_LIST_FIELDS, sale_list_data, sale_refs
+from sales.middleware import brotli
+from sales.models import Sale
+from sales.renderers import ColumnarJSONRenderer, MessagePackRenderer, msgpack
+from sales.serializers import SaleSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        "Time one sales-list page through SaleSerializer vs the lean values() path (sales/listing.py), "
+        "fetch + serialize + render, on seeded data in a throwaway test database; then payload size and "
+        "encode time per format (json, columnar, msgpack) and Content-Encoding (identity, gzip, br)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=10_000, help="sales per page")
+        parser.add_argument("--products", type=int, default=500)
+        parser.add_argument("--staff", type=int, default=50)
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--use-existing-db", action="store_true", help="use the configured database as it is")
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = None
+        if not options["use_existing_db"]:
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            if not options["use_existing_db"]:
+                call_command(
+                    "seed_demo", products=options["products"], staff=options["staff"],
+                    sales=options["rows"], days=30, stdout=io.StringIO(),
+                )
+            self.compare(options["rows"], options["repeat"])
+            self.payloads(options["rows"], options["repeat"])
+        finally:
+            if old_name is not None:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+    def compare(self, rows, repeat):
+        def serializer_page():
+            qs = Sale.objects.select_related("product", "staff").order_by("-date", "-id")[:rows]
+            return JSONRenderer().render(SaleSerializer(qs, many=True).data)
+
+        def lean_page():
+            page = list(Sale.objects.order_by("-date", "-id").values(*SALE_LIST_FIELDS)[:rows])
+            return JSONRenderer().render(sale_list_data(page, *sale_refs(page)))
+
+        if json.loads(serializer_page()) != json.loads(lean_page()):
+            raise CommandError("lean output differs from SaleSerializer output")
+
+        results = {}
+        for name, fn in (("SaleSerializer", serializer_page), ("lean", lean_page)):
+            times = []
+            for _ in range(repeat):
+                with CaptureQueriesContext(connection) as queries:
+                    started = time.perf_counter()
+                    body = fn()
+                    times.append(time.perf_counter() - started)
+            results[name] = statistics.median(times) * 1000
+            self.stdout.write(f"{name:<15} {results[name]:8.1f} ms  {len(queries)} queries  {len(body)} bytes")
+        self.stdout.write(self.style.SUCCESS(
+            f"{rows} rows: lean path {results['SaleSerializer'] / results['lean']:.1f}x faster, identical JSON"
+        ))
+
+    def payloads(self, rows, repeat):
+        page = list(Sale.objects.order_by("-date", "-id").values(*SALE_LIST_FIELDS)[:rows])
+        data = sale_list_data(page, *sale_refs(page))
+        renderers = {"json": JSONRenderer(), "columnar": ColumnarJSONRenderer()}
+        if msgpack is not None:
+            renderers["msgpack"] = MessagePackRenderer()
+        encodings = {"identity": lambda body: body, "gzip": lambda body: gzip.compress(body, 6)}
+        if brotli is not None:
+            encodings["br"] = lambda body: brotli.compress(body, quality=4)   # CompressionMiddleware's level
+
+        def timed(fn, arg):
+            times = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                out = fn(arg)
+                times.append(time.perf_counter() - started)
+            return out, statistics.median(times) * 1000
+
+        self.stdout.write(f"\n{'format':<10}{'encoding':<10}{'bytes':>12}{'render ms':>11}{'encode ms':>11}")
+        baseline = None
+        for fmt, renderer in renderers.items():
+            body, render_ms = timed(renderer.render, data)
+            for encoding, encode in encodings.items():
+                encoded, encode_ms = timed(encode, body)
+                baseline = baseline or len(encoded)
+                self.stdout.write(
+                    f"{fmt:<10}{encoding:<10}{len(encoded):>12}{render_ms:>11.1f}{encode_ms:>11.1f}"
+                    f"  {len(encoded) / baseline:6.1%} of json"
+                )
@@ -0,0 +1,29 @@
+# sales/management/commands/compact_catalog_changes.py
+from django.core.management.base import BaseCommand
+from django.db.models import Exists, OuterRef
+
+from sales.catalog import current_version
+from sales.models import CatalogChange
+
+
+class Command(BaseCommand):
+    help = (
+        "Drop catalog change rows superseded by a later change to the same product. "
+        "Delta sync only needs each product's latest version, so results are unchanged."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        later = CatalogChange.objects.filter(product_id=OuterRef("product_id"), id__gt=OuterRef("id"))
+        # settled rows only: the count of changes above the settled version is part of the
+        # catalog ETag, and must not drop back to a value a client has already seen
+        superseded = CatalogChange.objects.filter(Exists(later), id__lte=current_version().settled)
+        removed = 0
+        while True:
+            ids = list(superseded.values_list("id", flat=True)[: options["batch_size"]])
+            if not ids:
+                break
+            removed += CatalogChange.objects.filter(id__in=ids).delete()[0]
+        self.stdout.write(self.style.SUCCESS(f"Removed {removed} superseded catalog changes."))
@@ -0,0 +1,36 @@
+# sales/management/commands/consolidate_stock.py
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from sales.inventory import VELOCITY_DAYS, consolidate, rebalance, set_stock, sharded
+from sales.models import Product
+
+
+class Command(BaseCommand):
+    help = (
+        "Sharded inventory (INVENTORY_MODE=sharded): copy each product's per-counter stock total "
+        "into Product.stock. Run it every few minutes; --rebalance also redistributes the "
+        "shards by recent sales, e.g. nightly."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rebalance", action="store_true", help="split stock over the counters again")
+        parser.add_argument("--days", type=int, default=VELOCITY_DAYS, help="sales history --rebalance weighs counters by")
+        parser.add_argument(
+            "--reset", action="store_true",
+            help="discard the shards and put each product's current Product.stock in the pool "
+                 "(after a spell in single mode, when the shards are out of date)",
+        )
+
+    def handle(self, *args, **options):
+        if not sharded():
+            raise CommandError("INVENTORY_MODE is not 'sharded'; Product.stock is already exact.")
+        if options["reset"]:
+            with transaction.atomic():
+                set_stock(dict(Product.objects.values_list("pk", "stock")))
+            self.stdout.write(f"Reset shards of {Product.objects.count()} products to the pool.")
+        if options["rebalance"]:
+            changed = rebalance(options["days"])
+            self.stdout.write(f"Rebalanced {changed} products.")
+        updated = consolidate()
+        self.stdout.write(self.style.SUCCESS(f"Consolidated stock of {len(updated)} products."))
@@ -0,0 +1,30 @@
+# sales/management/commands/import_products.py
+from django.core.management.base import BaseCommand, CommandError
+
+from sales.product_io import IMPORT_FORMATS, guess_format, import_products, iter_records
+
+
+class Command(BaseCommand):
+    help = "Upsert products from a CSV or JSON Lines file in batches (same rules as POST /api/products/import/)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--format", choices=IMPORT_FORMATS, help="default: from the file extension")
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        fmt = options["format"] or guess_format(options["path"])
+        try:
+            fh = open(options["path"], "rb")
+        except OSError as exc:
+            raise CommandError(str(exc))
+        with fh:
+            report = import_products(iter_records(fh, fmt), batch_size=max(1, options["batch_size"]))
+
+        for err in report["errors"]:
+            self.stderr.write(f"row {err['row']}: {err['errors']}")
+        if report["error_count"] > len(report["errors"]):
+            self.stderr.write(f"... and {report['error_count'] - len(report['errors'])} more")
+        self.stdout.write(self.style.SUCCESS(
+            f"{report['rows']} rows read, {report['upserted']} upserted, {report['error_count']} rejected."
+        ))
@@ -0,0 +1,28 @@
+# sales/management/commands/purge_idempotency_keys.py
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from sales.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = "Delete expired idempotency keys in small batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--hours", type=int, default=settings.IDEMPOTENCY_KEY_TTL_HOURS, help="keep keys newer than this")
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(hours=options["hours"])
+        expired = IdempotencyKey.objects.filter(created_at__lt=cutoff).order_by("id")
+        removed = 0
+        while True:
+            # short delete per batch, so billing never waits behind one long purge
+            ids = list(expired.values_list("id", flat=True)[: options["batch_size"]])
+            if not ids:
+                break
+            removed += IdempotencyKey.objects.filter(id__in=ids).delete()[0]
+        self.stdout.write(self.style.SUCCESS(f"Purged {removed} idempotency keys older than {cutoff:%Y-%m-%d %H:%M}."))
@@ -0,0 +1,79 @@
+# sales/management/commands/rebuild_summaries.py
+from datetime import timedelta, timezone as dt_timezone
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, Min, Max, Sum
+from django.db.models.functions import TruncDate
+from rest_framework.exceptions import ValidationError
+
+from sales.archive import archived_months, next_month
+from sales.filters import day_bounds, parse_date
+from sales.models import DailySalesSummary, Sale
+from sales.summary import business_date
+
+
+class Command(BaseCommand):
+    help = "Rebuild DailySalesSummary from the raw Sale rows, a few days per transaction"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--from", dest="start", help="first business date (YYYY-MM-DD), default: oldest sale")
+        parser.add_argument("--to", dest="end", help="last business date (YYYY-MM-DD), default: newest sale")
+        parser.add_argument("--days-per-batch", type=int, default=7, help="business days rebuilt per transaction")
+        parser.add_argument("--batch-size", type=int, default=1000, help="summary rows per INSERT")
+
+    def handle(self, *args, **options):
+        try:
+            start = parse_date(options["start"], "from") if options["start"] else None
+            end = parse_date(options["end"], "to") if options["end"] else None
+        except ValidationError:
+            raise CommandError("dates must be YYYY-MM-DD")
+
+        if start is None or end is None:
+            bounds = Sale.objects.aggregate(first=Min("date"), last=Max("date"))
+            if bounds["first"] is None:
+                self.stdout.write("No sales to summarise.")
+                return
+            start = start or business_date(bounds["first"])
+            end = end or business_date(bounds["last"])
+
+        step = timedelta(days=max(1, options["days_per_batch"]))
+        # archived months have no Sale rows left; their summaries are the only totals there are
+        archived = {m.first for m in archived_months()}
+        rows_written = 0
+        day = start
+        while day <= end:
+            month = day.replace(day=1)
+            if month in archived:
+                self.stdout.write(f"{month:%Y-%m} is archived, kept as is")
+                day = next_month(month)
+                continue
+            last = min(day + step - timedelta(days=1), end, next_month(month) - timedelta(days=1))
+            rows_written += self.rebuild(day, last, options["batch_size"])
+            self.stdout.write(f"{day.isoformat()} .. {last.isoformat()} done")
+            day = last + timedelta(days=1)
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt summaries {start} .. {end}: {rows_written} rows."))
+
+    def rebuild(self, start, end, batch_size):
+        lo, hi = day_bounds(start, end)
+        grouped = (
+            Sale.objects.filter(date__gte=lo, date__lt=hi)
+            .annotate(business_date=TruncDate("date", tzinfo=dt_timezone.utc))
+            .values("business_date", "counter", "staff_id", "product_id", "mode")
+            .annotate(n=Count("id"), qty_sum=Sum("qty"), taxable_sum=Sum("taxable"), gst_sum=Sum("gst"), total_sum=Sum("total"))
+            .order_by()
+        )
+        with transaction.atomic():
+            # delete first: a sale committing mid-rebuild then lands on the fresh rows
+            DailySalesSummary.objects.filter(business_date__range=(start, end)).delete()
+            rows = [
+                DailySalesSummary(
+                    business_date=g["business_date"], counter=g["counter"], staff_id=g["staff_id"],
+                    product_id=g["product_id"], mode=g["mode"], sales=g["n"], qty=g["qty_sum"],
+                    taxable=g["taxable_sum"], gst=g["gst_sum"], total=g["total_sum"],
+                )
+                for g in grouped
+            ]
+            DailySalesSummary.objects.bulk_create(rows, batch_size=batch_size)
+        return len(rows)
@@ -0,0 +1,74 @@
+# sales/management/commands/run_jobs.py
+import multiprocessing
+import signal
+import time
+import uuid
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from sales.jobs import claim, purge_expired, requeue_stale, run, work
+
+HOUSEKEEPING_SECONDS = 60
+
+
+def _worker(stop, poll):
+    # Ctrl-C / SIGTERM reach the whole process group; the parent sets `stop`, and the
+    # worker finishes the job in hand before it exits
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    try:
+        work(uuid.uuid4().hex, stop, poll)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = (
+        "Run queued background jobs (/api/jobs/) in a pool of worker processes until stopped. "
+        "The database is the queue, so no broker is needed; start it next to the web workers."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--processes", type=int, default=settings.JOB_WORKERS, help="worker processes")
+        parser.add_argument("--poll", type=float, default=2.0, help="seconds between looks at an empty queue")
+        parser.add_argument("--once", action="store_true", help="run every ready job in this process, then exit")
+
+    def handle(self, *args, **options):
+        if options["once"]:
+            requeue_stale()
+            worker, ran = uuid.uuid4().hex, 0
+            while (job := claim(worker)) is not None:
+                run(job)
+                ran += 1
+            purged = purge_expired()
+            self.stdout.write(self.style.SUCCESS(f"Ran {ran} jobs, purged {purged} expired."))
+            return
+
+        ctx = multiprocessing.get_context("fork")
+        stop = ctx.Event()
+        stopping = []
+        # only note the signal: setting the Event from a handler can deadlock on its lock
+        signal.signal(signal.SIGINT, lambda *_: stopping.append(True))
+        signal.signal(signal.SIGTERM, lambda *_: stopping.append(True))
+        workers = []
+        housekept = 0.0
+        self.stdout.write(f"Running jobs with {options['processes']} workers; Ctrl-C stops after the current jobs.")
+        while not stopping:
+            if time.monotonic() - housekept >= HOUSEKEEPING_SECONDS:
+                requeue_stale()
+                purge_expired()
+                housekept = time.monotonic()
+            workers = [w for w in workers if w.is_alive()]
+            if len(workers) < options["processes"]:
+                connections.close_all()   # a forked worker must not share the parent's connection
+                for _ in range(options["processes"] - len(workers)):
+                    process = ctx.Process(target=_worker, args=(stop, options["poll"]), daemon=False)
+                    process.start()
+                    workers.append(process)
+            time.sleep(options["poll"])
+        stop.set()
+        for process in workers:
+            process.join()
+        self.stdout.write(self.style.SUCCESS("Stopped."))
@@ -1,11 +1,73 @@
 # core/management/commands/seed_demo.py
+import csv
+import io
+import random
+import time
+from bisect import bisect
+from datetime import date, datetime, time as dt_time, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
 from django.core.management.base import BaseCommand
-from sales.models import Product, User
+from django.db import connection, transaction
+from django.utils import timezone
+
+from sales.billing import price_line, product_version_id
+from sales.catalog import record_changes
+from sales.models import Product, Sale, User
+from sales.product_io import import_products
+
+SYNTHETIC_PASSWORD = "synthetic"
+# last day of synthetic sales unless --end-date says otherwise; fixed, so a seed gives the
+# same rows whenever it is run
+DEFAULT_END_DATE = "2026-09-30"
+
+# ---- Synthetic catalog vocabulary ----
+BRANDS = ["Amul", "Aavin", "Britannia", "Parle", "Haldiram", "Tata", "Nestle", "Dabur", "Patanjali", "ITC",
+          "Cavinkare", "Hatsun", "Sakthi", "Aachi", "MTR", "Bru", "Lays", "Kurkure", "Maaza", "Frooti"]
+ITEMS = [("Milk", "0401", "5.00"), ("Curd", "0403", "5.00"), ("Butter", "0405", "12.00"), ("Biscuits", "1905", "18.00"),
+         ("Namkeen", "2106", "12.00"), ("Tea", "0902", "5.00"), ("Coffee", "0901", "5.00"), ("Chips", "2005", "12.00"),
+         ("Juice", "2202", "12.00"), ("Soft Drink", "2202", "28.00"), ("Atta", "1101", "0.00"), ("Rice", "1006", "0.00"),
+         ("Masala", "0910", "5.00"), ("Soap", "3401", "18.00"), ("Shampoo", "3305", "18.00"), ("Toothpaste", "3306", "18.00"),
+         ("Noodles", "1902", "12.00"), ("Chocolate", "1806", "18.00"), ("Oil", "1512", "5.00"), ("Sugar", "1701", "5.00")]
+SIZES = ["50g", "100g", "200g", "250g", "500g", "1kg", "100ml", "250ml", "500ml", "1L", "2L", "Pack of 6"]
+
+# share of sales per hour of day: quiet mornings, lunch and evening peaks
+HOUR_WEIGHTS = [0, 0, 0, 0, 0, 0, 1, 3, 5, 7, 9, 11, 12, 10, 7, 6, 6, 8, 11, 13, 11, 7, 3, 1]
+MODE_WEIGHTS = {"Cash": 45, "UPI": 40, "Card": 15}
+WEEKDAY_WEIGHTS = [9, 8, 8, 9, 11, 14, 13]   # Monday .. Sunday
+QTY_WEIGHTS = {1: 60, 2: 22, 3: 9, 4: 4, 5: 3, 6: 2}
+ZIPF_S = 1.1   # product popularity skew: a few fast movers, a long tail
+
+SALE_COLUMNS = ("date", "counter", "staff_id", "product_id", "qty", "discount", "taxable", "gst", "total", "mode", "product_version_id")
+
 
 class Command(BaseCommand):
-    help = "Seed demo users and products"
+    help = (
+        "Seed demo users and products; with --products/--staff/--sales, also generate a large, "
+        "reproducible synthetic dataset (skewed products, modes and times of day)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=0, help="synthetic products to create")
+        parser.add_argument("--staff", type=int, default=0, help="synthetic staff users to create")
+        parser.add_argument("--counters", type=int, default=10, help="counters the synthetic staff are spread over")
+        parser.add_argument("--sales", type=int, default=0, help="synthetic sales to create")
+        parser.add_argument("--days", type=int, default=30, help="spread sales over this many days up to --end-date")
+        parser.add_argument("--end-date", type=date.fromisoformat, default=date.fromisoformat(DEFAULT_END_DATE),
+                            help=f"last day of sales, YYYY-MM-DD (default {DEFAULT_END_DATE})")
+        parser.add_argument("--seed", type=int, default=42, help="random seed; the same seed gives the same data")
+        parser.add_argument("--batch-size", type=int, default=5000, help="rows per INSERT / COPY chunk")
 
     def handle(self, *args, **options):
+        self.seed_demo()
+        if options["products"] or options["staff"] or options["sales"]:
+            self.generate(options)
+
+    # ---- Demo data ----
+    def seed_demo(self):
         users = [
             {"username": "admin", "password": "admin123", "first_name": "Admin", "role": "admin", "is_staff": True, "is_superuser": True},
             {"username": "c1", "password": "c1", "first_name": "Counter 1", "role": "staff", "counter": 1},
@@ -30,8 +92,140 @@ class Command(BaseCommand):
             {"id": "p-mango-500", "name": "Maaza 500ml", "hsn": "0403", "price": "90.00", "gstPct": "18.00", "stock": 7},
             {"id": "p-lime-100", "name": "Sprite 300ml", "hsn": "2202", "price": "41.00", "gstPct": "14.00", "stock": 5},
         ]
-        for p in products:
-            obj, created = Product.objects.update_or_create(id=p["id"], defaults=p)
-            self.stdout.write(f"Product {obj.id} {'created' if created else 'updated'}")
+        report = import_products(enumerate(products, start=1))
+        self.stdout.write(f"Products upserted: {report['upserted']}")
 
         self.stdout.write(self.style.SUCCESS("Demo data seeded."))
+
+    # ---- Synthetic data ----
+    def generate(self, options):
+        rng = random.Random(options["seed"])
+        batch = max(1, options["batch_size"])
+
+        products = self.make_products(rng, options["products"], batch)
+        staff = self.make_staff(options["staff"], max(1, options["counters"]))
+        if options["sales"]:
+            if not products or not staff:
+                products = products or list(Product.objects.all())
+                staff = staff or list(User.objects.filter(role="staff"))
+            if not products or not staff:
+                self.stderr.write("Need at least one product and one staff user to generate sales.")
+                return
+            started = time.monotonic()
+            first_day = self.make_sales(rng, products, staff, options["sales"], options["days"], options["end_date"], batch)
+            elapsed = time.monotonic() - started
+            self.stdout.write(f"{options['sales']} sales in {elapsed:.1f}s ({options['sales'] / max(elapsed, 1e-9):.0f} rows/s)")
+            call_command("rebuild_summaries", "--from", first_day.isoformat(), stdout=io.StringIO())
+            self.stdout.write("Daily summaries rebuilt.")
+        self.stdout.write(self.style.SUCCESS("Synthetic data seeded."))
+
+    def make_products(self, rng, count, batch):
+        if not count:
+            return []
+        products = []
+        for n in range(count):
+            brand = rng.choice(BRANDS)
+            item, hsn, gst = rng.choice(ITEMS)
+            price = Decimal(round(rng.lognormvariate(3.8, 0.8), 2)).quantize(Decimal("0.01")) + Decimal("1.00")
+            products.append(Product(
+                id=f"syn-p{n:06d}", name=f"{brand} {item} {rng.choice(SIZES)}", hsn=hsn,
+                price=price, gstPct=Decimal(gst), stock=rng.randrange(100, 100_000),
+            ))
+        for i in range(0, len(products), batch):
+            chunk = products[i:i + batch]
+            with transaction.atomic():
+                Product.objects.bulk_create(
+                    chunk, update_conflicts=True, unique_fields=["id"],
+                    update_fields=["name", "hsn", "price", "gstPct", "stock"],
+                )
+                record_changes([p.id for p in chunk])
+        self.stdout.write(f"{count} synthetic products upserted")
+        return products
+
+    def make_staff(self, count, counters):
+        if not count:
+            return []
+        password = make_password(SYNTHETIC_PASSWORD)   # hash once; hashing per user would dominate
+        users = [
+            User(username=f"syn-s{n:04d}", first_name="Staff", last_name=str(n), role="staff",
+                 counter=(n % counters) + 1, password=password)
+            for n in range(count)
+        ]
+        User.objects.bulk_create(users, ignore_conflicts=True)
+        staff = list(User.objects.filter(username__startswith="syn-s").order_by("username")[:count])
+        self.stdout.write(f"{count} synthetic staff over {counters} counters (password: {SYNTHETIC_PASSWORD})")
+        return staff
+
+    def make_sales(self, rng, products, staff, count, days, end_date, batch):
+        # popularity follows a Zipf curve over a shuffled catalog
+        ranked = products[:]
+        rng.shuffle(ranked)
+        product_cum = list(accumulate(1 / (rank + 1) ** ZIPF_S for rank in range(len(ranked))))
+        versions = {p.pk: product_version_id(p) for p in ranked}
+
+        day_list = [end_date - timedelta(days=d) for d in range(max(1, days))]
+        day_cum = list(accumulate(WEEKDAY_WEIGHTS[d.weekday()] for d in day_list))
+        hour_cum = list(accumulate(HOUR_WEIGHTS))
+        modes, mode_w = zip(*MODE_WEIGHTS.items())
+        mode_cum = list(accumulate(mode_w))
+        qtys, qty_w = zip(*QTY_WEIGHTS.items())
+        qty_cum = list(accumulate(qty_w))
+        now = timezone.now()
+
+        def pick(cum):
+            return bisect(cum, rng.random() * cum[-1])
+
+        def rows():
+            for _ in range(count):
+                product = ranked[pick(product_cum)]
+                user = staff[rng.randrange(len(staff))]
+                day = day_list[pick(day_cum)]
+                when = datetime.combine(day, dt_time(pick(hour_cum), rng.randrange(60), rng.randrange(60)), tzinfo=dt_timezone.utc)
+                if when > now:   # an --end-date of today or later: nothing billed in the future
+                    when = now - timedelta(seconds=rng.randrange(1, 3600))
+                qty = qtys[pick(qty_cum)]
+                discount = Decimal(rng.choice((5, 10, 20))) if rng.random() < 0.05 else Decimal("0.00")
+                taxable, gst, total = price_line(product, qty, discount)
+                yield (when, user.counter or 0, user.pk, product.pk, qty, discount,
+                       taxable.quantize(Decimal("0.01")), gst.quantize(Decimal("0.01")), total,
+                       modes[pick(mode_cum)], versions[product.pk])
+
+        insert = self.copy_chunk if connection.vendor == "postgresql" else self.insert_chunk
+        chunk = []
+        for row in rows():
+            chunk.append(row)
+            if len(chunk) >= batch:
+                insert(chunk)
+                chunk = []
+        if chunk:
+            insert(chunk)
+        return day_list[-1]
+
+    def insert_chunk(self, chunk):
+        """
+        One executemany with values adapted up front. bulk_create runs every value
+        through the field machinery, which is most of the cost at millions of rows.
+        """
+        ops = connection.ops
+        rows = [
+            (ops.adapt_datetimefield_value(when), counter, staff_id, product_id, qty,
+             ops.adapt_decimalfield_value(discount), ops.adapt_decimalfield_value(taxable),
+             ops.adapt_decimalfield_value(gst), ops.adapt_decimalfield_value(total), mode, version_id)
+            for when, counter, staff_id, product_id, qty, discount, taxable, gst, total, mode, version_id in chunk
+        ]
+        columns = ", ".join(ops.quote_name(c) for c in SALE_COLUMNS)
+        placeholders = ", ".join(["%s"] * len(SALE_COLUMNS))
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.executemany(f"INSERT INTO {ops.quote_name(Sale._meta.db_table)} ({columns}) VALUES ({placeholders})", rows)
+
+    def copy_chunk(self, chunk):
+        """Postgres fast path: stream the chunk through COPY instead of INSERT."""
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        for when, counter, staff_id, product_id, qty, discount, taxable, gst, total, mode, version_id in chunk:
+            writer.writerow([when.isoformat(), counter, staff_id, product_id, qty, discount,
+                             taxable, gst, total, mode, version_id])
+        buf.seek(0)
+        columns = ", ".join(SALE_COLUMNS)
+        with connection.cursor() as cursor:
+            cursor.copy_expert(f"COPY {Sale._meta.db_table} ({columns}) FROM STDIN WITH (FORMAT csv)", buf)
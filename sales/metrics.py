@@ -0,0 +1,234 @@
+# sales/metrics.py
+import glob
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger("sales.slow")
+errors = logging.getLogger("sales.metrics")
+
+# request latency histogram bounds, seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class QueryProbe:
+    """connection.execute_wrapper that counts queries and their time (and keeps the SQL if asked)."""
+
+    def __init__(self, keep_sql=False):
+        self.count = 0
+        self.seconds = 0.0
+        self.sql = [] if keep_sql else None
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.count += 1
+            self.seconds += elapsed
+            if self.sql is not None:
+                self.sql.append((round(elapsed * 1000, 2), sql))
+
+
+def _empty_series():
+    return {"count": 0, "seconds": 0.0, "buckets": [0] * len(BUCKETS), "queries": 0, "db_seconds": 0.0, "bytes": 0}
+
+
+class MetricsStore:
+    """
+    This worker's counters, keyed by (method, route, status). Every few seconds they are
+    written to <METRICS_DIR>/metrics-<pid>.json; the metrics endpoint sums all the files,
+    which is how the numbers add up across gunicorn workers.
+    """
+
+    def __init__(self, directory, flush_seconds):
+        self.directory = directory
+        self.flush_seconds = flush_seconds
+        self.series = {}
+        self.lock = threading.Lock()
+        self.last_flush = 0.0
+
+    def observe(self, method, route, status, seconds, queries, db_seconds, size):
+        key = (method, route, str(status))
+        with self.lock:
+            s = self.series.get(key)
+            if s is None:
+                s = self.series[key] = _empty_series()
+            s["count"] += 1
+            s["seconds"] += seconds
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    s["buckets"][i] += 1
+                    break
+            s["queries"] += queries
+            s["db_seconds"] += db_seconds
+            s["bytes"] += size
+            due = time.monotonic() - self.last_flush >= self.flush_seconds
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            self.last_flush = time.monotonic()
+            payload = json.dumps([[list(k), v] for k, v in self.series.items()])
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"metrics-{os.getpid()}.json")
+        # a temp file per flush: threads flushing at once must not rename each other's
+        fd, tmp = tempfile.mkstemp(dir=self.directory, prefix=".tmp-")
+        with os.fdopen(fd, "w") as fh:
+            fh.write(payload)
+        os.replace(tmp, path)
+
+    def collect(self):
+        """Merge every worker's file (this one freshly flushed) into one series dict."""
+        self.flush()
+        merged = {}
+        for path in glob.glob(os.path.join(self.directory, "metrics-*.json")):
+            try:
+                with open(path) as fh:
+                    rows = json.load(fh)
+            except (OSError, ValueError):
+                continue  # a worker mid-write or a partial file from a crash
+            for key, v in rows:
+                m = merged.setdefault(tuple(key), _empty_series())
+                for field in ("count", "seconds", "queries", "db_seconds", "bytes"):
+                    m[field] += v[field]
+                m["buckets"] = [a + b for a, b in zip(m["buckets"], v["buckets"])]
+        return merged
+
+
+store = MetricsStore(
+    getattr(settings, "METRICS_DIR", "/tmp/webillz-metrics"),
+    getattr(settings, "METRICS_FLUSH_SECONDS", 5),
+)
+
+
+def route_label(request):
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return "unmatched"
+    return match.view_name or match.route
+
+
+class MetricsMiddleware:
+    """
+    Per-route latency histogram, DB query count and time, response size and status.
+    Work per request is two perf_counter calls, a query-counting wrapper and a dict update.
+    Requests slower than SLOW_REQUEST_MS are logged to "sales.slow" with their SQL.
+    Queries run while a streaming response is consumed happen after this returns and
+    are not counted. Sync and async capable, so ASGI requests stay on the event loop.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, "METRICS_ENABLED", True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.slow_ms = getattr(settings, "SLOW_REQUEST_MS", 0)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        probe = QueryProbe(keep_sql=bool(self.slow_ms))
+        started = time.perf_counter()
+        with self.probing(probe):
+            response = self.get_response(request)
+        self.safe_record(request, response, probe, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        probe = QueryProbe(keep_sql=bool(self.slow_ms))
+        started = time.perf_counter()
+        with self.probing(probe):
+            response = await self.get_response(request)
+        self.safe_record(request, response, probe, time.perf_counter() - started)
+        return response
+
+    def probing(self, probe):
+        stack = ExitStack()
+        for alias in settings.DATABASES:
+            stack.enter_context(connections[alias].execute_wrapper(probe))
+        return stack
+
+    def safe_record(self, request, response, probe, elapsed):
+        # telemetry must never fail the request it measures
+        try:
+            self.record(request, response, probe, elapsed)
+        except Exception:
+            errors.exception("metrics: recording %s %s failed", request.method, request.path)
+
+    def record(self, request, response, probe, elapsed):
+        if response.streaming:
+            size = int(response.get("Content-Length", 0) or 0)
+        else:
+            size = len(response.content)
+        route = route_label(request)
+        store.observe(request.method, route, response.status_code, elapsed, probe.count, probe.seconds, size)
+
+        if self.slow_ms and elapsed * 1000 >= self.slow_ms:
+            logger.warning(
+                "slow request %s %s (%s) %.1fms, %d queries in %.1fms\n%s",
+                request.method, request.get_full_path(), route, elapsed * 1000, probe.count, probe.seconds * 1000,
+                "\n".join(f"  [{ms}ms] {sql}" for ms, sql in probe.sql),
+            )
+
+
+def render_prometheus(series):
+    """Prometheus text exposition (format 0.0.4) for the merged series."""
+    lines = []
+
+    def family(name, kind, help_text):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+
+    def labels(key, **extra):
+        method, route, status = key
+        pairs = {"method": method, "route": route, "status": status, **extra}
+        return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs.items()) + "}"
+
+    ordered = sorted(series.items())
+
+    family("webillz_http_requests_total", "counter", "Requests served.")
+    for key, s in ordered:
+        lines.append(f"webillz_http_requests_total{labels(key)} {s['count']}")
+
+    family("webillz_http_request_duration_seconds", "histogram", "Time spent in the view and middleware.")
+    for key, s in ordered:
+        running = 0
+        for bound, n in zip(BUCKETS, s["buckets"]):
+            running += n
+            lines.append(f"webillz_http_request_duration_seconds_bucket{labels(key, le=repr(bound))} {running}")
+        lines.append(f"webillz_http_request_duration_seconds_bucket{labels(key, le='+Inf')} {s['count']}")
+        lines.append(f"webillz_http_request_duration_seconds_sum{labels(key)} {s['seconds']:.6f}")
+        lines.append(f"webillz_http_request_duration_seconds_count{labels(key)} {s['count']}")
+
+    family("webillz_db_queries_total", "counter", "SQL statements issued while handling requests.")
+    for key, s in ordered:
+        lines.append(f"webillz_db_queries_total{labels(key)} {s['queries']}")
+
+    family("webillz_db_query_seconds_total", "counter", "Time spent in SQL while handling requests.")
+    for key, s in ordered:
+        lines.append(f"webillz_db_query_seconds_total{labels(key)} {s['db_seconds']:.6f}")
+
+    family("webillz_http_response_bytes_total", "counter", "Response body bytes (Content-Length for streams).")
+    for key, s in ordered:
+        lines.append(f"webillz_http_response_bytes_total{labels(key)} {s['bytes']}")
+
+    return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
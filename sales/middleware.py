@@ -0,0 +1,179 @@
+# sales/middleware.py
+import os
+import secrets
+import zlib
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_string
+from whitenoise.middleware import WhiteNoiseMiddleware as BaseWhiteNoiseMiddleware
+
+from .exports import iter_gzip
+
+try:
+    import brotli
+except ImportError:  # optional: without it responses are gzip only
+    brotli = None
+
+MIN_COMPRESS_BYTES = 200
+# up to this many random bytes added to whole compressed bodies (a gzip filename, a brotli
+# metadata block), so their length doesn't give away secrets in them (BREACH);
+# GZipMiddleware uses the same for gzip
+BREACH_PAD_BYTES = 100
+# text-like bodies; images and fonts WhiteNoise serves are compressed already
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/javascript", "application/msgpack", "+json", "+xml", "ndjson")
+
+
+class WhiteNoiseMiddleware(BaseWhiteNoiseMiddleware):
+    """
+    WhiteNoise, also async capable. Stock WhiteNoise is sync-only, and one sync middleware
+    makes Django run every ASGI request through a thread, undoing the async views.
+    Static lookups are in-memory dict hits, so they are fine on the event loop.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, *args, **kwargs):
+        super().__init__(get_response, *args, **kwargs)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = self.find_file(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return self.serve(static_file, request)
+        return await self.get_response(request)
+
+
+def accepted_encodings(header):
+    """Accept-Encoding -> the set of codings the client takes (q=0 means "not this one")."""
+    codings = set()
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                if float(q[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        codings.add(coding.strip().lower())
+    return codings
+
+
+def _brotli_sequence(chunks):
+    compressor = brotli.Compressor(quality=4)
+    for chunk in chunks:
+        data = compressor.process(chunk)
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+async def _abrotli_sequence(chunks):
+    compressor = brotli.Compressor(quality=4)
+    async for chunk in chunks:
+        data = compressor.process(chunk)
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+def _brotli_padded(content):
+    """
+    Brotli with a random-length metadata meta-block (RFC 7932 9.2), which decoders skip.
+    It goes after a flush, where the stream is byte aligned: ISLAST=0, MNIBBLES=0 (as 3),
+    a reserved 0 bit, MSKIPBYTES=1, then MSKIPLEN-1 in 8 bits and zero fill to the byte.
+    """
+    compressor = brotli.Compressor(quality=4)
+    head = compressor.process(content) + compressor.flush()
+    n = secrets.randbelow(BREACH_PAD_BYTES) + 1
+    pad = bytes([0x16 | ((n - 1) & 3) << 6, (n - 1) >> 2]) + os.urandom(n)
+    return head + pad + compressor.finish()
+
+
+async def _agzip_sequence(chunks):
+    # one gzip member for the whole stream, as exports.iter_gzip
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    async for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+class CompressionMiddleware:
+    """
+    Brotli (when installed) or gzip for any response the client accepts it for, streamed
+    responses included. Like Django's GZipMiddleware, but async capable, so it doesn't
+    push ASGI requests through a thread, and with br for the JSON and columnar bodies,
+    which it shrinks a good deal more than gzip at a similar cost.
+    Bodies that are compressed already (the ?gzip=1 report, images) are left alone.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.compress(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.compress(request, await self.get_response(request))
+
+    def compress(self, request, response):
+        if response.status_code == 206 or not response.streaming and len(response.content) < MIN_COMPRESS_BYTES:
+            return response   # a byte range is of the identity body, so it is sent as is
+        content_type = response.get("Content-Type", "").split(";")[0]
+        if response.has_header("Content-Encoding") or not any(t in content_type for t in COMPRESSIBLE_TYPES):
+            return response
+        if content_type == "text/event-stream":
+            return response   # events must reach the client as they are written
+        patch_vary_headers(response, ("Accept-Encoding",))
+
+        codings = accepted_encodings(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+        if brotli is not None and "br" in codings:
+            coding = "br"
+        elif "gzip" in codings:
+            coding = "gzip"
+        else:
+            return response
+
+        if response.streaming:
+            chunks = response.streaming_content
+            if response.is_async:
+                response.streaming_content = _abrotli_sequence(chunks) if coding == "br" else _agzip_sequence(chunks)
+            else:
+                response.streaming_content = _brotli_sequence(chunks) if coding == "br" else iter_gzip(chunks)
+            del response.headers["Content-Length"]
+        else:
+            if coding == "br":
+                body = _brotli_padded(response.content)
+            else:
+                body = compress_string(response.content, max_random_bytes=BREACH_PAD_BYTES)
+            if len(body) >= len(response.content):
+                return response
+            response.content = body
+            response.headers["Content-Length"] = str(len(body))
+
+        # the encoded body is a different representation, so a strong ETag becomes weak,
+        # and byte ranges of it aren't offered (a Range request gets the identity body)
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response.headers["ETag"] = "W/" + etag
+        del response.headers["Accept-Ranges"]
+        response.headers["Content-Encoding"] = coding
+        return response
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:19
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0002_sale_list_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySalesSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('business_date', models.DateField()),
+                ('counter', models.PositiveIntegerField()),
+                ('mode', models.CharField(choices=[('Cash', 'Cash'), ('Card', 'Card'), ('UPI', 'UPI')], max_length=10)),
+                ('sales', models.IntegerField(default=0)),
+                ('qty', models.BigIntegerField(default=0)),
+                ('taxable', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('gst', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('total', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='sales.product')),
+                ('staff', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('business_date', 'counter', 'staff', 'product', 'mode'), name='daily_summary_key')],
+            },
+        ),
+    ]
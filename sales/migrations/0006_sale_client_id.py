@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0005_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sale',
+            name='client_id',
+            field=models.UUIDField(blank=True, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='sale',
+            name='client_ts',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
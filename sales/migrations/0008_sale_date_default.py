@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:35
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0007_product_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='sale',
+            name='date',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0008_sale_date_default'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200)),
+                ('hsn', models.CharField(blank=True, max_length=50)),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('gstPct', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='versions', to='sales.product')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='sale',
+            name='product_version',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, to='sales.productversion'),
+        ),
+        migrations.AddConstraint(
+            model_name='productversion',
+            constraint=models.UniqueConstraint(fields=('product', 'name', 'hsn', 'price', 'gstPct'), name='product_version_key'),
+        ),
+    ]
@@ -0,0 +1,81 @@
+from decimal import Decimal
+
+from django.db import migrations, transaction
+
+BATCH_SIZE = 5000
+CENT = Decimal("0.01")
+
+
+def _amount(value):
+    return Decimal(str(value)).quantize(CENT)
+
+
+def backfill(apps, schema_editor):
+    """
+    Point every sale at the ProductVersion its JSON snapshot describes, in batches of
+    BATCH_SIZE sales with one short transaction each. Snapshots never stored the HSN,
+    so versions made here take the product's current one.
+    """
+    Product = apps.get_model("sales", "Product")
+    ProductVersion = apps.get_model("sales", "ProductVersion")
+    Sale = apps.get_model("sales", "Sale")
+
+    hsn = dict(Product.objects.values_list("id", "hsn"))
+    versions = {}   # (product id, name, hsn, price, gstPct) -> version id
+    last_id = 0
+    while True:
+        rows = list(
+            Sale.objects.filter(pk__gt=last_id, product_version__isnull=True)
+            .order_by("pk").values_list("pk", "product_id", "product_snapshot")[:BATCH_SIZE]
+        )
+        if not rows:
+            break
+        last_id = rows[-1][0]
+
+        keys = {}
+        for pk, product_id, snapshot in rows:
+            if not snapshot or snapshot.get("price") is None:
+                continue   # billed before snapshots existed; reports fall back to the product id
+            key = (product_id, snapshot.get("name", ""), hsn.get(product_id, ""),
+                   _amount(snapshot["price"]), _amount(snapshot.get("gstPct", 0)))
+            keys.setdefault(key, []).append(pk)
+
+        with transaction.atomic():
+            missing = [key for key in keys if key not in versions]
+            if missing:
+                ProductVersion.objects.bulk_create(
+                    [ProductVersion(product_id=k[0], name=k[1], hsn=k[2], price=k[3], gstPct=k[4]) for k in missing],
+                    ignore_conflicts=True,
+                )
+                for vid, *key in ProductVersion.objects.filter(product_id__in={k[0] for k in missing}).values_list(
+                    "pk", "product_id", "name", "hsn", "price", "gstPct",
+                ):
+                    versions[tuple(key)] = vid
+            for key, ids in keys.items():
+                Sale.objects.filter(pk__in=ids).update(product_version_id=versions[key])
+
+
+def restore_snapshots(apps, schema_editor):
+    """Reverse: rebuild the JSON snapshots from the versions."""
+    ProductVersion = apps.get_model("sales", "ProductVersion")
+    Sale = apps.get_model("sales", "Sale")
+    for version in ProductVersion.objects.iterator():
+        Sale.objects.filter(product_version_id=version.pk).update(product_snapshot={
+            "id": version.product_id,
+            "name": version.name,
+            "price": float(version.price),
+            "gstPct": float(version.gstPct),
+        })
+
+
+class Migration(migrations.Migration):
+    # each batch commits on its own, so a large table is never locked in one long transaction
+    atomic = False
+
+    dependencies = [
+        ("sales", "0009_product_version"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, restore_snapshots),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:00
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0010_backfill_product_versions'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='sale',
+            name='product_snapshot',
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:17
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0011_remove_sale_product_snapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sale',
+            name='invoice_no',
+            field=models.CharField(blank=True, max_length=32, null=True, unique=True),
+        ),
+        migrations.CreateModel(
+            name='InvoiceSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('counter', models.PositiveIntegerField()),
+                ('financial_year', models.CharField(max_length=7)),
+                ('last_number', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('counter', 'financial_year'), name='invoice_sequence_key')],
+            },
+        ),
+        migrations.CreateModel(
+            name='InvoiceBlock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('counter', models.PositiveIntegerField()),
+                ('financial_year', models.CharField(max_length=7)),
+                ('first', models.PositiveIntegerField()),
+                ('last', models.PositiveIntegerField()),
+                ('issued_at', models.DateTimeField(auto_now_add=True)),
+                ('staff', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['counter', 'financial_year', 'first'], name='invoice_block_range_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0012_invoice_numbers'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('counter', models.PositiveIntegerField()),
+                ('quantity', models.IntegerField(default=0)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shards', to='sales.product')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('product', 'counter'), name='stock_shard_key')],
+            },
+        ),
+    ]
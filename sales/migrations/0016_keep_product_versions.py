@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0015_replica_pins'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='productversion',
+            name='product',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='versions', to='sales.product'),
+        ),
+    ]
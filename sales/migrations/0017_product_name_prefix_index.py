@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:35
+
+import django.db.models.functions.text
+import sales.models
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0016_keep_product_versions'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=sales.models.PatternIndex(django.db.models.functions.text.Lower('name'), name='product_name_prefix_idx'),
+        ),
+    ]
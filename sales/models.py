@@ -1,7 +1,11 @@
 # sales/models.py
 from django.db import models
 from django.contrib.auth.models import AbstractUser
+from django.contrib.postgres.indexes import OpClass
 from django.core.validators import MinValueValidator
+from django.db.models import Q
+from django.db.models.functions import Lower
+from django.utils import timezone
 from decimal import Decimal
 
 class User(AbstractUser):
@@ -13,6 +17,21 @@ class User(AbstractUser):
         return f"{self.username} ({self.role})"
 
 
+class PatternIndex(models.Index):
+    """
+    Expression index that can serve LIKE 'prefix%' on Postgres whatever the database
+    collation: there each expression gets text_pattern_ops (a plain btree only helps
+    under the C collation). Other databases get a plain index; SQLite has no operator
+    classes and would reject the SQL.
+    """
+
+    def create_sql(self, model, schema_editor, using="", **kwargs):
+        if schema_editor.connection.vendor != "postgresql":
+            return super().create_sql(model, schema_editor, using, **kwargs)
+        pattern = models.Index(*(OpClass(e, name="text_pattern_ops") for e in self.expressions), name=self.name)
+        return pattern.create_sql(model, schema_editor, using, **kwargs)
+
+
 class Product(models.Model):
     id = models.CharField(max_length=100, primary_key=True)  # allows 'p-apple-250'
     name = models.CharField(max_length=200)
@@ -21,13 +40,80 @@ class Product(models.Model):
     gstPct = models.DecimalField(max_digits=5, decimal_places=2, validators=[MinValueValidator(Decimal("0.00"))])
     stock = models.IntegerField(default=0)
 
+    class Meta:
+        indexes = [
+            # database fallback for /api/products/search/: name prefix (LIKE), its ordering, HSN lookup
+            PatternIndex(Lower("name"), name="product_name_prefix_idx"),
+            models.Index(Lower("name"), name="product_name_lower_idx"),
+            models.Index(fields=["hsn"], name="product_hsn_idx"),
+        ]
+
     def __str__(self):
         return self.name
 
 
+class CatalogChange(models.Model):
+    """
+    Append-only log of product changes (edits, deletes, stock movements). The row id is the
+    catalog version counters sync against; appending never contends the way one shared
+    counter row would. product_id is a plain column so tombstones outlive the product.
+    """
+    product_id = models.CharField(max_length=100, db_index=True)
+    deleted = models.BooleanField(default=False)
+    changed_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"v{self.pk} {self.product_id}{' (deleted)' if self.deleted else ''}"
+
+
+class ProductVersion(models.Model):
+    """
+    A product as it was billed: one row per distinct (product, name, hsn, price, gstPct),
+    shared by every sale made at those values, so a price change adds one row here
+    rather than a copy on each sale. Rows outlive their product (no cascade, no database
+    constraint), so an id cached by billing stays valid even if the product is deleted
+    and made again.
+    """
+    product = models.ForeignKey(Product, on_delete=models.DO_NOTHING, db_constraint=False, related_name="versions")
+    name = models.CharField(max_length=200)
+    hsn = models.CharField(max_length=50, blank=True)
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    gstPct = models.DecimalField(max_digits=5, decimal_places=2)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["product", "name", "hsn", "price", "gstPct"], name="product_version_key"),
+        ]
+
+    def __str__(self):
+        return f"{self.name} @ {self.price}"
+
+
+class StockShard(models.Model):
+    """
+    One counter's allocation of a product's stock when INVENTORY_MODE is "sharded"
+    (sales/inventory.py); counter 0 is the central pool. A sale decrements its own
+    counter's row, so counters billing the same product don't queue on one row.
+    Product.stock is then the consolidated total of these.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="shards")
+    counter = models.PositiveIntegerField()
+    quantity = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["product", "counter"], name="stock_shard_key"),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} counter {self.counter}: {self.quantity}"
+
+
 class Sale(models.Model):
     MODE_CHOICES = (("Cash", "Cash"), ("Card", "Card"), ("UPI", "UPI"))
-    date = models.DateTimeField(auto_now_add=True)
+    # default rather than auto_now_add, so seeding/backfills can write historical dates
+    date = models.DateTimeField(default=timezone.now)
     counter = models.PositiveIntegerField()
     staff = models.ForeignKey(User, on_delete=models.CASCADE)
     product = models.ForeignKey(Product, on_delete=models.PROTECT)
@@ -37,7 +123,160 @@ class Sale(models.Model):
     gst = models.DecimalField(max_digits=12, decimal_places=2)
     total = models.DecimalField(max_digits=12, decimal_places=2)
     mode = models.CharField(max_length=10, choices=MODE_CHOICES, default="Cash")
-    product_snapshot = models.JSONField(null=True, blank=True)
+    # the product as billed; null only for sales that predate billing snapshots
+    product_version = models.ForeignKey(ProductVersion, on_delete=models.PROTECT, null=True, blank=True)
+    # "C<counter>/<financial year>/<number>", gap-free per counter and year (sales/invoices.py);
+    # null for sales billed before invoice numbering
+    invoice_no = models.CharField(max_length=32, null=True, blank=True, unique=True)
+    # set for sales billed offline and uploaded through /api/sales/sync/
+    client_id = models.UUIDField(null=True, blank=True, unique=True)
+    client_ts = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # keyset pagination order for the sales list, plus one per list filter
+            models.Index(fields=["-date", "-id"], name="sale_date_id_idx"),
+            models.Index(fields=["counter", "-date", "-id"], name="sale_counter_date_idx"),
+            models.Index(fields=["staff", "-date", "-id"], name="sale_staff_date_idx"),
+            models.Index(fields=["mode", "-date", "-id"], name="sale_mode_date_idx"),
+        ]
 
     def __str__(self):
         return f"Sale {self.pk} - {self.product.name}"
+
+
+class InvoiceSequence(models.Model):
+    """
+    Last invoice number used by one counter in one financial year. One row per sequence,
+    so billing on one counter only ever waits on its own row, never on another counter.
+    """
+    counter = models.PositiveIntegerField()
+    financial_year = models.CharField(max_length=7)   # "2026-27"
+    last_number = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["counter", "financial_year"], name="invoice_sequence_key"),
+        ]
+
+    def __str__(self):
+        return f"counter {self.counter} {self.financial_year}: {self.last_number}"
+
+
+class InvoiceBlock(models.Model):
+    """A run of invoice numbers handed to a counter ahead of time, for billing offline."""
+    counter = models.PositiveIntegerField()
+    financial_year = models.CharField(max_length=7)
+    first = models.PositiveIntegerField()
+    last = models.PositiveIntegerField()
+    staff = models.ForeignKey(User, on_delete=models.CASCADE)
+    issued_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["counter", "financial_year", "first"], name="invoice_block_range_idx")]
+
+    def __str__(self):
+        return f"counter {self.counter} {self.financial_year}: {self.first}-{self.last}"
+
+
+class IdempotencyKey(models.Model):
+    """
+    A client-supplied Idempotency-Key and the response it produced, written in the same
+    transaction as the sale so a retried request can be answered from here.
+    """
+    staff = models.ForeignKey(User, on_delete=models.CASCADE)
+    key = models.CharField(max_length=255)
+    endpoint = models.CharField(max_length=50)
+    request_hash = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(default=0)
+    response = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["staff", "key"], name="idempotency_key_per_user"),
+        ]
+
+    def __str__(self):
+        return f"{self.key} ({self.endpoint})"
+
+
+class DailySalesSummary(models.Model):
+    """
+    Running totals per (business date, counter, staff, product, mode), kept up to date in the
+    same transaction as each sale so reports never have to rescan the raw Sale rows.
+    Business dates use UTC day boundaries, like the CSV reports.
+    """
+    business_date = models.DateField()
+    counter = models.PositiveIntegerField()
+    staff = models.ForeignKey(User, on_delete=models.CASCADE)
+    product = models.ForeignKey(Product, on_delete=models.PROTECT)
+    mode = models.CharField(max_length=10, choices=Sale.MODE_CHOICES)
+    sales = models.IntegerField(default=0)
+    qty = models.BigIntegerField(default=0)
+    taxable = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal("0.00"))
+    gst = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal("0.00"))
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal("0.00"))
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["business_date", "counter", "staff", "product", "mode"], name="daily_summary_key"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.business_date} counter {self.counter} {self.product_id} {self.mode}"
+
+
+class Job(models.Model):
+    """
+    A background job (an export or report) queued through /api/jobs/ and run by
+    `manage.py run_jobs` (sales/jobs.py). The result file is kept until expires_at.
+    """
+    QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+    STATUS_CHOICES = ((QUEUED, "Queued"), (RUNNING, "Running"), (DONE, "Done"), (FAILED, "Failed"))
+
+    kind = models.CharField(max_length=50)
+    params = models.JSONField(default=dict, blank=True)
+    owner = models.ForeignKey(User, on_delete=models.CASCADE)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # while running: which of its kind's concurrency slots it holds, and who runs it
+    slot = models.PositiveSmallIntegerField(null=True, blank=True)
+    worker = models.CharField(max_length=32, blank=True)
+    progress = models.BigIntegerField(default=0)            # rows written so far
+    total = models.BigIntegerField(null=True, blank=True)   # rows expected, when known up front
+    error = models.TextField(blank=True)
+    result = models.CharField(max_length=200, blank=True)   # file name under JOB_RESULTS_DIR
+    filename = models.CharField(max_length=200, blank=True)
+    content_type = models.CharField(max_length=100, blank=True)
+    size = models.BigIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    run_after = models.DateTimeField(default=timezone.now)   # pushed back between retries
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    expires_at = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "run_after"], name="job_queue_idx")]
+        constraints = [
+            # a kind's concurrency limit: a running job must hold one of its numbered slots
+            models.UniqueConstraint(fields=["kind", "slot"], condition=Q(status="running"), name="job_running_slot"),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} #{self.pk} ({self.status})"
+
+
+class ReplicaPin(models.Model):
+    """
+    Until when a user's reads stay on the primary rather than the read replica, set after
+    each of their writes (sales/replicas.py). In the database so every worker sees it.
+    """
+    user_id = models.BigIntegerField(primary_key=True)   # a plain column: no FK check on the write path
+    until = models.DateTimeField()
+
+    def __str__(self):
+        return f"user {self.user_id} until {self.until:%H:%M:%S}"
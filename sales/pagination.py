@@ -0,0 +1,101 @@
+# sales/pagination.py
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+from urllib import parse
+
+from asgiref.sync import sync_to_async
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+from rest_framework.utils.urls import replace_query_param
+
+
+class SaleCursorPagination(CursorPagination):
+    """
+    Keyset pagination for the sales list, newest first on (date, id). The cursor holds
+    the (date, id) of the row it continues from, so each page is an index range scan on
+    sale_date_id_idx (or the matching filter index) with no OFFSET, even through the
+    many rows a checkout or sync writes with the same date. DRF's CursorPagination
+    positions on the first ordering field alone and steps through ties by offset.
+    """
+    ordering = ("-date", "-id")
+    page_size = 50
+    page_size_query_param = "page_size"
+    max_page_size = 500
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+        self.cursor = self.decode_cursor(request)
+
+        if self.cursor is None:
+            queryset = queryset.order_by("-date", "-id")
+        else:
+            reverse, date, pk = self.cursor
+            # date <= d bounds the index range; the OR then drops the ties already seen
+            if reverse:
+                queryset = queryset.filter(date__gte=date).filter(Q(date__gt=date) | Q(id__gt=pk)).order_by("date", "id")
+            else:
+                queryset = queryset.filter(date__lte=date).filter(Q(date__lt=date) | Q(id__lt=pk)).order_by("-date", "-id")
+
+        # one extra row tells us whether there is a following page
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        more = len(results) > self.page_size
+        if self.cursor is not None and self.cursor[0]:
+            self.page.reverse()
+            self.has_next, self.has_previous = bool(self.page), more
+        else:
+            self.has_next, self.has_previous = more, self.cursor is not None
+        self.display_page_controls = self.has_next or self.has_previous
+        return self.page
+
+    async def apaginate_queryset(self, queryset, request):
+        """
+        paginate_queryset() for async views: the same cursors and links, with the page
+        query run off the event loop (as the async ORM does itself). `request` is a DRF
+        Request wrapping the async request.
+        """
+        return await sync_to_async(self.paginate_queryset)(queryset, request)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor((False, *_position(self.page[-1])))
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor((True, *_position(self.page[0])))
+
+    def decode_cursor(self, request):
+        """(reverse, date, id) from the ?cursor= parameter, or None for the first page."""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            padded = encoded + "=" * (-len(encoded) % 4)
+            tokens = parse.parse_qs(urlsafe_b64decode(padded.encode("ascii")).decode("ascii"))
+            date, pk = tokens["p"][0].rsplit("_", 1)
+            date = datetime.fromisoformat(date)
+            if date.tzinfo is None:
+                raise ValueError
+            return tokens.get("r", ["0"])[0] == "1", date, int(pk)
+        except (KeyError, TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, cursor):
+        reverse, date, pk = cursor
+        tokens = {"p": f"{date.isoformat()}_{pk}"}
+        if reverse:
+            tokens["r"] = "1"
+        # URL-safe and unpadded, so the cursor needs no escaping in a link
+        encoded = urlsafe_b64encode(parse.urlencode(tokens).encode("ascii")).decode("ascii").rstrip("=")
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+
+def _position(row):
+    if isinstance(row, dict):
+        return row["date"], row["id"]
+    return row.date, row.id
@@ -0,0 +1,132 @@
+# sales/product_io.py
+import codecs
+import csv
+import json
+
+from django.db import transaction
+from rest_framework.exceptions import ValidationError
+
+from .catalog import record_changes
+from .exports import iter_csv
+from .inventory import set_stock
+from .models import Product
+from .serializers import ProductImportSerializer
+
+IMPORT_FORMATS = ("csv", "jsonl")
+PRODUCT_FIELDS = ["id", "name", "hsn", "price", "gstPct", "stock"]
+MAX_REPORTED_ERRORS = 1000
+
+
+def guess_format(name="", content_type=""):
+    if name.endswith((".jsonl", ".ndjson")) or "ndjson" in content_type or "jsonl" in content_type:
+        return "jsonl"
+    return "csv"
+
+
+def iter_records(stream, fmt):
+    """
+    Yield (row number, dict or None) from a binary stream, one line at a time.
+    None marks a line that couldn't be parsed at all.
+    """
+    text = codecs.iterdecode(stream, "utf-8-sig")
+    if fmt == "csv":
+        for n, row in enumerate(csv.DictReader(text), start=2):  # row 1 is the header
+            yield n, row
+        return
+    buf = ""
+    n = 0
+    for chunk in text:
+        buf += chunk
+        *lines, buf = buf.split("\n")
+        for line in lines:
+            n += 1
+            if line.strip():
+                yield n, _json_line(line)
+    if buf.strip():
+        yield n + 1, _json_line(buf)
+
+
+def _json_line(line):
+    try:
+        value = json.loads(line)
+    except ValueError:
+        return None
+    return value if isinstance(value, dict) else None
+
+
+def import_products(records, batch_size=1000):
+    """
+    Validate rows with the ProductSerializer rules and upsert them batch by batch with
+    INSERT ... ON CONFLICT (id) DO UPDATE. Bad rows are reported and skipped; they don't
+    abort the rest of their batch.
+    """
+    validator = ProductImportSerializer()   # one instance, reused: building fields per row is the slow part
+    report = {"rows": 0, "upserted": 0, "error_count": 0, "errors": []}
+    batch = {}
+
+    for n, row in records:
+        report["rows"] += 1
+        if row is None:
+            _error(report, n, {"non_field_errors": ["could not parse line"]})
+            continue
+        try:
+            data = validator.run_validation(row)
+        except ValidationError as exc:
+            _error(report, n, exc.detail)
+            continue
+        batch[data["id"]] = data   # a repeated id in one batch: last one wins
+        if len(batch) >= batch_size:
+            report["upserted"] += _upsert(batch)
+            batch = {}
+    if batch:
+        report["upserted"] += _upsert(batch)
+    return report
+
+
+def _error(report, row, detail):
+    report["error_count"] += 1
+    if len(report["errors"]) < MAX_REPORTED_ERRORS:
+        report["errors"].append({"row": row, "errors": detail})
+
+
+def _upsert(batch):
+    # only overwrite the columns each row supplied (e.g. a price list without stock): rows
+    # are grouped by their set of columns, one upsert per group
+    groups = {}
+    for data in batch.values():
+        groups.setdefault(frozenset(data), []).append(data)
+    with transaction.atomic():
+        for columns, rows in groups.items():
+            Product.objects.bulk_create(
+                [Product(**data) for data in rows],
+                update_conflicts=True,
+                unique_fields=["id"],
+                update_fields=[f for f in PRODUCT_FIELDS if f != "id" and f in columns],
+            )
+        # sharded: only rows that carry a stock figure reset their product's shards
+        set_stock({pid: data["stock"] for pid, data in batch.items() if "stock" in data})
+        record_changes(list(batch))
+    return len(batch)
+
+
+def export_rows():
+    return Product.objects.order_by("pk").values_list(*PRODUCT_FIELDS).iterator(chunk_size=2000)
+
+
+def iter_products_csv(rows=None):
+    rows = export_rows() if rows is None else rows
+    return iter_csv(PRODUCT_FIELDS, ([pid, name, hsn, str(price), str(gst), stock] for pid, name, hsn, price, gst, stock in rows))
+
+
+def iter_products_jsonl(rows=None):
+    lines = []
+    for row in export_rows() if rows is None else rows:
+        item = dict(zip(PRODUCT_FIELDS, row))
+        item["price"] = str(item["price"])
+        item["gstPct"] = str(item["gstPct"])
+        lines.append(json.dumps(item))
+        if len(lines) >= 1000:
+            yield ("\n".join(lines) + "\n").encode()
+            lines = []
+    if lines:
+        yield ("\n".join(lines) + "\n").encode()
@@ -0,0 +1,152 @@
+# sales/renderers.py
+import json
+from operator import itemgetter
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.settings import api_settings
+
+from .exports import SALES_CSV_HEADER, iter_csv, iter_gzip
+
+try:
+    import msgpack
+except ImportError:  # optional: MessagePack output is offered only when it is installed
+    msgpack = None
+
+FLUSH_BYTES = 64 * 1024
+
+
+def to_columnar(rows):
+    """
+    [{...}, ...] -> {"columns": [...], "rows": [[...], ...], "lookups": {...}}.
+    Nested objects with an "id" (a sale's product) go into lookups[field][id] once and
+    the row carries just the id; other nested objects (totals) become "field.key" columns.
+    """
+    if not rows:
+        return {"columns": [], "rows": [], "lookups": {}}
+    columns, getters, lookups = [], [], {}
+    for key, value in rows[0].items():
+        if isinstance(value, dict) and "id" in value:
+            columns.append(key)
+            getters.append(_reference(key, lookups.setdefault(key, {})))
+        elif isinstance(value, dict):
+            for sub in value:
+                columns.append(f"{key}.{sub}")
+                getters.append(lambda row, key=key, sub=sub: row[key][sub])
+        else:
+            columns.append(key)
+            getters.append(itemgetter(key))
+    return {"columns": columns, "rows": [[get(row) for get in getters] for row in rows], "lookups": lookups}
+
+
+def _reference(key, table):
+    def get(row):
+        value = row[key]
+        if value is None:
+            return None
+        table.setdefault(value["id"], value)
+        return value["id"]
+    return get
+
+
+def columnar_data(data):
+    """Columnar form of a list or a paginated {"results": [...]} body; anything else as is."""
+    if isinstance(data, list):
+        return to_columnar(data)
+    if isinstance(data, dict) and isinstance(data.get("results"), list):
+        return {**{k: v for k, v in data.items() if k != "results"}, **to_columnar(data["results"])}
+    return data
+
+
+class ColumnarJSONRenderer(JSONRenderer):
+    """?format=columnar or Accept: application/vnd.webillz.columnar+json"""
+    media_type = "application/vnd.webillz.columnar+json"
+    format = "columnar"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return super().render(columnar_data(data), accepted_media_type, renderer_context)
+
+
+class MessagePackRenderer(BaseRenderer):
+    """?format=msgpack or Accept: application/msgpack -- the columnar body as MessagePack."""
+    media_type = "application/msgpack"
+    format = "msgpack"
+    charset = None
+    render_style = "binary"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        return msgpack.packb(columnar_data(data), use_bin_type=True, default=str)
+
+
+# opt-in renderers for the sales endpoints, after DRF's defaults so plain JSON stays the default
+SALES_RENDERERS = [*api_settings.DEFAULT_RENDERER_CLASSES, ColumnarJSONRenderer]
+if msgpack is not None:
+    SALES_RENDERERS.append(MessagePackRenderer)
+
+COLUMNAR_FORMATS = ("columnar", "msgpack")
+REPORT_COLUMNS = ["date", "counter", "staff", "product", "qty", "discount", "taxable", "gst", "total"]
+
+
+def _report_rows(csv_rows, products):
+    """Report CSV rows -> columnar rows, (product name, billed price) replaced by an index into `products`."""
+    index = {}
+    for date, counter, staff, name, qty, price, discount, taxable, gst, total in csv_rows:
+        key = (name, price)
+        ref = index.get(key)
+        if ref is None:
+            ref = index[key] = len(products)
+            products.append({"name": name, "price": price})
+        yield [date, counter, staff, ref, qty, discount, taxable, gst, total]
+
+
+def iter_report_columnar(csv_rows):
+    """
+    Stream the daily report as columnar JSON:
+    {"columns": [...], "rows": [[...], ...], "products": [{"name", "price"}, ...]}
+    The product table comes last, so rows can be sent before the whole report is read.
+    """
+    products = []
+    buf = [f'{{"columns":{json.dumps(REPORT_COLUMNS)},"rows":[']
+    size = 0
+    sep = ""
+    for row in _report_rows(csv_rows, products):
+        text = sep + json.dumps(row, separators=(",", ":"))
+        sep = ","
+        buf.append(text)
+        size += len(text)
+        if size >= FLUSH_BYTES:
+            yield "".join(buf).encode()
+            buf, size = [], 0
+    buf.append(f'],"products":{json.dumps(products, separators=(",", ":"))}}}')
+    yield "".join(buf).encode()
+
+
+def iter_report_msgpack(csv_rows):
+    """
+    The same report as a MessagePack stream (read it with msgpack.Unpacker): one
+    {"columns": [...]} map, then one array per row, then {"products": [...]}.
+    """
+    packer = msgpack.Packer(use_bin_type=True)
+    products = []
+    chunk = bytearray(packer.pack({"columns": REPORT_COLUMNS}))
+    for row in _report_rows(csv_rows, products):
+        chunk += packer.pack(row)
+        if len(chunk) >= FLUSH_BYTES:
+            yield bytes(chunk)
+            chunk = bytearray()
+    chunk += packer.pack({"products": products})
+    yield bytes(chunk)
+
+
+def iter_report(csv_rows, fmt, gzipped=False):
+    """(chunks, content type, file extension) of daily report rows as CSV, columnar JSON or MessagePack."""
+    if fmt == "columnar":
+        body, content_type, ext = iter_report_columnar(csv_rows), ColumnarJSONRenderer.media_type, "json"
+    elif fmt == "msgpack":
+        body, content_type, ext = iter_report_msgpack(csv_rows), MessagePackRenderer.media_type, "msgpack"
+    else:
+        body, content_type, ext = iter_csv(SALES_CSV_HEADER, csv_rows), "text/csv", "csv"
+    if gzipped:
+        return iter_gzip(body), "application/gzip", f"{ext}.gz"
+    return body, content_type, ext
@@ -0,0 +1,200 @@
+# sales/replicas.py
+import logging
+import time
+from contextvars import ContextVar
+from datetime import timedelta
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, OperationalError, connections
+from django.utils import timezone
+
+from .models import ReplicaPin
+
+REPLICA = "replica"
+ROUTER = "sales.replicas.ReplicaRouter"
+UPSERT = {"update_conflicts": True, "unique_fields": ["user_id"], "update_fields": ["until"]}   # one row per user
+
+logger = logging.getLogger("sales.replicas")
+
+# alias reads go to; None leaves them on the primary. Set only around views marked @replica_reads.
+_read_db = ContextVar("read_db", default=None)
+
+
+class ReplicaRouter:
+    """
+    Reads inside a @replica_reads view go to the replica; every other query, all writes,
+    select_for_update() (Django routes it as a write) and reads inside a transaction on
+    the primary stay on the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        alias = _read_db.get()
+        if alias is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True   # same data on both sides
+
+
+_down_until = [0.0]
+
+
+def mark_replica_down():
+    _down_until[0] = time.monotonic() + settings.REPLICA_RETRY_SECONDS
+
+
+def replica_available(connect=True):
+    """
+    Whether a replica is configured and answering; a failed connect benches it for
+    REPLICA_RETRY_SECONDS. Async callers pass connect=False and rely on the retry.
+    """
+    if REPLICA not in settings.DATABASES or time.monotonic() < _down_until[0]:
+        return False
+    if not connect:
+        return True
+    try:
+        connections[REPLICA].ensure_connection()
+    except DatabaseError:
+        logger.warning("read replica unavailable, reading from the primary", exc_info=True)
+        mark_replica_down()
+        return False
+    return True
+
+
+def _pins(request):
+    """The user's unexpired ReplicaPin rows on the primary, or None for an anonymous request."""
+    user_id = getattr(getattr(request, "user", None), "pk", None)
+    if user_id is None:
+        return None
+    return ReplicaPin.objects.using(DEFAULT_DB_ALIAS).filter(user_id=user_id, until__gt=timezone.now())
+
+
+def read_alias(request, connect=True):
+    """Where this request's report/list reads go: the replica, unless it is down or the user just wrote."""
+    if not replica_available(connect):
+        return DEFAULT_DB_ALIAS
+    pins = _pins(request)
+    return DEFAULT_DB_ALIAS if pins is not None and pins.exists() else REPLICA
+
+
+async def aread_alias(request):
+    """read_alias() for async views; the replica isn't probed (see replica_available)."""
+    if not replica_available(connect=False):
+        return DEFAULT_DB_ALIAS
+    pins = _pins(request)
+    return DEFAULT_DB_ALIAS if pins is not None and await pins.aexists() else REPLICA
+
+
+def _streamed(alias, chunks):
+    # a streamed report runs its queries after the view has returned, so route each chunk too
+    chunks = iter(chunks)
+    while True:
+        token = _read_db.set(alias)
+        try:
+            chunk = next(chunks)
+        except StopIteration:
+            return
+        finally:
+            _read_db.reset(token)
+        yield chunk
+
+
+def replica_reads(view):
+    """
+    Send a read-only view's queries to the read replica (see read_alias). If the replica
+    fails mid-request the view is run again on the primary. Wraps viewset methods
+    (self, request, ...) and async function views (request, ...).
+    """
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            alias = await aread_alias(request)
+            token = _read_db.set(alias)
+            try:
+                return await view(request, *args, **kwargs)
+            except OperationalError:
+                if alias == DEFAULT_DB_ALIAS:
+                    raise
+                mark_replica_down()
+                _read_db.set(DEFAULT_DB_ALIAS)
+                return await view(request, *args, **kwargs)
+            finally:
+                _read_db.reset(token)
+
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(self, request, *args, **kwargs):
+        alias = read_alias(request)
+        token = _read_db.set(alias)
+        try:
+            response = view(self, request, *args, **kwargs)
+        except OperationalError:
+            if alias == DEFAULT_DB_ALIAS:
+                raise
+            mark_replica_down()
+            alias = DEFAULT_DB_ALIAS
+            _read_db.set(alias)
+            response = view(self, request, *args, **kwargs)
+        finally:
+            _read_db.reset(token)
+        if alias != DEFAULT_DB_ALIAS and getattr(response, "streaming", False):
+            response.streaming_content = _streamed(alias, response.streaming_content)
+        return response
+
+    return wrapper
+
+
+class ReplicaPinMiddleware:
+    """
+    Pin a user's reads to the primary for REPLICA_STICKY_SECONDS after a successful write.
+    The pin is a ReplicaPin row on the primary, so every worker sees it and the client
+    needn't send anything back (the frontend is cross-site, so it wouldn't get a cookie).
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        response = self.get_response(request)
+        pin = self.pin_for(request, response)
+        if pin is not None:
+            try:
+                ReplicaPin.objects.bulk_create([pin], **UPSERT)
+            except DatabaseError:
+                logger.exception("replica pin for user %s not saved", pin.user_id)
+        return response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        pin = self.pin_for(request, response)
+        if pin is not None:
+            try:
+                await ReplicaPin.objects.abulk_create([pin], **UPSERT)
+            except DatabaseError:
+                logger.exception("replica pin for user %s not saved", pin.user_id)
+        return response
+
+    def pin_for(self, request, response):
+        """The ReplicaPin to save after this response, or None."""
+        if ROUTER not in settings.DATABASE_ROUTERS:
+            return None   # reads aren't routed, so there is nothing to pin
+        if request.method in ("GET", "HEAD", "OPTIONS") or response.status_code >= 400:
+            return None
+        # DRF authenticates in the view and copies the user onto the Django request
+        user_id = getattr(getattr(request, "user", None), "pk", None)
+        if user_id is None:
+            return None
+        return ReplicaPin(user_id=user_id, until=timezone.now() + timedelta(seconds=settings.REPLICA_STICKY_SECONDS))
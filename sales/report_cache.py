@@ -0,0 +1,200 @@
+# sales/report_cache.py
+import hashlib
+import json
+import os
+import re
+import tempfile
+import time
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+
+# Layout under REPORT_CACHE_DIR:
+#   blobs/<sha256>                report bytes, named by their hash, which is also the ETag
+#   keys/<from>_<to>_<hash>.json  one per request (range, format, filters): {"sha256", "created"}
+#   stale/<date>                  touched when a day is invalidated, so a report being built
+#                                 from the old rows meanwhile isn't kept
+
+# request parameters that change a report's bytes besides the date range
+REPORT_PARAMS = ("counter", "staff", "mode", "gzip")
+KEY_FILE = re.compile(r"^(\d{4}-\d{2}-\d{2})_(\d{4}-\d{2}-\d{2})_[0-9a-f]{64}\.json$")
+RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+CHUNK_SIZE = 64 * 1024
+# sales still committing, or not yet on the read replica, at midnight land within this
+CLOSE_GRACE = timedelta(minutes=15)
+
+
+def _dir(*parts):
+    return os.path.join(settings.REPORT_CACHE_DIR, *parts)
+
+
+def closed(end):
+    """Whether every day up to `end` is over (UTC business dates), so its report can't change."""
+    return end < (datetime.now(dt_timezone.utc) - CLOSE_GRACE).date()
+
+
+def report_key(start, end, fmt, params):
+    raw = json.dumps([fmt] + [params.get(name, "") for name in REPORT_PARAMS])
+    return f"{start.isoformat()}_{end.isoformat()}_{hashlib.sha256(raw.encode()).hexdigest()}"
+
+
+def lookup(key):
+    """The cached entry for a report key, or None. A hit counts as a use for LRU eviction."""
+    try:
+        with open(_dir("keys", f"{key}.json")) as fh:
+            entry = json.load(fh)
+        os.utime(_dir("blobs", entry["sha256"]))
+    except (OSError, ValueError, KeyError):
+        return None
+    return entry
+
+
+def store(key, start, end, chunks):
+    """
+    Write a report's chunks to the cache and return its entry. Returns None, caching
+    nothing, if one of its days was invalidated while the report was being built.
+    """
+    started = time.time()
+    os.makedirs(_dir("blobs"), exist_ok=True)
+    os.makedirs(_dir("keys"), exist_ok=True)
+    digest = hashlib.sha256()
+    fd, tmp = tempfile.mkstemp(dir=_dir("blobs"), prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            for chunk in chunks:
+                digest.update(chunk)
+                fh.write(chunk)
+        blob = _dir("blobs", digest.hexdigest())
+        os.replace(tmp, blob)   # same bytes under the same name if another worker got here first
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    entry = {"sha256": digest.hexdigest(), "created": int(started)}
+    _write_json(_dir("keys", f"{key}.json"), entry)
+    if any(_invalidated_since(day, started) for day in _days(start, end)):
+        _unlink(_dir("keys", f"{key}.json"))
+        return None
+    evict()
+    return entry
+
+
+def forget_days(days):
+    """Invalidate cached reports covering any of these dates; call once the change has committed."""
+    days = {d for d in days if d is not None}
+    if not days:
+        return
+    os.makedirs(_dir("stale"), exist_ok=True)
+    for day in days:
+        with open(_dir("stale", day.isoformat()), "w"):
+            pass
+    for name in os.listdir(_dir("keys")) if os.path.isdir(_dir("keys")) else ():
+        match = KEY_FILE.match(name)
+        if match and any(match.group(1) <= day.isoformat() <= match.group(2) for day in days):
+            _unlink(_dir("keys", name))
+
+
+def evict():
+    """Drop least recently used reports until the cache fits in REPORT_CACHE_MAX_BYTES."""
+    blobs = []
+    with os.scandir(_dir("blobs")) as entries:
+        for e in entries:
+            if not e.name.startswith("."):
+                st = e.stat()
+                blobs.append((st.st_mtime, st.st_size, e.path))
+    total = sum(size for _, size, _ in blobs)
+    for _, size, path in sorted(blobs):
+        if total <= settings.REPORT_CACHE_MAX_BYTES:
+            break
+        _unlink(path)   # keys pointing at it become misses and are rewritten on the next build
+        total -= size
+
+
+def file_response(request, entry, content_type, filename):
+    """
+    Serve a cached report straight from its file: strong ETag, Last-Modified, 304 on a
+    matching If-None-Match / If-Modified-Since, and single byte ranges (206 / 416).
+    """
+    path = _dir("blobs", entry["sha256"])
+    etag = f'"{entry["sha256"]}"'
+    size = os.path.getsize(path)
+    conditional = get_conditional_response(request, etag=etag, last_modified=entry["created"])
+    if conditional is not None:
+        response = conditional
+    else:
+        byte_range = _byte_range(request, etag, entry["created"], size)
+        if byte_range is None:
+            response = FileResponse(open(path, "rb"), content_type=content_type)
+        elif byte_range is False:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{size}"
+        else:
+            first, last = byte_range
+            response = StreamingHttpResponse(_read(path, first, last - first + 1), status=206, content_type=content_type)
+            response["Content-Range"] = f"bytes {first}-{last}/{size}"
+            response["Content-Length"] = str(last - first + 1)
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(entry["created"])
+    response["Accept-Ranges"] = "bytes"
+    response["Cache-Control"] = "private, max-age=86400"
+    return response
+
+
+def _byte_range(request, etag, created, size):
+    """(first, last) to send, None for the whole file, False when unsatisfiable."""
+    header = request.headers.get("Range")
+    if not header:
+        return None
+    if_range = request.headers.get("If-Range")
+    if if_range and if_range != etag and parse_http_date_safe(if_range) != created:
+        return None   # the client's copy is another version: send all of this one
+    match = RANGE.match(header.strip())
+    if not match or match.groups() == ("", ""):
+        return None   # several ranges, or units we don't do: the whole file is a valid answer
+    first, last = match.groups()
+    if first == "":
+        first, last = max(size - int(last), 0), size - 1
+    else:
+        first, last = int(first), min(int(last) if last else size - 1, size - 1)
+    if first >= size or first > last:
+        return False
+    return first, last
+
+
+def _read(path, first, length):
+    with open(path, "rb") as fh:
+        fh.seek(first)
+        while length > 0:
+            chunk = fh.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                return
+            length -= len(chunk)
+            yield chunk
+
+
+def _days(start, end):
+    return [date.fromordinal(n) for n in range(start.toordinal(), end.toordinal() + 1)]
+
+
+def _invalidated_since(day, started):
+    try:
+        return os.path.getmtime(_dir("stale", day.isoformat())) >= started
+    except OSError:
+        return False
+
+
+def _write_json(path, data):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+    with os.fdopen(fd, "w") as fh:
+        json.dump(data, fh)
+    os.replace(tmp, path)
+
+
+def _unlink(path):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
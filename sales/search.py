@@ -0,0 +1,247 @@
+# sales/search.py
+import re
+import threading
+import time
+import heapq
+from bisect import bisect_left, insort
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db.models.functions import Lower
+
+from .catalog import current_version
+from .models import CatalogChange, Product
+
+WORD = re.compile(r"[a-z0-9]+")
+REBUILD_OVER = 5000        # changed products after which a full rebuild beats patching
+FUZZY_MIN_SCORE = 0.6      # share of the query's trigrams a fuzzy hit must contain
+WORD_SCAN_CAP = 1000       # most name words examined per query word
+COMMON_GRAM_SHARE = 0.05   # trigrams in more than this share of names are ignored for fuzzy hits
+
+# rank of each kind of hit; fuzzy hits score below all of these
+EXACT_ID, EXACT_HSN, NAME_PREFIX, WORD_PREFIX, ID_PREFIX, HSN_PREFIX = 100, 90, 80, 70, 60, 50
+
+
+def normalize(text):
+    return " ".join(WORD.findall((text or "").lower()))
+
+
+def trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def product_row(pid, name, hsn, price, gst_pct, stock):
+    """Same shape and formatting as ProductSerializer output."""
+    return {"id": pid, "name": name, "hsn": hsn, "price": f"{price:.2f}", "gstPct": f"{gst_pct:.2f}", "stock": stock}
+
+
+class ProductIndex:
+    """
+    In-memory lookup over the catalog: exact id / HSN maps, a sorted array of names and
+    one of name words for prefix search (bisect), and a trigram index for typos and
+    substrings. Patched in place as products change.
+    """
+
+    def __init__(self, rows=(), version=0):
+        self.version = version
+        self.rows = {}
+        self.by_hsn = defaultdict(list)  # hsn -> sorted (name length, name, id), best-ranked first
+        self.names = []     # sorted (normalized name, id)
+        self.words = []     # sorted (word, id)
+        self.ids = []       # sorted (lowercased id, id)
+        self.grams = defaultdict(set)
+        for row in rows:
+            self._add(row, bulk=True)
+        for entries in self.by_hsn.values():
+            entries.sort()
+        self.names.sort()
+        self.words.sort()
+        self.ids.sort()
+
+    def _keys(self, row):
+        name = normalize(row["name"])
+        return name, set(name.split()), trigrams(name)
+
+    def _add(self, row, bulk=False):
+        pid = row["id"]
+        name, words, grams = self._keys(row)
+        self.rows[pid] = row
+        put = list.append if bulk else insort
+        if row["hsn"]:
+            put(self.by_hsn[row["hsn"]], _rank_key(row))
+        put(self.names, (name, pid))
+        put(self.ids, (pid.lower(), pid))
+        for w in words:
+            put(self.words, (w, pid))
+        for g in grams:
+            self.grams[g].add(pid)
+
+    def _remove(self, pid):
+        row = self.rows.pop(pid, None)
+        if row is None:
+            return
+        name, words, grams = self._keys(row)
+        _discard_sorted(self.by_hsn.get(row["hsn"], []), _rank_key(row))
+        _discard_sorted(self.names, (name, pid))
+        _discard_sorted(self.ids, (pid.lower(), pid))
+        for w in words:
+            _discard_sorted(self.words, (w, pid))
+        for g in grams:
+            self.grams[g].discard(pid)
+
+    def apply(self, changed_rows, deleted_ids, version):
+        for pid in deleted_ids:
+            self._remove(pid)
+        for row in changed_rows:
+            self._remove(row["id"])
+            self._add(row)
+        self.version = version
+
+    def search(self, q, limit=20):
+        q_norm = normalize(q)
+        q_raw = q.strip().lower()
+        if not q_raw:
+            return []
+        scores = {}
+
+        def hit(pid, score):
+            if scores.get(pid, 0) < score:
+                scores[pid] = score
+
+        if q.strip() in self.rows:
+            hit(q.strip(), EXACT_ID)
+        for *_, pid in self.by_hsn.get(q.strip(), ())[:limit]:
+            hit(pid, EXACT_HSN)
+        for _, pid in _prefix(self.ids, q_raw, limit):
+            hit(pid, ID_PREFIX)
+        if q_norm:
+            for _, pid in _prefix(self.names, q_norm, limit):
+                hit(pid, NAME_PREFIX)
+            # every query word must start some word of the name: "up 250" finds "7 Up 250ml"
+            matched = None
+            for token in q_norm.split():
+                pids = {pid for _, pid in _prefix(self.words, token, WORD_SCAN_CAP)}
+                matched = pids if matched is None else matched & pids
+            for pid in matched or ():
+                hit(pid, WORD_PREFIX)
+        if q_raw.isdigit():
+            for hsn in _prefix_keys(self.by_hsn, q_raw, limit):
+                for *_, pid in self.by_hsn[hsn][:limit]:
+                    hit(pid, HSN_PREFIX)
+
+        if len(scores) < limit and len(q_norm) >= 3:
+            # fuzzy: count shared trigrams, skipping ones so common they say nothing
+            too_common = max(50, int(len(self.rows) * COMMON_GRAM_SHARE))
+            wanted = [g for g in trigrams(q_norm) if len(self.grams.get(g, ())) <= too_common]
+            counts = Counter()
+            for g in wanted:
+                counts.update(self.grams.get(g, ()))
+            for pid, n in counts.most_common(limit * 4):
+                share = n / len(wanted)
+                if share < FUZZY_MIN_SCORE:
+                    break
+                hit(pid, int(40 * share))
+
+        best = heapq.nsmallest(limit, scores.items(), key=lambda kv: (-kv[1],) + _rank_key(self.rows[kv[0]]))
+        return [dict(self.rows[pid], score=score) for pid, score in best]
+
+
+def _rank_key(row):
+    """Tie-break among equal scores: shorter, then alphabetical names first."""
+    return (len(row["name"]), row["name"], row["id"])
+
+
+def _prefix(sorted_pairs, prefix, limit):
+    start = bisect_left(sorted_pairs, (prefix,))
+    out = []
+    for pair in sorted_pairs[start:start + limit]:
+        if not pair[0].startswith(prefix):
+            break
+        out.append(pair)
+    return out
+
+
+def _prefix_keys(mapping, prefix, limit):
+    return [k for k in mapping if k.startswith(prefix)][:limit]
+
+
+def _discard_sorted(sorted_pairs, pair):
+    i = bisect_left(sorted_pairs, pair)
+    if i < len(sorted_pairs) and sorted_pairs[i] == pair:
+        del sorted_pairs[i]
+
+
+def _load_rows(pids=None):
+    qs = Product.objects.all()
+    if pids is not None:
+        qs = qs.filter(pk__in=pids)
+    return [product_row(*r) for r in qs.values_list("id", "name", "hsn", "price", "gstPct", "stock").iterator(chunk_size=5000)]
+
+
+class SearchIndexHolder:
+    """
+    The process-wide index. It checks the catalog version at most once every
+    PRODUCT_SEARCH_REFRESH_SECONDS and patches in only the products changed since,
+    so a typical search runs with no database access at all.
+    """
+
+    def __init__(self, refresh_seconds):
+        self.refresh_seconds = refresh_seconds
+        self.index = None
+        self.seen = None   # catalog Version the index was last synced to
+        self.checked = 0.0
+        self.lock = threading.Lock()
+
+    def search(self, q, limit=20):
+        # one lock around refresh and lookup: patches mutate the index in place, and a
+        # lookup is far too short for the lock to matter under the GIL
+        with self.lock:
+            if self.index is None or time.monotonic() - self.checked >= self.refresh_seconds:
+                self._refresh()
+            return self.index.version, self.index.search(q, limit)
+
+    def _refresh(self):
+        version = current_version()
+        if self.index is None or version.settled < self.index.version:
+            self.index = ProductIndex(_load_rows(), version.settled)
+        elif version != self.seen:
+            self._catch_up(version)
+        self.seen = version
+        self.checked = time.monotonic()
+
+    def _catch_up(self, version):
+        # everything above the last settled id, again: a change may have committed late
+        touched = set(
+            CatalogChange.objects.filter(id__gt=self.index.version)
+            .values_list("product_id", flat=True).distinct()
+        )
+        if len(touched) > REBUILD_OVER:
+            self.index = ProductIndex(_load_rows(), version.settled)
+            return
+        rows = _load_rows(touched)
+        deleted = touched - {r["id"] for r in rows}
+        self.index.apply(rows, deleted, version.settled)
+
+    def reset(self):
+        with self.lock:
+            self.index = self.seen = None
+            self.checked = 0.0
+
+
+product_index = SearchIndexHolder(getattr(settings, "PRODUCT_SEARCH_REFRESH_SECONDS", 2))
+
+
+def search_db(q, limit=20):
+    """Indexed database fallback (PRODUCT_SEARCH_INDEX = False): id / HSN exact, name prefix."""
+    q = q.strip()
+    if not q:
+        return []
+    exact = list(Product.objects.filter(pk=q)) + list(Product.objects.filter(hsn=q)[:limit])
+    prefix = Product.objects.annotate(name_lower=Lower("name")).filter(name_lower__startswith=q.lower()).order_by("name_lower")[:limit]
+    seen, out = set(), []
+    for p in exact + list(prefix):
+        if p.pk not in seen:
+            seen.add(p.pk)
+            out.append(product_row(p.pk, p.name, p.hsn, p.price, p.gstPct, p.stock))
+    return out[:limit]
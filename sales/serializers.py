@@ -1,6 +1,6 @@
 # sales/serializers.py
 from rest_framework import serializers
-from .models import User, Product, Sale
+from .models import Job, User, Product, Sale
 from django.contrib.auth.hashers import make_password
 from decimal import Decimal
 
@@ -61,6 +61,11 @@ class ProductSerializer(serializers.ModelSerializer):
         fields = ("id", "name", "hsn", "price", "gstPct", "stock")
 
 
+class ProductImportSerializer(ProductSerializer):
+    """ProductSerializer rules for bulk upserts: an existing id is an update, not a clash."""
+    id = serializers.CharField(max_length=100)
+
+
 class SaleSerializer(serializers.ModelSerializer):
     product = ProductSerializer(read_only=True)
     product_id = serializers.CharField(write_only=True)
@@ -70,8 +75,8 @@ class SaleSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Sale
-        fields = ("id", "date", "counter", "staff", "staffId", "product", "product_id", "qty", "discount", "totals", "mode")
-        read_only_fields = ("date", "counter", "staff", "staffId", "product", "totals")
+        fields = ("id", "invoice_no", "date", "counter", "staff", "staffId", "product", "product_id", "qty", "discount", "totals", "mode")
+        read_only_fields = ("invoice_no", "date", "counter", "staff", "staffId", "product", "totals")
 
     def get_staff(self, obj):
         return obj.staff.get_full_name() or obj.staff.username
@@ -81,3 +86,44 @@ class SaleSerializer(serializers.ModelSerializer):
 
     def get_totals(self, obj):
         return {"taxable": float(obj.taxable), "gst": float(obj.gst), "total": float(obj.total)}
+
+
+class CheckoutLineSerializer(serializers.Serializer):
+    product_id = serializers.CharField()
+    qty = serializers.IntegerField(min_value=1)
+    discount = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal("0.00"), default=Decimal("0.00"))
+
+
+class CheckoutSerializer(serializers.Serializer):
+    lines = CheckoutLineSerializer(many=True, allow_empty=False)
+    mode = serializers.ChoiceField(choices=Sale.MODE_CHOICES, default="Cash")
+
+
+class SyncSaleSerializer(serializers.Serializer):
+    """One sale billed offline, as queued on the counter."""
+    client_id = serializers.UUIDField()
+    client_ts = serializers.DateTimeField()
+    product_id = serializers.CharField()
+    qty = serializers.IntegerField(min_value=1)
+    discount = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal("0.00"), default=Decimal("0.00"))
+    mode = serializers.ChoiceField(choices=Sale.MODE_CHOICES, default="Cash")
+    invoice_no = serializers.CharField(max_length=32, required=False)   # from /api/sales/invoice_block/
+
+
+class JobSerializer(serializers.ModelSerializer):
+    download = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Job
+        fields = (
+            "id", "kind", "params", "status", "progress", "total", "attempts", "error", "filename", "size",
+            "created_at", "started_at", "finished_at", "expires_at", "download",
+        )
+        read_only_fields = fields
+
+    def get_download(self, obj):
+        if obj.status != Job.DONE:
+            return None
+        path = f"/api/jobs/{obj.pk}/download/"
+        request = self.context.get("request")
+        return request.build_absolute_uri(path) if request is not None else path
@@ -0,0 +1,24 @@
+# sales/signals.py
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .authentication import user_states
+from .catalog import record_changes
+from .models import Product, User
+
+
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance, **kwargs):
+    record_changes([instance.pk])
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, **kwargs):
+    record_changes([instance.pk], deleted=True)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, **kwargs):
+    # drop the cached account state so a deactivation or role change applies at once
+    user_states.invalidate(instance.pk)
@@ -0,0 +1,103 @@
+# sales/summary.py
+import calendar
+from datetime import timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from .filters import parse_date
+from .models import DailySalesSummary
+
+CENT = Decimal("0.01")
+
+SUMMARY_PERIODS = ("day", "week", "month")
+# ?group= value -> DailySalesSummary column
+SUMMARY_GROUPS = {"counter": "counter", "staff": "staff_id", "product": "product_id", "mode": "mode"}
+SUMMARY_SUMS = {f: Sum(f) for f in ("sales", "qty", "taxable", "gst", "total")}
+
+
+def business_date(dt):
+    """The UTC calendar day a sale belongs to (same boundaries as the CSV reports)."""
+    return dt.astimezone(dt_timezone.utc).date()
+
+
+def record_sales(sales, sign=1):
+    """
+    Fold `sales` into DailySalesSummary (sign=-1 takes them back out).
+    Call inside the transaction that writes the sales: rows are grouped per
+    summary key first, then each key is one UPDATE ... SET qty = qty + n.
+    """
+    folded = {}
+    for s in sales:
+        key = (business_date(s.date), s.counter, s.staff_id, s.product_id, s.mode)
+        acc = folded.setdefault(key, [0, 0, Decimal("0.00"), Decimal("0.00"), Decimal("0.00")])
+        acc[0] += 1
+        acc[1] += s.qty
+        # amounts as the database stores them, so rebuilds from Sale rows match to the paisa
+        acc[2] += Decimal(s.taxable).quantize(CENT)
+        acc[3] += Decimal(s.gst).quantize(CENT)
+        acc[4] += Decimal(s.total).quantize(CENT)
+
+    for key, (n, qty, taxable, gst, total) in folded.items():
+        _bump(key, sign * n, sign * qty, sign * taxable, sign * gst, sign * total)
+
+
+def _bump(key, n, qty, taxable, gst, total):
+    day, counter, staff_id, product_id, mode = key
+    row = DailySalesSummary.objects.filter(
+        business_date=day, counter=counter, staff_id=staff_id, product_id=product_id, mode=mode
+    )
+    increments = {
+        "sales": F("sales") + n,
+        "qty": F("qty") + qty,
+        "taxable": F("taxable") + taxable,
+        "gst": F("gst") + gst,
+        "total": F("total") + total,
+    }
+    if row.update(**increments):
+        return
+    try:
+        # savepoint: another counter may insert the same key first
+        with transaction.atomic():
+            DailySalesSummary.objects.create(
+                business_date=day, counter=counter, staff_id=staff_id, product_id=product_id, mode=mode,
+                sales=n, qty=qty, taxable=taxable, gst=gst, total=total,
+            )
+    except IntegrityError:
+        row.update(**increments)
+
+
+def period_bounds(period, day):
+    """Inclusive (start, end) dates of the day / Monday-based week / calendar month holding `day`."""
+    if period == "week":
+        start = day - timedelta(days=day.weekday())
+        return start, start + timedelta(days=6)
+    if period == "month":
+        return day.replace(day=1), day.replace(day=calendar.monthrange(day.year, day.month)[1])
+    return day, day
+
+
+def summary_params(params):
+    """Validate ?period=&group=&date= for the summary endpoints; returns (period, group, start, end)."""
+    period = params.get("period", "day")
+    if period not in SUMMARY_PERIODS:
+        raise ValidationError({"detail": "period must be day, week or month"})
+    group = params.get("group")
+    if group and group not in SUMMARY_GROUPS:
+        raise ValidationError({"detail": "group must be counter, staff, product or mode"})
+    day = parse_date(params["date"]) if params.get("date") else timezone.localdate()
+    return (period, group) + period_bounds(period, day)
+
+
+def summary_row(row):
+    """Aggregate sums -> API numbers (empty ranges come back as zeros)."""
+    return {
+        "sales": row["sales"] or 0,
+        "qty": row["qty"] or 0,
+        "taxable": float(row["taxable"] or 0),
+        "gst": float(row["gst"] or 0),
+        "total": float(row["total"] or 0),
+    }
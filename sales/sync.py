@@ -0,0 +1,204 @@
+# sales/sync.py
+from collections import defaultdict
+from datetime import timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import report_cache
+from .archive import archived_months
+from .billing import price_line, product_version_id
+from .catalog import record_changes
+from .inventory import available_stock, sharded, take_stock
+from .invoices import allocate_invoice_numbers, financial_year, issued_numbers, lock_sequence
+from .live import announce
+from .models import Product, Sale
+from .serializers import SyncSaleSerializer
+from .summary import business_date, record_sales
+
+SYNC_MAX_BATCH = 1000    # sales per upload
+INSERT_CHUNK = 500       # rows per INSERT
+
+ACCEPTED, DUPLICATE, REJECTED = "accepted", "duplicate", "rejected"
+
+
+def sync_sales(user, items):
+    """
+    Apply a batch of sales billed offline. Returns one result per item, in request order:
+    {"client_id", "status": accepted|duplicate|rejected, "id" | "detail" | "errors"}.
+    """
+    results = [None] * len(items)
+    pending = []
+    seen = set()
+    for i, raw in enumerate(items):
+        item = SyncSaleSerializer(data=raw)
+        if not item.is_valid():
+            client_id = raw.get("client_id") if isinstance(raw, dict) else None
+            results[i] = {"client_id": client_id, "status": REJECTED, "errors": item.errors}
+            continue
+        data = item.validated_data
+        if data["client_id"] in seen:
+            results[i] = {"client_id": str(data["client_id"]), "status": DUPLICATE}
+            continue
+        seen.add(data["client_id"])
+        pending.append((i, data))
+
+    for attempt in range(2):
+        try:
+            with transaction.atomic():
+                applied = _apply(user, pending)
+            break
+        except IntegrityError:
+            # a concurrent upload of the same queue inserted some of these first;
+            # one more pass picks them up as duplicates
+            if attempt:
+                raise
+    for i, result in applied.items():
+        results[i] = result
+    return results
+
+
+def _apply(user, pending):
+    out = {}
+    client_ids = [d["client_id"] for _, d in pending]
+    existing = dict(Sale.objects.filter(client_id__in=client_ids).values_list("client_id", "id"))
+
+    fresh = []
+    for i, d in pending:
+        if d["client_id"] in existing:
+            out[i] = {"client_id": str(d["client_id"]), "status": DUPLICATE, "id": existing[d["client_id"]]}
+        else:
+            fresh.append((i, d))
+
+    counter = getattr(user, "counter", 0) or 0
+    now = timezone.now()
+    archived = {month.first for month in archived_months()}
+    dates = {i: sale_date(d["client_ts"], now, archived) for i, d in fresh}
+    # the invoice sequences before any product row, the order every billing path locks in
+    for year in sorted({financial_year(when) for when in dates.values()}):
+        lock_sequence(counter, year)
+    fresh = _check_invoice_nos(counter, fresh, out)
+
+    products = Product.objects.in_bulk({d["product_id"] for _, d in fresh})
+    by_product = defaultdict(list)
+    for i, d in fresh:
+        if d["product_id"] in products:
+            by_product[d["product_id"]].append((i, d))
+        else:
+            out[i] = {"client_id": str(d["client_id"]), "status": REJECTED, "detail": "product not found"}
+
+    sales = []
+    # fixed pk order, like checkout, so overlapping uploads can't deadlock
+    for pid in sorted(by_product):
+        product = products[pid]
+        lines = sorted(by_product[pid], key=lambda line: line[1]["client_ts"])
+        taken = _take_stock(product, lines, counter)
+        for i, d in lines:
+            if i not in taken:
+                out[i] = {"client_id": str(d["client_id"]), "status": REJECTED, "detail": "insufficient stock"}
+                continue
+            taxable, gst, total = price_line(product, d["qty"], d["discount"])
+            sales.append((i, Sale(
+                date=dates[i],
+                invoice_no=d.get("invoice_no"),
+                counter=counter,
+                staff=user,
+                product=product,
+                qty=d["qty"],
+                discount=d["discount"],
+                taxable=taxable,
+                gst=gst,
+                total=total,
+                mode=d["mode"],
+                product_version_id=product_version_id(product),
+                client_id=d["client_id"],
+                client_ts=d["client_ts"],
+            )))
+
+    rows = [sale for _, sale in sales]
+    # lines billed without a pre-issued number are numbered now, in client time order,
+    # from the sequence of the financial year they were billed in
+    by_year = defaultdict(list)
+    for sale in sorted((s for s in rows if not s.invoice_no), key=lambda s: s.client_ts):
+        by_year[financial_year(sale.date)].append(sale)
+    for year in sorted(by_year):
+        unnumbered = by_year[year]
+        for sale, invoice_no in zip(unnumbered, allocate_invoice_numbers(counter, unnumbered[0].date, len(unnumbered))):
+            sale.invoice_no = invoice_no
+    Sale.objects.bulk_create(rows, batch_size=INSERT_CHUNK)
+    record_sales(rows)
+    announce(rows)
+    # closed days may have gained sales: their cached reports go once this commits
+    past = {business_date(sale.date) for sale in rows} - {business_date(now)}
+    if past:
+        transaction.on_commit(lambda: report_cache.forget_days(past))
+    if not sharded():
+        record_changes(sorted({sale.product_id for sale in rows}))
+    for i, sale in sales:
+        out[i] = {"client_id": str(sale.client_id), "status": ACCEPTED, "id": sale.pk, "invoice_no": sale.invoice_no}
+    return out
+
+
+def sale_date(client_ts, now, archived=()):
+    """
+    When an offline sale happened: the counter's clock, trusted within SYNC_MAX_AGE_DAYS
+    of the upload. A timestamp ahead of the server is clamped to the upload time, and one
+    older than the window (a reset clock) is replaced by it. So is one in a month already
+    in `archived` (firsts of months): archive_sales treats that month's rows up to its
+    manifest's last key as written to the file and deletes them, so the sale would be lost.
+    """
+    if client_ts > now or client_ts < now - timedelta(days=settings.SYNC_MAX_AGE_DAYS):
+        return now
+    if client_ts.astimezone(dt_timezone.utc).date().replace(day=1) in archived:
+        return now
+    return client_ts
+
+
+def _check_invoice_nos(counter, lines, out):
+    """Reject lines whose invoice_no wasn't issued to this counter or is already taken."""
+    carried = [d["invoice_no"] for _, d in lines if d.get("invoice_no")]
+    if not carried:
+        return lines
+    issued = issued_numbers(counter, carried)
+    used = set(Sale.objects.filter(invoice_no__in=carried).values_list("invoice_no", flat=True))
+    kept = []
+    for i, d in lines:
+        invoice_no = d.get("invoice_no")
+        if invoice_no and invoice_no not in issued:
+            out[i] = {"client_id": str(d["client_id"]), "status": REJECTED, "detail": "invoice number not issued to this counter"}
+        elif invoice_no and invoice_no in used:
+            out[i] = {"client_id": str(d["client_id"]), "status": REJECTED, "detail": "invoice number already used"}
+        else:
+            if invoice_no:
+                used.add(invoice_no)
+            kept.append((i, d))
+    return kept
+
+
+def _take_stock(product, lines, counter):
+    """
+    Accept lines in client time order while stock lasts, then take the accepted total off
+    the product in one conditional UPDATE (sharded: off the counter's shards, see
+    inventory.take_stock). If another counter got there first, re-read the stock and plan
+    again. Returns the set of accepted line indexes.
+    """
+    stock = available_stock(product)
+    for _ in range(3):
+        taken, total = set(), 0
+        for i, d in lines:
+            if total + d["qty"] <= stock:
+                taken.add(i)
+                total += d["qty"]
+        if not total:
+            return taken
+        if sharded():
+            if take_stock(product.pk, total, counter):
+                return taken
+            stock = available_stock(product)
+            continue
+        if Product.objects.filter(pk=product.pk, stock__gte=total).update(stock=F("stock") - total):
+            return taken
+        stock = Product.objects.filter(pk=product.pk).values_list("stock", flat=True).first() or 0
+    return set()
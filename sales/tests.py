@@ -1,3 +1,1306 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from unittest import mock, skipUnless
+
+from django.db import OperationalError, connection, transaction
+from django.http import StreamingHttpResponse
+from django.db.models import Sum
+from django.test import AsyncRequestFactory, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from . import async_views, catalog, jobs, replicas, report_cache
+from .archive import ARCHIVE_FIELDS, MonthArchive
+from .authentication import user_states
+from .billing import forget_product_versions, reserve_stock
+from .inventory import POOL, consolidate, rebalance, take_stock
+from .invoices import allocate_invoice_numbers, financial_year, lock_sequence
+from .live import hub
+from .middleware import brotli
+from .models import CatalogChange, DailySalesSummary, IdempotencyKey, InvoiceSequence, Job, Product, ProductVersion, Sale, StockShard, User
+from .renderers import msgpack
+from .search import product_index
+from .serializers import ProductSerializer, SaleSerializer
+
+
+class BillingTestMixin:
+    databases = "__all__"   # includes the read replica when REPLICA_DATABASE_URL is set (a mirror of default)
+
+    def make_fixtures(self):
+        forget_product_versions()   # ids cached by an earlier test may have been rolled back
+        report_dir = tempfile.mkdtemp()   # cached closed-day reports, one cache per test
+        self.addCleanup(shutil.rmtree, report_dir, ignore_errors=True)
+        override = override_settings(REPORT_CACHE_DIR=report_dir)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.staff = User.objects.create_user(username="c1", password="c1", first_name="Counter 1", role="staff", counter=1)
+        self.admin = User.objects.create_user(username="admin", password="admin123", role="admin")
+        self.cola = Product.objects.create(id="p-cola", name="Cola 250ml", hsn="2202", price=Decimal("40.00"), gstPct=Decimal("12.00"), stock=10)
+        self.chips = Product.objects.create(id="p-chips", name="Chips 50g", hsn="2005", price=Decimal("20.00"), gstPct=Decimal("18.00"), stock=5)
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+
+class CheckoutTests(BillingTestMixin, TestCase):
+    def setUp(self):
+        self.make_fixtures()
+        self.client = self.client_for(self.staff)
+
+    def test_bills_whole_basket(self):
+        res = self.client.post("/api/sales/checkout/", {
+            "mode": "UPI",
+            "lines": [
+                {"product_id": "p-cola", "qty": 2},
+                {"product_id": "p-chips", "qty": 1, "discount": "5.00"},
+                {"product_id": "p-cola", "qty": 1},
+            ],
+        }, format="json")
+        self.assertEqual(res.status_code, 201, res.data)
+        self.assertEqual(len(res.data["lines"]), 3)
+        self.assertEqual(res.data["totals"]["total"], 152.1)
+        self.assertEqual(Sale.objects.filter(mode="UPI", counter=1).count(), 3)
+        self.cola.refresh_from_db()
+        self.chips.refresh_from_db()
+        self.assertEqual((self.cola.stock, self.chips.stock), (7, 4))
+
+    def test_rejects_basket_when_any_line_is_short(self):
+        res = self.client.post("/api/sales/checkout/", {
+            "lines": [{"product_id": "p-cola", "qty": 1}, {"product_id": "p-chips", "qty": 3}, {"product_id": "p-chips", "qty": 3}],
+        }, format="json")
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(res.data["product_ids"], ["p-chips"])
+        self.assertFalse(Sale.objects.exists())
+        self.cola.refresh_from_db()
+        self.assertEqual(self.cola.stock, 10)
+
+    def test_unknown_product(self):
+        res = self.client.post("/api/sales/checkout/", {"lines": [{"product_id": "p-nope", "qty": 1}]}, format="json")
+        self.assertEqual(res.status_code, 404)
+
+
+class StockReservationTests(BillingTestMixin, TestCase):
+    def setUp(self):
+        self.make_fixtures()
+
+    def test_conditional_decrement(self):
+        self.assertTrue(reserve_stock("p-chips", 5))
+        self.assertFalse(reserve_stock("p-chips", 1))
+        self.chips.refresh_from_db()
+        self.assertEqual(self.chips.stock, 0)
+
+    def test_create_rolls_back_when_stock_runs_out(self):
+        client = self.client_for(self.staff)
+        res = client.post("/api/sales/", {"product_id": "p-chips", "qty": 5}, format="json")
+        self.assertEqual(res.status_code, 201)
+        self.assertEqual(res.data["product"]["stock"], 0)
+        res = client.post("/api/sales/", {"product_id": "p-chips", "qty": 1}, format="json")
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(Sale.objects.count(), 1)
+
+
+class HotProductConcurrencyTests(BillingTestMixin, TransactionTestCase):
+    threads = 8
+    attempts = 10
+
+    def setUp(self):
+        self.make_fixtures()
+
+    def test_stock_never_goes_negative(self):
+        results = []
+        barrier = threading.Barrier(self.threads)
+
+        def counter():
+            client = self.client_for(self.staff)
+            barrier.wait()
+            try:
+                for _ in range(self.attempts):
+                    res = client.post("/api/sales/", {"product_id": "p-cola", "qty": 1}, format="json")
+                    results.append(res.status_code)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=counter) for _ in range(self.threads)]
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+
+        self.cola.refresh_from_db()
+        sold = Sale.objects.filter(product=self.cola).count()
+        self.assertGreaterEqual(self.cola.stock, 0)
+        self.assertEqual(sold, results.count(201))
+        self.assertEqual(self.cola.stock + sold, 10)
+        self.assertEqual(sold, 10)
+
+
+@override_settings(INVENTORY_MODE="sharded")
+class ShardedInventoryTests(BillingTestMixin, TestCase):
+    def setUp(self):
+        self.make_fixtures()
+        User.objects.create_user(username="c2", password="c2", role="staff", counter=2)
+
+    def shards(self, product_id):
+        return dict(StockShard.objects.filter(product_id=product_id).values_list("counter", "quantity"))
+
+    def test_first_sale_opens_pool_and_rebalance_splits_it(self):
+        self.assertTrue(take_stock("p-cola", 2, 1))
+        self.assertEqual(self.shards("p-cola"), {POOL: 8})
+        rebalance()
+        self.assertEqual(self.shards("p-cola"), {POOL: 2, 1: 3, 2: 3})
+        self.assertEqual(self.shards("p-chips"), {POOL: 1, 1: 2, 2: 2})
+        self.assertEqual(Product.objects.get(pk="p-cola").stock, 8)
+
+    def test_sale_takes_own_shard_then_borrows(self):
+        rebalance()
+        self.assertEqual(self.shards("p-cola"), {POOL: 2, 1: 4, 2: 4})
+        self.assertTrue(take_stock("p-cola", 4, 1))
+        self.assertEqual(self.shards("p-cola"), {POOL: 2, 1: 0, 2: 4})
+        self.assertTrue(take_stock("p-cola", 2, 1))    # the pool first
+        self.assertTrue(take_stock("p-cola", 4, 1))    # then counter 2
+        self.assertEqual(self.shards("p-cola"), {POOL: 0, 1: 0, 2: 0})
+        self.assertFalse(take_stock("p-cola", 1, 1))
+
+    def test_gathers_across_shards_when_no_row_has_enough(self):
+        rebalance()
+        self.assertFalse(take_stock("p-cola", 11, 2))
+        self.assertTrue(take_stock("p-cola", 7, 2))
+        self.assertEqual(sum(self.shards("p-cola").values()), 3)
+        self.assertEqual(self.shards("p-cola")[2], 0)
+
+    def test_consolidate_reports_shard_total(self):
+        client = self.client_for(self.staff)
+        res = client.post("/api/sales/checkout/", {"lines": [{"product_id": "p-cola", "qty": 4}, {"product_id": "p-chips", "qty": 1}]}, format="json")
+        self.assertEqual(res.status_code, 201, res.data)
+        version = catalog.current_version()
+        self.assertEqual(Product.objects.get(pk="p-cola").stock, 10)   # derived, not yet consolidated
+        self.assertEqual(consolidate(), ["p-chips", "p-cola"])
+        self.assertEqual(ProductSerializer(Product.objects.get(pk="p-cola")).data["stock"], 6)
+        self.assertGreater(catalog.current_version(), version)
+        res = client.post("/api/sales/checkout/", {"lines": [{"product_id": "p-chips", "qty": 5}]}, format="json")
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(self.shards("p-chips"), {POOL: 4})
+
+    def test_import_resets_shards_only_for_rows_with_stock(self):
+        rebalance()
+        body = (
+            '{"id": "p-cola", "name": "Cola 300ml", "price": "45.00", "gstPct": "12.00"}\n'
+            '{"id": "p-chips", "name": "Chips 50g", "price": "20.00", "gstPct": "18.00", "stock": 9}\n'
+        )
+        self.client_for(self.admin).generic("POST", "/api/products/import/", body, content_type="application/x-ndjson")
+        self.assertEqual(self.shards("p-cola"), {POOL: 2, 1: 4, 2: 4})
+        self.assertEqual(self.shards("p-chips"), {POOL: 9, 1: 0, 2: 0})
+
+    def test_admin_stock_edit_resets_shards_to_pool(self):
+        rebalance()
+        take_stock("p-cola", 1, 1)
+        res = self.client_for(self.admin).patch("/api/products/p-cola/", {"stock": 50}, format="json")
+        self.assertEqual(res.status_code, 200, res.data)
+        self.assertEqual(self.shards("p-cola"), {POOL: 50, 1: 0, 2: 0})
+        self.assertEqual(consolidate(), [])
+
+
+class InvoiceNumberTests(BillingTestMixin, TestCase):
+    def setUp(self):
+        self.make_fixtures()
+        self.client = self.client_for(self.staff)
+        self.staff2 = User.objects.create_user(username="c2", password="c2", role="staff", counter=2)
+
+    def test_gap_free_per_counter(self):
+        fy = financial_year(timezone.now())
+        first = self.client.post("/api/sales/", {"product_id": "p-cola", "qty": 1}, format="json").data
+        self.assertEqual(first["invoice_no"], f"C1/{fy}/000001")
+        # a rejected basket hands its numbers back
+        res = self.client.post("/api/sales/checkout/", {"lines": [{"product_id": "p-chips", "qty": 9}]}, format="json")
+        self.assertEqual(res.status_code, 400)
+        res = self.client.post("/api/sales/checkout/", {"lines": [{"product_id": "p-cola", "qty": 1}, {"product_id": "p-chips", "qty": 1}]}, format="json")
+        self.assertEqual([line["invoice_no"] for line in res.data["lines"]], [f"C1/{fy}/000002", f"C1/{fy}/000003"])
+        other = self.client_for(self.staff2).post("/api/sales/", {"product_id": "p-cola", "qty": 1}, format="json").data
+        self.assertEqual(other["invoice_no"], f"C2/{fy}/000001")
+        self.assertEqual(self.client_for(self.admin).get("/api/sales/").data["results"][0]["invoice_no"], other["invoice_no"])
+
+    def test_financial_year(self):
+        self.assertEqual(financial_year(datetime(2027, 3, 31, 23, 59, tzinfo=dt_timezone.utc)), "2026-27")
+        self.assertEqual(financial_year(datetime(2027, 4, 1, tzinfo=dt_timezone.utc)), "2027-28")
+        self.assertEqual(financial_year(datetime(2099, 12, 1, tzinfo=dt_timezone.utc)), "2099-00")
+
+    def test_lock_sequence_reads_the_row_it_started(self):
+        with transaction.atomic(), CaptureQueriesContext(connection) as queries:
+            lock_sequence(7, "2026-27")
+        selects = [q["sql"] for q in queries if q["sql"].startswith("SELECT") and "invoicesequence" in q["sql"]]
+        # once before the INSERT finds nothing, once after it to lock the new row
+        self.assertEqual(len(selects), 2)
+        self.assertTrue(InvoiceSequence.objects.filter(counter=7, financial_year="2026-27").exists())
+
+    def test_offline_block(self):
+        block = self.client.post("/api/sales/invoice_block/", {"size": 3}, format="json").data
+        prefix = block["first"].rsplit("/", 1)[0]
+        self.assertEqual((block["first"], block["last"]), (f"{prefix}/000001", f"{prefix}/000003"))
+        online = self.client.post("/api/sales/", {"product_id": "p-cola", "qty": 1}, format="json").data
+        self.assertEqual(online["invoice_no"], f"{prefix}/000004")
+
+        def item(minute, invoice_no=None):
+            line = {"client_id": str(uuid.uuid4()), "client_ts": f"2026-10-01T10:{minute:02d}:00Z", "product_id": "p-cola", "qty": 1}
+            return dict(line, invoice_no=invoice_no) if invoice_no else line
+
+        items = [item(1, block["first"]), item(2, block["first"]), item(3, online["invoice_no"]), item(4)]
+        results = self.client.post("/api/sales/sync/", {"sales": items}, format="json").data["results"]
+        self.assertEqual([r["status"] for r in results], ["accepted", "rejected", "rejected", "accepted"])
+        self.assertEqual(results[0]["invoice_no"], block["first"])
+        self.assertEqual(results[3]["invoice_no"], f"{prefix}/000005")
+
+
+class InvoiceConcurrencyTests(BillingTestMixin, TransactionTestCase):
+    def setUp(self):
+        self.make_fixtures()
+        self.cola.stock = 1000
+        self.cola.save()
+        self.staff2 = User.objects.create_user(username="c2", password="c2", role="staff", counter=2)
+
+    def test_no_duplicates_or_gaps_under_load(self):
+        barrier = threading.Barrier(6)
+
+        def bill(user):
+            client = self.client_for(user)
+            barrier.wait()
+            try:
+                for _ in range(8):
+                    client.post("/api/sales/", {"product_id": "p-cola", "qty": 1}, format="json")
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=bill, args=(user,)) for user in [self.staff, self.staff2] * 3]
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+
+        for counter in (1, 2):
+            numbers = sorted(int(no.rsplit("/", 1)[1]) for no in Sale.objects.filter(counter=counter).values_list("invoice_no", flat=True))
+            self.assertEqual(numbers, list(range(1, 25)))
+
+    @skipUnless(connection.vendor == "postgresql", "SQLite takes one lock for the whole database on every write")
+    def test_counters_do_not_wait_on_each_other(self):
+        now = timezone.now()
+        held, release = threading.Event(), threading.Event()
+
+        def hold_counter_1():
+            try:
+                with transaction.atomic():
+                    allocate_invoice_numbers(1, now)
+                    held.set()
+                    release.wait(10)
+            finally:
+                connection.close()
+
+        worker = threading.Thread(target=hold_counter_1)
+        worker.start()
+        held.wait(10)
+        try:
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute("SET LOCAL lock_timeout = '200ms'")
+                self.assertEqual(len(allocate_invoice_numbers(2, now, 5)), 5)   # would time out if it queued
+        finally:
+            release.set()
+            worker.join()
+
+
+class DailyReportTests(BillingTestMixin, TestCase):
+    def setUp(self):
+        self.make_fixtures()
+        staff = self.client_for(self.staff)
+        staff.post("/api/sales/", {"product_id": "p-cola", "qty": 2}, format="json")
+        staff.post("/api/sales/", {"product_id": "p-chips", "qty": 1, "mode": "UPI"}, format="json")
+        # later price changes must not rewrite what was billed
+        Product.objects.filter(pk="p-cola").update(price=Decimal("99.00"))
+        self.client = self.client_for(self.admin)
+
+    def read(self, res):
+        return b"".join(res.streaming_content).decode().splitlines()
+
+    def test_streams_csv_with_billed_price(self):
+        res = self.client.get("/api/sales/daily_report/")
+        self.assertEqual(res.status_code, 200)
+        lines = self.read(res)
+        self.assertEqual(lines[0], "date,counter,staff,product,qty,price,discount,taxable,gst,total")
+        self.assertEqual(lines[1].split(",")[2:], ["Counter 1", "Cola 250ml", "2", "40.00", "0.00", "80.00", "9.60", "89.60"])
+        self.assertEqual(len(lines), 3)
+
+    def test_sales_share_product_versions(self):
+        staff = self.client_for(self.staff)
+        staff.post("/api/sales/", {"product_id": "p-cola", "qty": 1}, format="json")   # billed at 99.00
+        Product.objects.filter(pk="p-cola").update(price=Decimal("40.00"))
+        staff.post("/api/sales/", {"product_id": "p-cola", "qty": 1}, format="json")   # back on the 40.00 version
+        versions = ProductVersion.objects.filter(product_id="p-cola")
+        self.assertEqual(sorted(versions.values_list("price", flat=True)), [Decimal("40.00"), Decimal("99.00")])
+        self.assertEqual(Sale.objects.filter(product_version=versions.get(price=Decimal("40.00"))).count(), 2)
+
+        with self.assertNumQueries(2):   # sales joined to their versions, one staff lookup
+            lines = self.read(self.client.get("/api/sales/daily_report/"))
+        self.assertEqual([line.split(",")[5] for line in lines[1:]], ["40.00", "20.00", "99.00", "40.00"])
+
+    def test_cached_version_survives_product_delete(self):
+        staff = self.client_for(self.staff)
+        with self.captureOnCommitCallbacks(execute=True):   # the id is cached once the bill commits
+            first = staff.post("/api/sales/", {"product_id": "p-cola", "qty": 1}, format="json").data["id"]
+        vid = Sale.objects.get(pk=first).product_version_id
+
+        # deleted (its sales and summaries gone first) and made again with the same id and values,
+        # as another worker might: the cached id must still name a row
+        Sale.objects.filter(product_id="p-cola").delete()
+        DailySalesSummary.objects.filter(product_id="p-cola").delete()
+        product = Product.objects.get(pk="p-cola")
+        product.delete()
+        product.pk = "p-cola"
+        product.save(force_insert=True)
+        self.assertTrue(ProductVersion.objects.filter(pk=vid).exists())
+        with CaptureQueriesContext(connection) as queries:
+            res = staff.post("/api/sales/", {"product_id": "p-cola", "qty": 1}, format="json")
+        self.assertEqual(res.status_code, 201, res.data)
+        self.assertEqual(Sale.objects.get(pk=res.data["id"]).product_version_id, vid)
+        self.assertFalse([q for q in queries if "FROM \"sales_productversion\"" in q["sql"]])   # a cache hit
+
+    def test_filters_and_gzip(self):
+        import gzip
+
+        res = self.client.get("/api/sales/daily_report/", {"mode": "UPI", "staff": "u-c1", "gzip": "1"})
+        self.assertEqual(res["Content-Type"], "application/gzip")
+        lines = gzip.decompress(b"".join(res.streaming_content)).decode().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertIn("Chips 50g", lines[1])
+
+    def test_columnar_and_msgpack_formats(self):
+        res = self.client.get("/api/sales/daily_report/", {"format": "columnar"})
+        self.assertEqual(res["Content-Type"], "application/vnd.webillz.columnar+json")
+        body = json.loads(b"".join(res.streaming_content))
+        self.assertEqual(body["columns"][:5], ["date", "counter", "staff", "product", "qty"])
+        self.assertEqual([body["products"][r[3]] for r in body["rows"]],
+                         [{"name": "Cola 250ml", "price": "40.00"}, {"name": "Chips 50g", "price": "20.00"}])
+        if msgpack is None:
+            return
+        res = self.client.get("/api/sales/daily_report/", HTTP_ACCEPT="application/msgpack")
+        unpacker = msgpack.Unpacker(raw=False)
+        unpacker.feed(b"".join(res.streaming_content))
+        header, *rows, footer = list(unpacker)
+        self.assertEqual(header["columns"], body["columns"])
+        self.assertEqual(rows, body["rows"])
+        self.assertEqual(footer["products"], body["products"])
+
+    def test_closed_day_served_from_disk_cache(self):
+        day = (timezone.now() - timedelta(days=2)).date()
+        Sale.objects.update(date=datetime.combine(day, datetime.min.time(), tzinfo=dt_timezone.utc) + timedelta(hours=10))
+        res = self.client.get("/api/sales/daily_report/", {"date": day.isoformat()})
+        body = b"".join(res.streaming_content)
+        etag = res["ETag"]
+        self.assertTrue(etag.startswith('"'))
+        self.assertEqual((res["Accept-Ranges"], res["Content-Length"]), ("bytes", str(len(body))))
+        self.assertEqual(len(body.decode().splitlines()), 3)
+
+        with self.assertNumQueries(0):
+            res = self.client.get("/api/sales/daily_report/", {"date": day.isoformat()})
+            self.assertEqual(b"".join(res.streaming_content), body)
+        res = self.client.get("/api/sales/daily_report/", {"date": day.isoformat()}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, 304)
+        res = self.client.get("/api/sales/daily_report/", {"date": day.isoformat()}, HTTP_RANGE="bytes=5-9")
+        self.assertEqual((res.status_code, res["Content-Range"]), (206, f"bytes 5-9/{len(body)}"))
+        self.assertEqual(b"".join(res.streaming_content), body[5:10])
+        res = self.client.get("/api/sales/daily_report/", {"date": day.isoformat()}, HTTP_RANGE=f"bytes={len(body)}-")
+        self.assertEqual(res.status_code, 416)
+
+        # an admin correction invalidates the day once it commits
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.delete(f"/api/sales/{Sale.objects.first().pk}/").status_code, 204)
+        res = self.client.get("/api/sales/daily_report/", {"date": day.isoformat()})
+        self.assertNotEqual(res["ETag"], etag)
+        self.assertEqual(len(b"".join(res.streaming_content).decode().splitlines()), 2)
+
+    def test_rejects_bad_dates(self):
+        self.assertEqual(self.client.get("/api/sales/daily_report/", {"date": "17-10-2026"}).status_code, 400)
+        self.assertEqual(self.client.get("/api/sales/daily_report/", {"from": "2026-10-02", "to": "2026-10-01"}).status_code, 400)
+
+
+class BackgroundJobTests(BillingTestMixin, TestCase):
+    def setUp(self):
+        self.make_fixtures()
+        results = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, results, ignore_errors=True)
+        override = override_settings(JOB_RESULTS_DIR=results, JOB_MAX_ATTEMPTS=2)
+        override.enable()
+        self.addCleanup(override.disable)
+        staff = self.client_for(self.staff)
+        staff.post("/api/sales/", {"product_id": "p-cola", "qty": 2}, format="json")
+        staff.post("/api/sales/", {"product_id": "p-chips", "qty": 1, "mode": "UPI"}, format="json")
+        self.client = self.client_for(self.admin)
+
+    def run_jobs(self):
+        call_command("run_jobs", "--once", stdout=io.StringIO())
+
+    def test_report_job_runs_and_downloads(self):
+        res = self.client.post("/api/jobs/", {"kind": "daily_report", "params": {"mode": "UPI"}}, format="json")
+        self.assertEqual(res.status_code, 202, res.data)
+        self.assertEqual((res.data["status"], res.data["download"]), ("queued", None))
+        self.assertEqual(self.client_for(self.staff).get(res["Location"]).status_code, 403)
+
+        self.run_jobs()
+        job = self.client.get(res["Location"]).data
+        self.assertEqual((job["status"], job["progress"], job["total"], job["attempts"]), ("done", 1, 1, 1))
+        download = self.client.get(f"/api/jobs/{job['id']}/download/")
+        self.assertEqual(download["Content-Disposition"], f'attachment; filename="sales-{timezone.localdate().isoformat()}.csv"')
+        lines = b"".join(download.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertIn("Chips 50g", lines[1])
+
+    def test_rejects_unknown_kind_and_bad_params(self):
+        self.assertEqual(self.client.post("/api/jobs/", {"kind": "nope"}, format="json").status_code, 400)
+        res = self.client.post("/api/jobs/", {"kind": "daily_report", "params": {"date": "17-10-2026"}}, format="json")
+        self.assertEqual(res.status_code, 400)
+        self.assertFalse(Job.objects.exists())
+
+    def test_failed_job_is_retried_then_fails(self):
+        def boom(params, progress):
+            raise OSError("disk full")
+
+        with mock.patch.dict(jobs.KINDS, {"boom": jobs.Kind(boom, lambda params: None, 1)}):
+            job = Job.objects.create(owner=self.admin, kind="boom")
+            with self.assertLogs("sales.jobs", "ERROR"):
+                self.run_jobs()
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.attempts, job.error), ("queued", 1, "OSError: disk full"))
+            self.assertGreater(job.run_after, timezone.now())
+            Job.objects.filter(pk=job.pk).update(run_after=timezone.now())
+            with self.assertLogs("sales.jobs", "ERROR"):
+                self.run_jobs()
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.attempts, job.slot), ("failed", 2, None))
+
+    def test_heartbeat_while_job_has_no_rows_yet(self):
+        def slow(params, progress):
+            time.sleep(0.3)   # a long count, say, before the first row
+            return [b"done"], "text/plain", "slow.txt"
+
+        with mock.patch.dict(jobs.KINDS, {"slow": jobs.Kind(slow, lambda params: None, 1)}), \
+                mock.patch.object(jobs, "HEARTBEAT_SECONDS", 0.05), mock.patch.object(jobs.Heartbeat, "beat") as beat:
+            Job.objects.create(owner=self.admin, kind="slow")
+            self.run_jobs()
+        self.assertGreaterEqual(beat.call_count, 3)
+        self.assertFalse([t for t in threading.enumerate() if t.name.endswith("-heartbeat")])
+        self.assertEqual(Job.objects.get(kind="slow").status, Job.DONE)
+
+    def test_concurrency_limit_and_cleanup(self):
+        Job.objects.create(owner=self.admin, kind="products_export", status=Job.RUNNING, slot=0, heartbeat_at=timezone.now())
+        waiting = Job.objects.create(owner=self.admin, kind="products_export")
+        self.assertIsNone(jobs.claim("w1"))   # one products_export at a time
+        report = Job.objects.create(owner=self.admin, kind="daily_report")
+        self.assertEqual(jobs.claim("w1").pk, report.pk)
+
+        Job.objects.filter(kind="products_export", status=Job.RUNNING).update(heartbeat_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(jobs.requeue_stale(), 1)
+        self.run_jobs()   # the stale one was taken back; both exports now run one after the other
+        waiting.refresh_from_db()
+        self.assertEqual(waiting.status, Job.DONE)
+        path = jobs.result_path(waiting.result)
+        self.assertTrue(os.path.exists(path))
+        Job.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(jobs.purge_expired(), 3)
+        self.assertFalse(os.path.exists(path))
+
+
+class SaleListTests(BillingTestMixin, TestCase):
+    def setUp(self):
+        self.make_fixtures()
+        staff = self.client_for(self.staff)
+        for mode in ("Cash", "UPI", "Cash"):
+            staff.post("/api/sales/", {"product_id": "p-cola", "qty": 1, "mode": mode}, format="json")
+        self.client = self.client_for(self.admin)
+
+    def test_cursor_pages_newest_first(self):
+        res = self.client.get("/api/sales/", {"page_size": 2})
+        self.assertEqual(res.status_code, 200)
+        ids = [s["id"] for s in res.data["results"]]
+        res = self.client.get(res.data["next"])
+        ids += [s["id"] for s in res.data["results"]]
+        self.assertIsNone(res.data["next"])
+        self.assertEqual(ids, sorted(Sale.objects.values_list("id", flat=True), reverse=True))
+
+    def test_cursor_pages_through_equal_dates(self):
+        # a checkout bills every line at the same instant
+        lines = [{"product_id": "p-chips", "qty": 1} for _ in range(4)]
+        self.client_for(self.staff).post("/api/sales/checkout/", {"mode": "Cash", "lines": lines}, format="json")
+        expected = list(Sale.objects.order_by("-date", "-id").values_list("id", flat=True))
+        ids, url = [], "/api/sales/?page_size=2"
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                res = self.client.get(url)
+            self.assertNotIn("OFFSET", queries[0]["sql"].upper())
+            ids += [s["id"] for s in res.data["results"]]
+            url = res.data["next"]
+        self.assertEqual(ids, expected)
+
+        back = self.client.get(res.data["previous"]).data
+        self.assertEqual([s["id"] for s in back["results"]], expected[-3:-1])   # 7 sales: the last page holds one
+        self.assertEqual([s["id"] for s in self.client.get(back["next"]).data["results"]], expected[-1:])
+
+    def test_lean_list_matches_sale_serializer(self):
+        self.client_for(self.staff).post("/api/sales/", {"product_id": "p-chips", "qty": 2, "discount": "1.50"}, format="json")
+        Product.objects.filter(pk="p-cola").update(stock=3, price=Decimal("41.00"))
+        with self.assertNumQueries(3):   # page, products, staff
+            res = self.client.get("/api/sales/")
+        expected = SaleSerializer(Sale.objects.select_related("product", "staff").order_by("-date", "-id"), many=True).data
+        self.assertEqual(json.loads(res.content)["results"], json.loads(JSONRenderer().render(expected)))
+
+    def test_columnar_format_round_trips(self):
+        plain = json.loads(self.client.get("/api/sales/").content)
+        res = self.client.get("/api/sales/", HTTP_ACCEPT="application/vnd.webillz.columnar+json")
+        body = json.loads(res.content)
+        self.assertEqual(list(body["lookups"]["product"]), ["p-cola"])
+        rows = []
+        for values in body["rows"]:
+            row = {}
+            for column, value in zip(body["columns"], values):
+                if column == "product":
+                    value = body["lookups"]["product"][value]
+                key, _, sub = column.partition(".")
+                if sub:
+                    row.setdefault(key, {})[sub] = value
+                else:
+                    row[key] = value
+            rows.append(row)
+        self.assertEqual(rows, plain["results"])
+
+    def test_compression_is_negotiated(self):
+        import gzip
+
+        res = self.client.get("/api/sales/", HTTP_ACCEPT_ENCODING="gzip;q=1, br;q=0")
+        self.assertEqual(res["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", res["Vary"])
+        self.assertEqual(json.loads(gzip.decompress(res.content))["results"], self.client.get("/api/sales/").data["results"])
+        self.assertTrue(res.content[3] & gzip.FNAME)   # random filename padding against BREACH
+        if brotli is not None:
+            lengths = set()
+            for _ in range(5):
+                res = self.client.get("/api/sales/", HTTP_ACCEPT_ENCODING="br")
+                self.assertEqual(res["Content-Encoding"], "br")
+                self.assertEqual(json.loads(brotli.decompress(res.content))["results"], self.client.get("/api/sales/").data["results"])
+                lengths.add(len(res.content))
+            self.assertGreater(len(lengths), 1)   # padded too, by a random amount
+        self.assertFalse(self.client.get("/api/sales/").has_header("Content-Encoding"))
+
+    def test_async_stream_is_one_gzip_member(self):
+        import zlib
+
+        from .middleware import _agzip_sequence
+
+        async def chunks():
+            for i in range(50):
+                yield f"{i},Cola 250ml,40.00\n".encode()
+
+        async def collect():
+            return b"".join([data async for data in _agzip_sequence(chunks())])
+
+        body = async_to_sync(collect)()
+        member = zlib.decompressobj(31)
+        self.assertEqual(member.decompress(body), b"".join(f"{i},Cola 250ml,40.00\n".encode() for i in range(50)))
+        self.assertEqual(member.unused_data, b"")   # not one member per chunk
+
+    def test_filters(self):
+        res = self.client.get("/api/sales/", {"mode": "UPI", "counter": "1"})
+        self.assertEqual([s["mode"] for s in res.data["results"]], ["UPI"])
+        res = self.client.get("/api/sales/", {"counter": "2"})
+        self.assertEqual(res.data["results"], [])
+
+
+class SalesSummaryTests(BillingTestMixin, TestCase):
+    def setUp(self):
+        self.make_fixtures()
+        staff = self.client_for(self.staff)
+        staff.post("/api/sales/", {"product_id": "p-cola", "qty": 2}, format="json")
+        staff.post("/api/sales/", {"product_id": "p-cola", "qty": 1}, format="json")
+        staff.post("/api/sales/checkout/", {"mode": "UPI", "lines": [
+            {"product_id": "p-chips", "qty": 1}, {"product_id": "p-cola", "qty": 1},
+        ]}, format="json")
+        self.client = self.client_for(self.admin)
+
+    def summary_rows(self):
+        return sorted(DailySalesSummary.objects.values_list("product_id", "mode", "sales", "qty", "total"))
+
+    def test_incremental_rows_match_a_rebuild(self):
+        incremental = self.summary_rows()
+        self.assertEqual(incremental, [
+            ("p-chips", "UPI", 1, 1, Decimal("23.60")),
+            ("p-cola", "Cash", 2, 3, Decimal("134.40")),
+            ("p-cola", "UPI", 1, 1, Decimal("44.80")),
+        ])
+        call_command("rebuild_summaries", stdout=io.StringIO())
+        self.assertEqual(self.summary_rows(), incremental)
+
+    def test_summary_endpoint(self):
+        res = self.client.get("/api/sales/summary/", {"period": "month", "group": "mode"})
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data["totals"]["sales"], 4)
+        self.assertEqual(res.data["totals"]["total"], 202.8)
+        self.assertEqual([(g["key"], g["qty"]) for g in res.data["groups"]], [("Cash", 3), ("UPI", 2)])
+        res = self.client.get("/api/sales/summary/", {"period": "week", "mode": "UPI"})
+        self.assertEqual(res.data["totals"]["qty"], 2)
+
+    def test_admin_delete_takes_sale_out(self):
+        sale = Sale.objects.filter(mode="UPI", product_id="p-cola").get()
+        self.assertEqual(self.client.delete(f"/api/sales/{sale.pk}/").status_code, 204)
+        self.assertEqual(DailySalesSummary.objects.get(product_id="p-cola", mode="UPI").sales, 0)
+
+
+@override_settings(CATALOG_SETTLE_SECONDS=0)   # every change settles at once unless a test says otherwise
+class CatalogSyncTests(BillingTestMixin, TestCase):
+    def setUp(self):
+        catalog.invalidate_cache()  # versions restart with each test database rollback
+        self.make_fixtures()
+        self.client = self.client_for(self.staff)
+
+    def test_etag_and_delta(self):
+        res = self.client.get("/api/products/")
+        self.assertEqual([p["id"] for p in json.loads(res.content)], ["p-chips", "p-cola"])
+        etag = res["ETag"]
+        version = int(res["X-Catalog-Version"])
+        self.assertEqual(self.client.get("/api/products/", HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.client.post("/api/sales/", {"product_id": "p-cola", "qty": 1}, format="json")
+        Product.objects.create(id="p-gone", name="Gone", price=Decimal("1.00"), gstPct=Decimal("0.00"))
+        Product.objects.get(pk="p-gone").delete()
+
+        res = self.client.get("/api/products/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(json.loads(res.content)[1]["stock"], 9)
+
+        res = self.client.get("/api/products/", {"since": version})
+        self.assertEqual([p["id"] for p in res.data["products"]], ["p-cola"])
+        self.assertEqual(res.data["deleted"], ["p-gone"])
+        self.assertEqual(self.client.get("/api/products/", {"since": res.data["version"]}).data["products"], [])
+
+        # a compressed copy carries a weak ETag, which must still revalidate
+        for i in range(5):
+            Product.objects.create(id=f"p-{i}", name=f"Item {i}", price=Decimal("1.00"), gstPct=Decimal("5.00"))
+        res = self.client.get("/api/products/", HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(res["Content-Encoding"], "gzip")
+        self.assertTrue(res["ETag"].startswith('W/"catalog-'))
+        self.assertEqual(self.client.get("/api/products/", HTTP_IF_NONE_MATCH=res["ETag"]).status_code, 304)
+
+    @override_settings(CATALOG_SETTLE_SECONDS=60)
+    def test_change_committed_late_still_syncs(self):
+        CatalogChange.objects.update(changed_at=timezone.now() - timedelta(minutes=5))
+        settled = catalog.current_version().settled
+        CatalogChange.objects.create(id=settled + 10, product_id="p-chips")
+        res = self.client.get("/api/products/", {"since": settled})
+        self.assertEqual(res.data["version"], settled)   # the new change hasn't settled yet
+        self.assertEqual([p["id"] for p in res.data["products"]], ["p-chips"])
+
+        # ids are taken at INSERT: a lower one can become visible after a higher one
+        Product.objects.filter(pk="p-cola").update(stock=7)
+        CatalogChange.objects.create(id=settled + 5, product_id="p-cola")
+        res = self.client.get("/api/products/", {"since": settled}, HTTP_IF_NONE_MATCH=res["ETag"])
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual([(p["id"], p["stock"]) for p in res.data["products"]], [("p-chips", 5), ("p-cola", 7)])
+
+        CatalogChange.objects.update(changed_at=timezone.now() - timedelta(minutes=5))
+        version = self.client.get("/api/products/", {"since": settled}).data["version"]
+        self.assertEqual(version, settled + 10)
+        self.assertEqual(self.client.get("/api/products/", {"since": version}).data["products"], [])
+
+    def test_compaction_keeps_deltas(self):
+        for stock in (3, 2, 1):
+            self.cola.stock = stock
+            self.cola.save(update_fields=["stock"])
+        before = self.client.get("/api/products/", {"since": 0}).data
+        call_command("compact_catalog_changes", stdout=io.StringIO())
+        self.assertEqual(CatalogChange.objects.count(), 2)
+        self.assertEqual(self.client.get("/api/products/", {"since": 0}).data, before)
+
+
+class ClaimsAuthenticationTests(BillingTestMixin, TestCase):
+    def setUp(self):
+        user_states.clear()
+        self.make_fixtures()
+        res = APIClient().post("/api/auth/login/", {"username": "c1", "password": "c1"}, format="json")
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {res.data['access']}")
+
+    def test_warm_requests_skip_user_query(self):
+        self.client.get("/users/me/")
+        with self.assertNumQueries(0):
+            res = self.client.get("/users/me/")
+        self.assertEqual((res.data["username"], res.data["role"], res.data["counter"]), ("c1", "staff", 1))
+
+        res = self.client.post("/api/sales/", {"product_id": "p-cola", "qty": 1}, format="json")
+        self.assertEqual(res.status_code, 201)
+        self.assertEqual((res.data["staff"], res.data["staffId"]), ("Counter 1", "u-c1"))
+        self.assertEqual(Sale.objects.get().staff_id, self.staff.pk)
+
+    def test_deactivation_and_role_change_apply(self):
+        self.client.get("/users/me/")
+        self.staff.role = "admin"
+        self.staff.save()
+        self.assertEqual(self.client.get("/users/me/").data["role"], "admin")
+        self.staff.is_active = False
+        self.staff.save()
+        self.assertEqual(self.client.get("/users/me/").status_code, 401)
+
+
+class IdempotencyKeyTests(BillingTestMixin, TestCase):
+    def setUp(self):
+        self.make_fixtures()
+        self.client = self.client_for(self.staff)
+
+    def test_replay_returns_stored_response(self):
+        body = {"product_id": "p-cola", "qty": 2}
+        first = self.client.post("/api/sales/", body, format="json", HTTP_IDEMPOTENCY_KEY="k-1")
+        with self.assertNumQueries(1):
+            again = self.client.post("/api/sales/", body, format="json", HTTP_IDEMPOTENCY_KEY="k-1")
+        self.assertEqual(again.status_code, 201)
+        self.assertEqual(again["Idempotent-Replayed"], "true")
+        self.assertEqual(again.data, json.loads(first.content))
+        self.assertEqual(Sale.objects.count(), 1)
+        self.cola.refresh_from_db()
+        self.assertEqual(self.cola.stock, 8)
+
+        other = self.client.post("/api/sales/", {"product_id": "p-cola", "qty": 1}, format="json", HTTP_IDEMPOTENCY_KEY="k-1")
+        self.assertEqual(other.status_code, 422)
+
+    def test_failures_are_not_remembered(self):
+        body = {"product_id": "p-chips", "qty": 6}
+        self.assertEqual(self.client.post("/api/sales/", body, format="json", HTTP_IDEMPOTENCY_KEY="k-2").status_code, 400)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+    def test_purge(self):
+        self.client.post("/api/sales/", {"product_id": "p-cola", "qty": 1}, format="json", HTTP_IDEMPOTENCY_KEY="k-3")
+        IdempotencyKey.objects.update(created_at=timezone.now() - timedelta(days=30))
+        call_command("purge_idempotency_keys", stdout=io.StringIO())
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+
+class OfflineSyncTests(BillingTestMixin, TestCase):
+    def setUp(self):
+        self.make_fixtures()
+        self.client = self.client_for(self.staff)
+
+    def item(self, product_id, qty, minute):
+        return {"client_id": str(uuid.uuid4()), "client_ts": f"2026-10-01T10:{minute:02d}:00Z", "product_id": product_id, "qty": qty}
+
+    def test_batch_results(self):
+        items = [
+            self.item("p-chips", 3, 1),
+            self.item("p-chips", 3, 2),   # only 2 left by now
+            self.item("p-chips", 2, 3),
+            self.item("p-cola", 4, 4),
+            self.item("p-nope", 1, 5),
+            {"client_id": "not-a-uuid", "product_id": "p-cola", "qty": 1},
+        ]
+        items.append(dict(items[0]))
+        res = self.client.post("/api/sales/sync/", {"sales": items}, format="json")
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(
+            [r["status"] for r in res.data["results"]],
+            ["accepted", "rejected", "accepted", "accepted", "rejected", "rejected", "duplicate"],
+        )
+        self.assertEqual((res.data["accepted"], res.data["duplicate"], res.data["rejected"]), (3, 1, 3))
+        self.chips.refresh_from_db()
+        self.assertEqual(self.chips.stock, 0)
+        self.assertEqual(DailySalesSummary.objects.get(product_id="p-cola").qty, 4)
+
+        again = self.client.post("/api/sales/sync/", {"sales": items[:1]}, format="json")
+        self.assertEqual(again.data["results"][0]["status"], "duplicate")
+        self.assertEqual(again.data["results"][0]["id"], res.data["results"][0]["id"])
+        self.assertEqual(Sale.objects.count(), 3)
+
+    def test_dated_by_counter_clock(self):
+        now = timezone.now()
+        yesterday = now - timedelta(days=1)
+        items = [
+            dict(self.item("p-cola", 1, 0), client_ts=yesterday.isoformat()),
+            dict(self.item("p-cola", 1, 0), client_ts=(now + timedelta(hours=2)).isoformat()),   # clock ahead
+            dict(self.item("p-cola", 1, 0), client_ts="2020-01-01T00:00:00Z"),                  # clock reset
+        ]
+        with mock.patch.object(report_cache, "forget_days") as forget, self.captureOnCommitCallbacks(execute=True):
+            res = self.client.post("/api/sales/sync/", {"sales": items}, format="json")
+        self.assertEqual(res.data["accepted"], 3)
+        dates = {str(k): v for k, v in Sale.objects.values_list("client_id", "date")}
+        dates = [dates[item["client_id"]] for item in items]
+        self.assertEqual(dates[0], yesterday)
+        self.assertTrue(all(now <= d <= timezone.now() for d in dates[1:]))
+        forget.assert_called_once_with({yesterday.date()})
+        summary = dict(DailySalesSummary.objects.values_list("business_date", "sales"))
+        self.assertEqual(summary, {yesterday.date(): 1, now.date(): 2})
+
+
+class MetricsTests(BillingTestMixin, TestCase):
+    def setUp(self):
+        self.make_fixtures()
+
+    def test_exposes_prometheus_text(self):
+        staff = self.client_for(self.staff)
+        staff.post("/api/sales/", {"product_id": "p-cola", "qty": 1}, format="json")
+        self.assertEqual(staff.get("/api/metrics/").status_code, 403)
+
+        res = self.client_for(self.admin).get("/api/metrics/")
+        self.assertEqual(res.status_code, 200)
+        body = res.content.decode()
+        self.assertIn('webillz_http_requests_total{method="POST",route="sale-list",status="201"}', body)
+        self.assertIn('webillz_http_request_duration_seconds_bucket{method="POST",route="sale-list",status="201",le="+Inf"}', body)
+        self.assertRegex(body, r'webillz_db_queries_total\{method="POST",route="sale-list",status="201"\} [1-9]')
+
+
+    def test_concurrent_flushes_and_failures_never_fail_requests(self):
+        from . import metrics
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        local = metrics.MetricsStore(directory, 0)
+        failed = []
+
+        def hammer():
+            try:
+                for _ in range(50):
+                    local.observe("GET", "sale-list", 200, 0.01, 1, 0.001, 10)
+            except Exception as exc:
+                failed.append(exc)
+
+        threads = [threading.Thread(target=hammer) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(failed, [])
+        self.assertEqual(local.collect()[("GET", "sale-list", "200")]["count"], 400)
+
+        with mock.patch.object(metrics.store, "observe", side_effect=OSError("disk full")), \
+                self.assertLogs("sales.metrics", "ERROR"):
+            res = self.client_for(self.staff).get("/api/products/")
+        self.assertEqual(res.status_code, 200)
+
+
+class ProductImportExportTests(BillingTestMixin, TestCase):
+    def setUp(self):
+        self.make_fixtures()
+        self.client = self.client_for(self.admin)
+
+    def test_csv_upload_upserts_and_reports_bad_rows(self):
+        body = (
+            "id,name,hsn,price,gstPct,stock\n"
+            "p-cola,Cola 300ml,2202,45.00,12.00,30\n"
+            "p-new,New Juice,2202,60.00,5.00,12\n"
+            "p-bad,Bad Price,2202,-1,5.00,1\n"
+        )
+        upload = SimpleUploadedFile("products.csv", body.encode(), content_type="text/csv")
+        res = self.client.post("/api/products/import/", {"file": upload}, format="multipart")
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual((res.data["rows"], res.data["upserted"], res.data["error_count"]), (3, 2, 1))
+        self.assertEqual(res.data["errors"][0]["row"], 4)
+        self.cola.refresh_from_db()
+        self.assertEqual((self.cola.name, self.cola.price, self.cola.stock), ("Cola 300ml", Decimal("45.00"), 30))
+        self.assertTrue(Product.objects.filter(pk="p-new").exists())
+
+    def test_jsonl_body_without_stock_keeps_stock(self):
+        body = '{"id": "p-chips", "name": "Chips 60g", "price": "25.00", "gstPct": "18.00"}\nnot json\n'
+        res = self.client.generic("POST", "/api/products/import/", body, content_type="application/x-ndjson")
+        self.assertEqual((res.data["upserted"], res.data["error_count"]), (1, 1))
+        self.chips.refresh_from_db()
+        self.assertEqual((self.chips.name, self.chips.stock), ("Chips 60g", 5))
+
+    def test_rows_with_fewer_columns_keep_the_rest(self):
+        body = (
+            '{"id": "p-cola", "name": "Cola 300ml", "price": "45.00", "gstPct": "12.00"}\n'
+            '{"id": "p-chips", "name": "Chips 50g", "hsn": "2005", "price": "20.00", "gstPct": "18.00", "stock": 9}\n'
+        )
+        res = self.client.generic("POST", "/api/products/import/", body, content_type="application/x-ndjson")
+        self.assertEqual(res.data["upserted"], 2)
+        self.cola.refresh_from_db()
+        self.chips.refresh_from_db()
+        self.assertEqual((self.cola.name, self.cola.hsn, self.cola.stock), ("Cola 300ml", "2202", 10))
+        self.assertEqual(self.chips.stock, 9)
+
+    def test_export_round_trip(self):
+        res = self.client.get("/api/products/export/")
+        lines = b"".join(res.streaming_content).decode().splitlines()
+        self.assertEqual(lines, ["id,name,hsn,price,gstPct,stock", "p-chips,Chips 50g,2005,20.00,18.00,5", "p-cola,Cola 250ml,2202,40.00,12.00,10"])
+        res = self.client.get("/api/products/export/", {"type": "jsonl"})
+        rows = [json.loads(line) for line in b"".join(res.streaming_content).splitlines()]
+        self.assertEqual(rows[0]["price"], "20.00")
+
+    def test_staff_cannot_import(self):
+        res = self.client_for(self.staff).post("/api/products/import/", {}, format="json")
+        self.assertEqual(res.status_code, 403)
+
+
+class ProductSearchTests(BillingTestMixin, TestCase):
+    def setUp(self):
+        product_index.reset()
+        self.make_fixtures()
+        Product.objects.create(id="p-7up-250", name="7 Up 250ml", hsn="2202", price=Decimal("41.00"), gstPct=Decimal("12.00"), stock=12)
+        self.client = self.client_for(self.staff)
+
+    def names(self, q):
+        return [r["name"] for r in self.client.get("/api/products/search/", {"q": q}).data["results"]]
+
+    def test_ranked_matches(self):
+        self.assertEqual(self.names("p-cola"), ["Cola 250ml"])
+        self.assertEqual(self.names("up 250"), ["7 Up 250ml"])
+        self.assertEqual(self.names("2005"), ["Chips 50g"])
+        self.assertEqual(self.names("cola"), ["Cola 250ml"])
+        self.assertEqual(self.names("chisp"), [])
+        self.assertEqual(self.names("hips 50"), ["Chips 50g"])   # trigram fallback
+
+    def test_queries_do_not_hit_the_database_once_warm(self):
+        self.names("cola")
+        with self.assertNumQueries(0):
+            self.assertEqual(product_index.search("chips")[1][0]["id"], "p-chips")
+
+    def test_picks_up_changes(self):
+        self.names("cola")
+        product_index.checked = 0  # force the next search to re-sync
+        Product.objects.filter(pk="p-cola").delete()
+        Product.objects.create(id="p-colada", name="Pina Colada", price=Decimal("90.00"), gstPct=Decimal("18.00"))
+        self.assertEqual(self.names("colada"), ["Pina Colada"])
+        product_index.checked = 0
+        self.assertNotIn("Cola 250ml", self.names("cola"))
+
+    @override_settings(PRODUCT_SEARCH_INDEX=False)
+    def test_database_fallback(self):
+        self.assertEqual(self.names("7 up"), ["7 Up 250ml"])
+        self.assertEqual(self.names("2202"), ["Cola 250ml", "7 Up 250ml"])
+
+
+class SeedDemoTests(TestCase):
+    def seed(self, **extra):
+        call_command("seed_demo", products=30, staff=4, counters=2, sales=300, days=10, stdout=io.StringIO(), **extra)
+        return list(Sale.objects.order_by("id").values_list("date", "product_id", "staff__username", "qty", "mode", "total"))
+
+    def test_reproducible_and_consistent(self):
+        first = self.seed()
+        Sale.objects.all().delete()
+        self.assertEqual(self.seed(), first)
+        self.assertEqual(len(first), 300)
+        days = {row[0].date() for row in first}
+        self.assertEqual((min(days), max(days)), (date(2026, 9, 21), date(2026, 9, 30)))   # the fixed default end date
+
+        sale = Sale.objects.select_related("product").first()
+        self.assertEqual(sale.total, (sale.taxable + sale.gst).quantize(Decimal("0.01")))
+        self.assertEqual(sale.product_version.product_id, sale.product_id)
+        self.assertEqual(ProductVersion.objects.count(), 30)   # one per synthetic product, shared by its sales
+        summed = DailySalesSummary.objects.aggregate(n=Sum("sales"), total=Sum("total"))
+        self.assertEqual(summed["n"], 300)
+        cent = Decimal("0.01")   # SQLite sums decimals as floats
+        self.assertEqual(summed["total"].quantize(cent), Sale.objects.aggregate(t=Sum("total"))["t"].quantize(cent))
+
+        Sale.objects.all().delete()
+        days = {row[0].date() for row in self.seed(end_date=date(2025, 1, 31))}
+        self.assertEqual((min(days), max(days)), (date(2025, 1, 22), date(2025, 1, 31)))
+
+
+class SalesArchiveTests(BillingTestMixin, TestCase):
+    def setUp(self):
+        self.make_fixtures()
+        self.archive_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.archive_dir, ignore_errors=True)
+        override = override_settings(SALES_ARCHIVE_DIR=self.archive_dir)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        staff = self.client_for(self.staff)
+        for qty, mode in ((1, "Cash"), (2, "UPI"), (3, "Cash")):
+            staff.post("/api/sales/", {"product_id": "p-cola", "qty": qty, "mode": mode}, format="json")
+        # move them into a closed month, summaries included
+        Sale.objects.update(date=datetime(2025, 3, 14, 10, 30, tzinfo=dt_timezone.utc))
+        DailySalesSummary.objects.all().delete()
+        call_command("rebuild_summaries", stdout=io.StringIO())
+        self.client = self.client_for(self.admin)
+
+    def report(self, path="/api/sales/daily_report/", **params):
+        return b"".join(self.client.get(path, {"date": "2025-03-14", **params}).streaming_content).decode().splitlines()
+
+    def test_archive_keeps_reports_and_totals(self):
+        before = self.report()
+        call_command("archive_sales", "--before", "2025-04", "--batch-size", "2", stdout=io.StringIO())
+
+        self.assertFalse(Sale.objects.exists())
+        self.assertEqual(self.report(), before)
+        self.assertEqual(self.report(mode="Cash"), [before[0], before[1], before[3]])
+        self.assertEqual(self.report("/api/sales/archive/", mode="UPI"), [before[0], before[2]])
+        self.assertEqual(self.client.get("/api/sales/archive/").data["months"], [{"month": "2025-03", "sales": 3, "complete": True}])
+        res = self.client.get("/api/sales/summary/", {"period": "month", "date": "2025-03-01"})
+        self.assertEqual(res.data["totals"]["qty"], 6)
+
+        call_command("rebuild_summaries", stdout=io.StringIO())   # must not wipe archived months
+        self.assertEqual(DailySalesSummary.objects.aggregate(q=Sum("qty"))["q"], 6)
+
+    def test_rerun_after_crash_neither_loses_nor_duplicates(self):
+        archive = MonthArchive(date(2025, 3, 1))
+        first = Sale.objects.order_by("date", "id").values_list(*ARCHIVE_FIELDS)[:1]
+        archive.append(list(first))   # written and confirmed, but the process died before deleting
+        with open(archive.data_path, "ab") as fh:
+            fh.write(b"half a gzip member")   # and a later batch was cut off mid-write
+
+        call_command("archive_sales", "--before", "2025-04", stdout=io.StringIO())
+        self.assertFalse(Sale.objects.exists())
+        self.assertEqual(sorted(r["qty"] for r in MonthArchive(date(2025, 3, 1)).records()), [1, 2, 3])
+
+    @override_settings(SYNC_MAX_AGE_DAYS=100_000)
+    def test_late_sync_into_archived_month_is_kept(self):
+        call_command("archive_sales", "--before", "2025-04", stdout=io.StringIO())
+        item = {"client_id": str(uuid.uuid4()), "client_ts": "2025-03-10T09:00:00Z", "product_id": "p-cola", "qty": 2}
+        result, = self.client_for(self.staff).post("/api/sales/sync/", {"sales": [item]}, format="json").data["results"]
+        self.assertEqual(result["status"], "accepted")
+        # dated into March it would sit before the manifest's last key and be deleted unarchived
+        self.assertGreater(Sale.objects.get(pk=result["id"]).date, datetime(2025, 4, 1, tzinfo=dt_timezone.utc))
+        call_command("archive_sales", "--before", "2025-04", stdout=io.StringIO())
+        self.assertTrue(Sale.objects.filter(pk=result["id"]).exists())
+
+    def test_only_closed_months(self):
+        with self.assertRaises(CommandError):
+            call_command("archive_sales", "--before", "2999-01", stdout=io.StringIO())
+
+
+class AsyncReadEndpointTests(BillingTestMixin, TestCase):
+    def setUp(self):
+        user_states.clear()
+        catalog.invalidate_cache()
+        self.make_fixtures()
+        staff = self.client_for(self.staff)
+        for qty in (1, 2, 3):
+            staff.post("/api/sales/", {"product_id": "p-cola", "qty": qty}, format="json")
+
+    def login(self, username, password):
+        res = APIClient().post("/api/auth/login/", {"username": username, "password": password}, format="json")
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {res.data['access']}")
+        return client
+
+    def assertSameResponse(self, client, sync_path, async_path, params=None):
+        expected, got = client.get(sync_path, params), client.get(async_path, params)
+        self.assertEqual(got.status_code, expected.status_code)
+        # pagination links point back at the endpoint that served them
+        self.assertEqual(json.loads(got.content.decode().replace("/api/async/", "/api/")), expected.json())
+        return got
+
+    def test_same_responses_as_sync_endpoints(self):
+        staff, admin = self.login("c1", "c1"), self.login("admin", "admin123")
+        self.assertSameResponse(staff, "/api/products/", "/api/async/products/")
+        self.assertSameResponse(staff, "/api/products/", "/api/async/products/", {"since": "1"})
+        self.assertSameResponse(staff, "/api/products/p-cola/", "/api/async/products/p-cola/")
+        self.assertSameResponse(staff, "/api/products/nope/", "/api/async/products/nope/")
+        self.assertSameResponse(staff, "/users/me/", "/api/async/users/me/")
+        self.assertSameResponse(staff, "/api/auth/profile/", "/api/async/auth/profile/")
+        self.assertSameResponse(staff, "/api/users/", "/api/async/users/")
+        self.assertSameResponse(staff, "/api/sales/", "/api/async/sales/")   # 403 for staff
+
+        page = self.assertSameResponse(admin, "/api/sales/", "/api/async/sales/", {"page_size": 2, "staff": "u-c1"}).json()
+        self.assertEqual(len(page["results"]), 2)
+        cursor = page["next"].split("cursor=")[1].split("&")[0]
+        sync_next = admin.get("/api/sales/", {"page_size": 2, "staff": "u-c1", "cursor": cursor}).json()
+        async_next = admin.get("/api/async/sales/", {"page_size": 2, "staff": "u-c1", "cursor": cursor}).json()
+        self.assertEqual([r["qty"] for r in async_next["results"]], [r["qty"] for r in sync_next["results"]])
+        self.assertSameResponse(admin, "/api/sales/summary/", "/api/async/sales/summary/", {"period": "month", "group": "product"})
+        self.assertSameResponse(admin, "/api/sales/summary/", "/api/async/sales/summary/", {"period": "year"})
+
+    def test_authentication(self):
+        res = APIClient().get("/api/async/products/")
+        self.assertEqual(res.status_code, 401)
+        self.assertEqual(res["WWW-Authenticate"], 'Bearer realm="api"')
+        res = APIClient().get("/api/async/products/", HTTP_AUTHORIZATION="Bearer not-a-token")
+        self.assertEqual(res.status_code, 401)
+
+        client = self.login("c1", "c1")
+        etag = client.get("/api/async/products/")["ETag"]
+        self.assertEqual(client.get("/api/async/products/", HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(client.post("/api/async/products/").status_code, 405)
+        self.staff.is_active = False
+        self.staff.save()
+        self.assertEqual(client.get("/api/async/users/me/").status_code, 401)
+
+
+@override_settings(SALE_STREAM_POLL_SECONDS=60)   # so events can only come from the commit hook
+class LiveSaleStreamTests(BillingTestMixin, TestCase):
+    def setUp(self):
+        user_states.clear()
+        self.make_fixtures()
+        self.token = self.access_token("admin", "admin123")
+
+    def access_token(self, username, password):
+        return APIClient().post("/api/auth/login/", {"username": username, "password": password}, format="json").data["access"]
+
+    def bill(self, qty):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client_for(self.staff).post("/api/sales/", {"product_id": "p-cola", "qty": qty}, format="json").data["id"]
+
+    async def open_stream(self, **headers):
+        # an ASGIRequest, as the stream is only served under ASGI; HTTP_X=... becomes header X
+        headers = {name[5:].replace("_", "-").title(): value for name, value in headers.items()}
+        request = AsyncRequestFactory().get("/api/sales/stream/", {"token": self.token}, headers=headers)
+        response = await async_views.sale_stream(request)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        return aiter(response.streaming_content)
+
+    async def events(self, stream, count):
+        """The next `count` events as (id, name, data), skipping retry and keepalive lines."""
+        events = []
+        while len(events) < count:
+            chunk = (await asyncio.wait_for(anext(stream), 5)).decode()
+            fields = dict(line.split(": ", 1) for line in chunk.strip().split("\n") if not line.startswith(":"))
+            if "event" in fields:
+                events.append((fields.get("id"), fields["event"], json.loads(fields["data"])))
+        return events
+
+    def test_pushes_committed_sales_to_every_subscriber(self):
+        self.bill(1)
+
+        async def watch():
+            streams = [await self.open_stream(), await self.open_stream()]
+            for stream in streams:
+                (_, name, data), = await self.events(stream, 1)
+                self.assertEqual(name, "totals")
+                self.assertEqual(data["counters"], [{"counter": 1, "sales": 1, "qty": 1, "taxable": 40.0, "gst": 4.8, "total": 44.8}])
+            sale_id = await sync_to_async(self.bill)(2)
+            received = [await self.events(stream, 1) for stream in streams]
+            self.assertEqual(received[0], received[1])   # one read, fanned out
+            (event_id, name, data), = received[0]
+            self.assertEqual((event_id, name), (str(sale_id), "sale"))
+            self.assertEqual(data["sale"]["qty"], 2)
+            self.assertEqual(data["counter"]["sales"], 2)
+            self.assertEqual(data["counter"]["qty"], 3)
+            for stream in streams:
+                await stream.aclose()
+
+        async_to_sync(watch)()
+        self.assertIsNone(hub._pump_task)   # stopped with the last subscriber
+
+    def test_resumes_from_last_event_id(self):
+        first = self.bill(1)
+        missed = [self.bill(2), self.bill(3)]
+
+        async def watch():
+            stream = await self.open_stream(HTTP_LAST_EVENT_ID=str(first))
+            events = await self.events(stream, 3)
+            self.assertEqual([(e[0], e[1]) for e in events], [(None, "totals")] + [(str(i), "sale") for i in missed])
+            latest = await sync_to_async(self.bill)(1)
+            # a second client resuming from the buffer: only what came after its id
+            other = await self.open_stream(HTTP_LAST_EVENT_ID=str(missed[-1]))
+            self.assertEqual([e[0] for e in await self.events(other, 2)], [None, str(latest)])
+            self.assertEqual([e[0] for e in await self.events(stream, 1)], [str(latest)])
+            await stream.aclose()
+            await other.aclose()
+
+        async_to_sync(watch)()
+
+    @override_settings(SALE_STREAM_KEEPALIVE_SECONDS=0.05)
+    def test_keepalive_keeps_the_stream_open(self):
+        async def watch():
+            stream = await self.open_stream()
+            await self.events(stream, 1)
+            self.assertEqual(await asyncio.wait_for(anext(stream), 5), b": keepalive\n\n")
+            sale_id = await sync_to_async(self.bill)(1)
+            self.assertEqual([e[:2] for e in await self.events(stream, 1)], [(str(sale_id), "sale")])
+            await stream.aclose()
+
+        async_to_sync(watch)()
+
+    @override_settings(SALE_STREAM_BUFFER=2)
+    def test_resets_when_too_far_behind(self):
+        first = self.bill(1)
+        missed = [self.bill(1) for _ in range(3)]
+
+        async def watch():
+            stream = await self.open_stream(HTTP_LAST_EVENT_ID=str(first))
+            events = await self.events(stream, 2)
+            # not the first two missed sales and then a gap: one reset to the newest id
+            self.assertEqual(events[1], (str(missed[-1]), "reset", {"last_id": missed[-1]}))
+            latest = await sync_to_async(self.bill)(1)
+            self.assertEqual([e[:2] for e in await self.events(stream, 1)], [(str(latest), "sale")])
+            await stream.aclose()
+
+        async_to_sync(watch)()
+
+    def test_admin_only(self):
+        staff_token = self.access_token("c1", "c1")
+        self.assertEqual(APIClient().get("/api/sales/stream/", {"token": staff_token}).status_code, 403)
+        self.assertEqual(APIClient().get("/api/sales/stream/").status_code, 401)
+        self.assertEqual(APIClient().get("/api/sales/stream/", {"token": "not-a-token"}).status_code, 401)
+        # WSGI would buffer the endless stream and never answer
+        res = APIClient().get("/api/sales/stream/", {"token": self.token})
+        self.assertEqual(res.status_code, 501)
+
+
+@override_settings(DATABASE_ROUTERS=["sales.replicas.ReplicaRouter"])
+class ReplicaRoutingTests(BillingTestMixin, TransactionTestCase):
+    def setUp(self):
+        self.make_fixtures()
+        self.addCleanup(replicas._down_until.__setitem__, 0, 0.0)
+        # no test transaction around each test: reads inside one always stay on the primary.
+        # A replica database needn't be configured; what is checked is where queries are sent.
+        patcher = mock.patch.object(replicas, "replica_available", return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def request_for(self, user):
+        request = RequestFactory().get("/api/sales/")
+        request.user = user
+        return request
+
+    def test_only_marked_reads_go_to_replica(self):
+        seen = {}
+
+        @replicas.replica_reads
+        def view(self, request):
+            seen["read"] = Sale.objects.all().db
+            seen["locking"] = Sale.objects.select_for_update().db
+            with transaction.atomic():
+                seen["in_transaction"] = Sale.objects.all().db
+            return StreamingHttpResponse(Sale.objects.all().db for _ in range(1))
+
+        response = view(None, self.request_for(self.admin))
+        self.assertEqual(seen, {"read": "replica", "locking": "default", "in_transaction": "default"})
+        self.assertEqual(list(response.streaming_content), [b"replica"])   # streamed after the view returned
+        self.assertEqual(Sale.objects.all().db, "default")
+
+    def test_writer_reads_own_writes(self):
+        self.assertEqual(replicas.read_alias(self.request_for(self.staff)), "replica")
+        # the cross-site frontend: a bearer token and no cookies, whichever worker answers
+        token = APIClient().post("/api/auth/login/", {"username": "c1", "password": "c1"}, format="json").data["access"]
+        client = APIClient(enforce_csrf_checks=True)
+        headers = {"HTTP_AUTHORIZATION": f"Bearer {token}", "HTTP_ORIGIN": "https://manikandan-developer24.github.io"}
+        res = client.post("/api/sales/", {"product_id": "p-cola", "qty": 1}, format="json", **headers)
+        self.assertEqual(res.status_code, 201)
+        self.assertFalse(res.cookies)
+        self.assertEqual(replicas.read_alias(self.request_for(self.staff)), "default")
+        self.assertEqual(replicas.read_alias(self.request_for(self.admin)), "replica")
+        self.assertEqual(async_to_sync(replicas.aread_alias)(self.request_for(self.staff)), "default")
+
+        with override_settings(REPLICA_STICKY_SECONDS=0):
+            client.post("/api/sales/", {"product_id": "p-cola", "qty": 1}, format="json", **headers)
+            self.assertEqual(replicas.read_alias(self.request_for(self.staff)), "replica")
+
+    def test_falls_back_to_primary(self):
+        calls = []
+
+        @replicas.replica_reads
+        def view(self, request):
+            calls.append(Sale.objects.all().db)
+            if len(calls) == 1:
+                raise OperationalError("replica went away")
+            return "ok"
+
+        self.assertEqual(view(None, self.request_for(self.admin)), "ok")
+        self.assertEqual(calls, ["replica", "default"])
+        self.assertGreater(replicas._down_until[0], 0)
@@ -3,15 +3,21 @@ from rest_framework import viewsets, status, generics
 from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.response import Response
+from django.conf import settings
 from django.db import transaction
-from django.http import HttpResponse
+from django.http import HttpResponse, HttpResponseNotModified, StreamingHttpResponse
 from django.utils import timezone
 from decimal import Decimal
-import csv
 
+from .catalog import catalog_body, changes_since, current_version, etag_matches, record_changes
+from .search import product_index, search_db
+from .product_io import IMPORT_FORMATS, guess_format, import_products, iter_products_csv, iter_products_jsonl, iter_records
+from .metrics import render_prometheus, store as metrics_store
 from .models import Product, Sale, User
 from .serializers import ProductSerializer, SaleSerializer, UserSerializer, CreateStaffSerializer
 from .permissions import IsAdmin, IsStaffOrAdmin
+from .replicas import replica_reads
+from .inventory import set_stock
 
 # ---- Auth endpoints ----
 class CreateUserByAdminView(generics.CreateAPIView):
@@ -31,6 +37,14 @@ def profile_view(request):
     return Response(serializer.data)
 
 
+@api_view(["GET"])
+@permission_classes([IsAuthenticated, IsAdmin])
+def metrics_view(request):
+    """ GET /api/metrics/  (Admin only) -- Prometheus text format, summed across workers """
+    body = render_prometheus(metrics_store.collect())
+    return HttpResponse(body, content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 # We will provide custom token view in urls (see below) using SimpleJWT
 
 # ---- Products ----
@@ -41,12 +55,108 @@ class ProductViewSet(viewsets.ModelViewSet):
     def get_permissions(self):
         # list/retrieve: any authenticated user
         # create/update/destroy: admin only
-        if self.action in ("create", "update", "partial_update", "destroy"):
+        if self.action in ("create", "update", "partial_update", "destroy", "import_products", "export"):
             permission_classes = [IsAuthenticated, IsAdmin]
         else:
             permission_classes = [IsAuthenticated]
         return [p() for p in permission_classes]
 
+    def list(self, request, *args, **kwargs):
+        """
+        GET /api/products/            full catalog, strong ETag -> 304 when unchanged
+        GET /api/products/?since=<v>  only products changed and ids deleted after version v
+        """
+        version = current_version()
+        since = request.query_params.get("since")
+        if since is not None:
+            if not since.isdigit():
+                return Response({"detail": "since must be a catalog version number"}, status=status.HTTP_400_BAD_REQUEST)
+            etag = f'"catalog-{since}-{version.tag}"'
+        else:
+            etag = f'"catalog-{version.tag}"'
+
+        if etag_matches(etag, request.headers.get("If-None-Match")):
+            response = HttpResponseNotModified()
+        elif since is not None:
+            products, deleted = changes_since(int(since))
+            response = Response({
+                "version": version.settled,
+                "since": int(since),
+                "products": self.get_serializer(products, many=True).data,
+                "deleted": deleted,
+            })
+        else:
+            response = HttpResponse(catalog_body(version), content_type="application/json")
+            response["X-Catalog-Version"] = str(version.settled)
+        response["ETag"] = etag
+        response["Cache-Control"] = "no-cache"
+        return response
+
+    def perform_create(self, serializer):
+        self.save_stock(serializer)
+
+    def perform_update(self, serializer):
+        self.save_stock(serializer)
+
+    def save_stock(self, serializer):
+        # an admin's stock figure is absolute; sharded inventory moves it into the pool
+        with transaction.atomic():
+            product = serializer.save()
+            if "stock" in serializer.validated_data:
+                set_stock({product.pk: product.stock})
+
+    @action(detail=False, methods=["get"])
+    def search(self, request):
+        """
+        GET /api/products/search/?q=<name prefix | words | id | hsn>&limit=20
+        Ranked matches from the in-process product index (see sales/search.py).
+        """
+        q = request.query_params.get("q", "")
+        try:
+            limit = min(max(int(request.query_params.get("limit", 20)), 1), 100)
+        except ValueError:
+            return Response({"detail": "limit must be a number"}, status=status.HTTP_400_BAD_REQUEST)
+        if not settings.PRODUCT_SEARCH_INDEX:
+            return Response({"results": search_db(q, limit)})
+        version, results = product_index.search(q, limit)
+        return Response({"version": version, "results": results})
+
+    @action(detail=False, methods=["post"], url_path="import")
+    def import_products(self, request):
+        """
+        POST /api/products/import/?type=csv|jsonl&batch_size=1000  (Admin only)
+        Body: a multipart "file" upload or the raw CSV / JSON Lines.
+        Rows are validated like ProductSerializer and upserted in batches; bad rows are
+        reported with their line number and skipped.
+        """
+        upload = request.FILES.get("file") if request.content_type.startswith("multipart/") else None
+        stream = upload if upload is not None else request.stream
+        if stream is None:
+            return Response({"detail": "send a file or a request body"}, status=status.HTTP_400_BAD_REQUEST)
+
+        fmt = request.query_params.get("type") or guess_format(getattr(upload, "name", ""), request.content_type)
+        if fmt not in IMPORT_FORMATS:
+            return Response({"detail": "type must be csv or jsonl"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            batch_size = min(max(int(request.query_params.get("batch_size", 1000)), 1), 10000)
+        except ValueError:
+            return Response({"detail": "batch_size must be a number"}, status=status.HTTP_400_BAD_REQUEST)
+
+        report = import_products(iter_records(stream, fmt), batch_size=batch_size)
+        return Response(report)
+
+    @action(detail=False, methods=["get"])
+    @replica_reads
+    def export(self, request):
+        """GET /api/products/export/?type=csv|jsonl  (Admin only) -- streamed, ordered by id"""
+        if request.query_params.get("type") == "jsonl":
+            response = StreamingHttpResponse(iter_products_jsonl(), content_type="application/x-ndjson")
+            response["Content-Disposition"] = 'attachment; filename="products.jsonl"'
+        else:
+            response = StreamingHttpResponse(iter_products_csv(), content_type="text/csv")
+            response["Content-Disposition"] = 'attachment; filename="products.csv"'
+        return response
+
 
 # ---- Sales ----
 from rest_framework import viewsets, status
@@ -54,33 +164,62 @@ from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from django.db import transaction
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse
 from django.utils import timezone
-import csv
+import copy
 from decimal import Decimal
-
-from .models import Sale, Product
-from .serializers import SaleSerializer
+from itertools import chain
+
+from .models import Sale, Product, DailySalesSummary
+from .serializers import SaleSerializer, CheckoutSerializer
+from .billing import price_line, product_version_id
+from . import report_cache
+from .archive import archived_csv_rows, archived_months
+from .exports import SALES_CSV_HEADER, StaffNames, iter_csv, iter_gzip, sale_csv_rows
+from .idempotency import idempotent
+from .inventory import sharded, take_stock
+from .invoices import MAX_BLOCK_SIZE, allocate_invoice_numbers, format_invoice_no, issue_block
+from .listing import SALE_LIST_FIELDS, sale_list_data, sale_refs
+from .live import announce
+from .renderers import SALES_RENDERERS, iter_report
+from .filters import date_range, filter_dimensions, filter_sales
+from .pagination import SaleCursorPagination
+from .sync import ACCEPTED, DUPLICATE, REJECTED, SYNC_MAX_BATCH, sync_sales
+from .summary import SUMMARY_GROUPS, SUMMARY_SUMS, business_date, record_sales, summary_params, summary_row
 from .permissions import IsAdmin, IsStaffOrAdmin  # make sure IsStaffOrAdmin = staff OR admin
 
 
 class SaleViewSet(viewsets.ModelViewSet):
     queryset = Sale.objects.select_related("product", "staff").all().order_by("-date")
     serializer_class = SaleSerializer
+    pagination_class = SaleCursorPagination
+    renderer_classes = SALES_RENDERERS   # JSON by default; ?format=columnar|msgpack to opt in
+
+    def get_queryset(self):
+        qs = super().get_queryset()
+        if self.action == "list":
+            # ?from=&to=&date=&counter=&staff=&mode=
+            qs, _, _ = filter_sales(qs, self.request.query_params)
+        return qs
 
     def get_permissions(self):
         """Define permissions per action"""
-        if self.action in ["list", "daily_report"]:
+        if self.action in ["list", "daily_report", "summary", "archive"]:
             perms = [IsAuthenticated, IsAdmin]           # admin only
-        elif self.action == "create":
+        elif self.action in ["create", "checkout", "sync", "invoice_block"]:
             perms = [IsAuthenticated, IsStaffOrAdmin]    # staff + admin
         else:
             perms = [IsAuthenticated, IsAdmin]           # lock down other actions to admin only
         return [p() for p in perms]
 
+    @replica_reads
     def list(self, request, *args, **kwargs):
-        return super().list(request, *args, **kwargs)
+        # lean read path (sales/listing.py): same JSON as SaleSerializer, built from a values() page
+        qs = self.filter_queryset(self.get_queryset()).values(*SALE_LIST_FIELDS)
+        page = self.paginate_queryset(qs)
+        return self.get_paginated_response(sale_list_data(page, *sale_refs(page)))
 
+    @idempotent("sale-create")
     def create(self, request, *args, **kwargs):
         data = request.data
         product_id = data.get("product_id")
@@ -91,23 +230,27 @@ class SaleViewSet(viewsets.ModelViewSet):
         if qty <= 0:
             return Response({"detail": "qty must be >= 1"}, status=status.HTTP_400_BAD_REQUEST)
 
-        with transaction.atomic():
-            try:
-                product = Product.objects.select_for_update().get(pk=product_id)
-            except Product.DoesNotExist:
-                return Response({"detail": "product not found"}, status=status.HTTP_404_NOT_FOUND)
+        # plain read: price and snapshot don't need the row locked
+        try:
+            product = Product.objects.get(pk=product_id)
+        except Product.DoesNotExist:
+            return Response({"detail": "product not found"}, status=status.HTTP_404_NOT_FOUND)
 
-            if product.stock < qty:
-                return Response({"detail": "insufficient stock"}, status=status.HTTP_400_BAD_REQUEST)
+        # sharded: Product.stock lags sales but never restocks, so it is still a safe early reject
+        if product.stock < qty:
+            return Response({"detail": "insufficient stock"}, status=status.HTTP_400_BAD_REQUEST)
 
-            price = product.price
-            subtotal = (price * qty) - discount
-            taxable = max(Decimal("0.00"), subtotal)
-            gst = (taxable * product.gstPct) / Decimal("100.00")
-            total = (taxable + gst).quantize(Decimal("0.01"))
+        taxable, gst, total = price_line(product, qty, discount)
 
+        counter = getattr(request.user, "counter", 0) or 0
+        now = timezone.now()
+        with transaction.atomic():
+            # this counter's invoice sequence row, locked till commit; other counters don't wait on it
+            invoice_no, = allocate_invoice_numbers(counter, now)
             sale = Sale.objects.create(
-                counter=getattr(request.user, "counter", 0) or 0,
+                date=now,
+                invoice_no=invoice_no,
+                counter=counter,
                 staff=request.user,
                 product=product,
                 qty=qty,
@@ -116,60 +259,312 @@ class SaleViewSet(viewsets.ModelViewSet):
                 gst=gst,
                 total=total,
                 mode=mode,
-                product_snapshot={
-                    "id": product.id,
-                    "name": product.name,
-                    "price": float(product.price),
-                    "gstPct": float(product.gstPct),
-                }
+                product_version_id=product_version_id(product),
             )
 
-            # decrement stock
-            product.stock -= qty
-            product.save()
+            # decrement stock last, so the row lock it takes is only held until commit;
+            # another counter may have sold the last units since the read above
+            if not take_stock(product.pk, qty, counter):
+                transaction.set_rollback(True)
+                return Response({"detail": "insufficient stock"}, status=status.HTTP_400_BAD_REQUEST)
+            record_sales([sale])
+            announce([sale])
 
-            serializer = self.get_serializer(sale)
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
+        product.stock -= qty
+        serializer = self.get_serializer(sale)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    def perform_update(self, serializer):
+        # keep the summary table and cached reports in step with admin corrections
+        with transaction.atomic():
+            before = copy.copy(serializer.instance)
+            sale = serializer.save()
+            record_sales([before], sign=-1)
+            record_sales([sale])
+            days = {business_date(before.date), business_date(sale.date)}
+            transaction.on_commit(lambda: report_cache.forget_days(days))
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            record_sales([instance], sign=-1)
+            instance.delete()
+            day = business_date(instance.date)
+            transaction.on_commit(lambda: report_cache.forget_days([day]))
+
+    @action(detail=False, methods=["post"])
+    @idempotent("sale-checkout")
+    def checkout(self, request):
+        """
+        POST /api/sales/checkout/
+        {"mode": "UPI", "lines": [{"product_id": "p-apple-250", "qty": 2, "discount": "0"}, ...]}
+        Bills a whole basket in one transaction and returns the full bill.
+        """
+        payload = CheckoutSerializer(data=request.data)
+        payload.is_valid(raise_exception=True)
+        lines = payload.validated_data["lines"]
+        mode = payload.validated_data["mode"]
+
+        # the same product may appear on several lines; stock is checked on the sum
+        wanted = {}
+        for line in lines:
+            wanted[line["product_id"]] = wanted.get(line["product_id"], 0) + line["qty"]
+
+        counter = getattr(request.user, "counter", 0) or 0
+        now = timezone.now()
+        with transaction.atomic():
+            # invoice sequence before product rows, the order every billing path locks in;
+            # a rejected basket rolls back, so its numbers are reused
+            invoice_nos = allocate_invoice_numbers(counter, now, len(lines))
+
+            if sharded():
+                # stock comes off this counter's shards below; the product rows aren't locked
+                products = Product.objects.in_bulk(list(wanted))
+            else:
+                # one locking query for the whole basket, always in pk order so two
+                # counters billing overlapping baskets can't deadlock each other
+                products = {
+                    p.pk: p
+                    for p in Product.objects.select_for_update().filter(pk__in=list(wanted)).order_by("pk")
+                }
+
+            missing = [pid for pid in wanted if pid not in products]
+            if missing:
+                transaction.set_rollback(True)
+                return Response({"detail": "product not found", "product_ids": missing}, status=status.HTTP_404_NOT_FOUND)
+
+            if sharded():
+                short = [pid for pid in sorted(wanted) if not take_stock(pid, wanted[pid], counter)]
+            else:
+                short = [pid for pid, qty in wanted.items() if products[pid].stock < qty]
+            if short:
+                transaction.set_rollback(True)
+                return Response({"detail": "insufficient stock", "product_ids": short}, status=status.HTTP_400_BAD_REQUEST)
+
+            sales = []
+            for line, invoice_no in zip(lines, invoice_nos):
+                product = products[line["product_id"]]
+                taxable, gst, total = price_line(product, line["qty"], line["discount"])
+                sales.append(Sale(
+                    date=now,
+                    invoice_no=invoice_no,
+                    counter=counter,
+                    staff=request.user,
+                    product=product,
+                    qty=line["qty"],
+                    discount=line["discount"],
+                    taxable=taxable,
+                    gst=gst,
+                    total=total,
+                    mode=mode,
+                    product_version_id=product_version_id(product),
+                ))
+            Sale.objects.bulk_create(sales)
+
+            if not sharded():
+                for pid, qty in wanted.items():
+                    products[pid].stock -= qty
+                Product.objects.bulk_update(list(products.values()), ["stock"])
+                record_changes(list(wanted))
+            record_sales(sales)
+            announce(sales)
+
+        data = self.get_serializer(sales, many=True).data
+        return Response({
+            "counter": counter,
+            "mode": mode,
+            "lines": data,
+            "totals": {
+                "taxable": float(sum(s.taxable for s in sales)),
+                "gst": float(sum(s.gst for s in sales)),
+                "total": float(sum(s.total for s in sales)),
+            },
+        }, status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=["post"])
+    def sync(self, request):
+        """
+        POST /api/sales/sync/
+        {"sales": [{"client_id": "<uuid>", "client_ts": "...", "product_id": "...", "qty": 1, "discount": "0", "mode": "Cash"}, ...]}
+        Uploads sales billed while the counter was offline; reports each one as accepted,
+        duplicate (already uploaded) or rejected. Sales are dated by client_ts (see
+        sync.sale_date), so they count towards the day they were billed.
+        """
+        items = request.data.get("sales") if isinstance(request.data, dict) else None
+        if not isinstance(items, list) or not items:
+            return Response({"detail": "sales must be a non-empty list"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > SYNC_MAX_BATCH:
+            return Response({"detail": f"at most {SYNC_MAX_BATCH} sales per upload"}, status=status.HTTP_400_BAD_REQUEST)
+
+        results = sync_sales(request.user, items)
+        counts = {ACCEPTED: 0, DUPLICATE: 0, REJECTED: 0}
+        for r in results:
+            counts[r["status"]] += 1
+        return Response(dict(counts, results=results))
+
+    @action(detail=False, methods=["post"])
+    def invoice_block(self, request):
+        """
+        POST /api/sales/invoice_block/  {"size": 50}
+        Reserves the next `size` invoice numbers of the caller's counter for offline billing.
+        Sales uploaded through /api/sales/sync/ may then carry one of them as "invoice_no".
+        """
+        try:
+            size = int(request.data.get("size", 50))
+        except (TypeError, ValueError):
+            return Response({"detail": "size must be a number"}, status=status.HTTP_400_BAD_REQUEST)
+        if not 1 <= size <= MAX_BLOCK_SIZE:
+            return Response({"detail": f"size must be 1 to {MAX_BLOCK_SIZE}"}, status=status.HTTP_400_BAD_REQUEST)
+
+        counter = getattr(request.user, "counter", 0) or 0
+        block = issue_block(request.user, counter, timezone.now(), size)
+        return Response({
+            "counter": counter,
+            "financial_year": block.financial_year,
+            "first": format_invoice_no(counter, block.financial_year, block.first),
+            "last": format_invoice_no(counter, block.financial_year, block.last),
+        }, status=status.HTTP_201_CREATED)
 
     @action(detail=False, methods=["get"])
+    @replica_reads
     def daily_report(self, request):
-        """GET /api/sales/daily-report/?date=YYYY-MM-DD"""
-        date_str = request.query_params.get("date")
-        if date_str:
-            try:
-                date_obj = timezone.datetime.fromisoformat(date_str).date()
-            except Exception:
-                return Response({"detail": "invalid date format, use YYYY-MM-DD"}, status=status.HTTP_400_BAD_REQUEST)
+        """
+        GET /api/sales/daily_report/?date=YYYY-MM-DD
+            or ?from=YYYY-MM-DD&to=YYYY-MM-DD, optionally &counter=&staff=&mode=&gzip=1
+            and ?format=columnar|msgpack (or the matching Accept header) instead of CSV
+        Streams the report in chunks, so memory stays flat for a day or a whole quarter.
+        Reports of closed days are cached on disk (sales/report_cache.py) and served with
+        ETag / Last-Modified / Range support.
+        """
+        qs, start, end = filter_sales(Sale.objects.all(), request.query_params, default_today=True)
+        if start is None:
+            return Response({"detail": "from is required when to is given"}, status=status.HTTP_400_BAD_REQUEST)
+        end = end or timezone.localdate()
+
+        body, content_type, filename = self.report_body(request, qs, start, end)
+        # closed days never change: build the file once, then serve it without touching the database
+        if report_cache.closed(end):
+            key = report_cache.report_key(start, end, request.accepted_renderer.format, request.query_params)
+            entry = report_cache.lookup(key) or report_cache.store(key, start, end, body)
+            if entry is not None:
+                return report_cache.file_response(request, entry, content_type, filename)
+            # a sale of one of these days was edited while the file was being written
+            body, content_type, filename = self.report_body(request, qs, start, end)
+
+        response = StreamingHttpResponse(body, content_type=content_type)
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return response
+
+    def report_body(self, request, qs, start, end):
+        """(chunks, content type, filename) of a daily report in the negotiated format."""
+        filename = f"sales-{start.isoformat()}" if start == end else f"sales-{start.isoformat()}_{end.isoformat()}"
+        # months moved out by archive_sales come first; they are always older than live rows
+        staff_names = StaffNames()
+        rows = chain(archived_csv_rows(start, end, request.query_params, staff_names), sale_csv_rows(qs, staff_names))
+        gzipped = request.query_params.get("gzip") in ("1", "true")
+        body, content_type, ext = iter_report(rows, request.accepted_renderer.format, gzipped)
+        return body, content_type, f"{filename}.{ext}"
+
+    @action(detail=False, methods=["get"])
+    def archive(self, request):
+        """
+        GET /api/sales/archive/  -- archived months and their row counts
+        GET /api/sales/archive/?date=YYYY-MM-DD or ?from=&to=, optionally &counter=&staff=&mode=&gzip=1
+        Streams archived sales only, as the daily report CSV, straight from the archive files.
+        """
+        start, end = date_range(request.query_params)
+        if start is None and end is None:
+            months = [
+                {"month": m.label, "sales": m.manifest["rows"], "complete": m.manifest["complete"]}
+                for m in archived_months()
+            ]
+            return Response({"months": months})
+        if start is None or end is None:
+            return Response({"detail": "give both from and to, or date"}, status=status.HTTP_400_BAD_REQUEST)
+
+        filename = f"archived-sales-{start.isoformat()}_{end.isoformat()}"
+        body = iter_csv(SALES_CSV_HEADER, archived_csv_rows(start, end, request.query_params, StaffNames()))
+        if request.query_params.get("gzip") in ("1", "true"):
+            response = StreamingHttpResponse(iter_gzip(body), content_type="application/gzip")
+            response["Content-Disposition"] = f'attachment; filename="{filename}.csv.gz"'
         else:
-            date_obj = timezone.localdate()
-
-        start = timezone.datetime.combine(date_obj, timezone.datetime.min.time()).replace(tzinfo=timezone.utc)
-        end = timezone.datetime.combine(date_obj, timezone.datetime.max.time()).replace(tzinfo=timezone.utc)
-
-        qs = Sale.objects.filter(date__range=(start, end)).select_related("staff", "product")
-
-        # build CSV
-        response = HttpResponse(content_type="text/csv")
-        response["Content-Disposition"] = f'attachment; filename="sales-{date_obj.isoformat()}.csv"'
-
-        writer = csv.writer(response)
-        header = ["date", "counter", "staff", "product", "qty", "price", "discount", "taxable", "gst", "total"]
-        writer.writerow(header)
-        for s in qs:
-            writer.writerow([
-                s.date.isoformat(),
-                s.counter,
-                s.staff.get_full_name() or s.staff.username,
-                s.product.name,
-                s.qty,
-                str(s.product.price),
-                str(s.discount),
-                str(s.taxable),
-                str(s.gst),
-                str(s.total),
-            ])
+            response = StreamingHttpResponse(body, content_type="text/csv")
+            response["Content-Disposition"] = f'attachment; filename="{filename}.csv"'
+        return response
+
+    @action(detail=False, methods=["get"])
+    @replica_reads
+    def summary(self, request):
+        """
+        GET /api/sales/summary/?period=day|week|month&date=YYYY-MM-DD
+            optionally &counter=&staff=&mode= and &group=counter|staff|product|mode
+        Totals come from DailySalesSummary, so cost doesn't depend on how many sales exist.
+        """
+        period, group, start, end = summary_params(request.query_params)
+        qs = filter_dimensions(DailySalesSummary.objects.filter(business_date__range=(start, end)), request.query_params)
+        data = {
+            "period": period,
+            "from": start.isoformat(),
+            "to": end.isoformat(),
+            "totals": summary_row(qs.aggregate(**SUMMARY_SUMS)),
+            "days": [
+                dict(date=row.pop("business_date").isoformat(), **summary_row(row))
+                for row in qs.values("business_date").annotate(**SUMMARY_SUMS).order_by("business_date")
+            ],
+        }
+        if group:
+            field = SUMMARY_GROUPS[group]
+            data["groups"] = [
+                dict(key=row.pop(field), **summary_row(row))
+                for row in qs.values(field).annotate(**SUMMARY_SUMS).order_by(field)
+            ]
+        return Response(data)
+
+
+# ---- Background jobs ----
+from django.http import FileResponse
+from rest_framework import mixins
+
+from .jobs import delete_job, result_path, submit
+from .models import Job
+from .serializers import JobSerializer
+
+
+class JobViewSet(mixins.ListModelMixin, mixins.RetrieveModelMixin, mixins.DestroyModelMixin, viewsets.GenericViewSet):
+    """
+    Exports too big to build inside a request, run by `manage.py run_jobs` (sales/jobs.py).
+    POST a job, poll it until status is "done", then fetch its download link.
+    """
+    queryset = Job.objects.all().order_by("-created_at", "-id")
+    serializer_class = JobSerializer
+    permission_classes = [IsAuthenticated, IsAdmin]
+
+    def create(self, request):
+        """
+        POST /api/jobs/  {"kind": "daily_report", "params": {"from": "2026-04-01", "to": "2026-06-30"}}
+        kinds: daily_report (the daily_report query params, plus "format"), products_export ({"type": "jsonl"})
+        """
+        job = submit(request.user, request.data.get("kind"), request.data.get("params", {}))
+        response = Response(self.get_serializer(job).data, status=status.HTTP_202_ACCEPTED)
+        response["Location"] = f"/api/jobs/{job.pk}/"
         return response
 
+    def perform_destroy(self, instance):
+        # cancels a queued job; a running one finds its row gone and drops what it wrote
+        delete_job(instance)
+
+    @action(detail=True, methods=["get"])
+    def download(self, request, pk=None):
+        """GET /api/jobs/<id>/download/  -- the result file, once the job is done"""
+        job = self.get_object()
+        if job.status != Job.DONE:
+            return Response({"detail": f"job is {job.status}"}, status=status.HTTP_409_CONFLICT)
+        try:
+            fh = open(result_path(job.result), "rb")
+        except FileNotFoundError:
+            return Response({"detail": "result has expired"}, status=status.HTTP_410_GONE)
+        return FileResponse(fh, as_attachment=True, filename=job.filename, content_type=job.content_type)
+
+
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def me(request):
@@ -194,6 +589,7 @@ User = get_user_model()
 class StaffListView(APIView):
     permission_classes = [IsAuthenticated]  # only logged-in users
 
+    @replica_reads
     def get(self, request):
         staff_users = User.objects.filter(role="staff")
         serializer = UserSerializer(staff_users, many=True)